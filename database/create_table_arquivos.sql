@@ -4,6 +4,7 @@ CREATE TABLE ArquivosStorage (
     NomeOriginal NVARCHAR(500) NOT NULL,
     NomeArmazenado NVARCHAR(500) NOT NULL,
     CaminhoBlob NVARCHAR(1000) NOT NULL,
+    Pasta NVARCHAR(400) NOT NULL DEFAULT '', -- Pasta do blob no container ('' = raiz)
     UrlBlob NVARCHAR(2000) NOT NULL,
     TamanhoBytes BIGINT NOT NULL,
     TipoConteudo NVARCHAR(200),
@@ -13,6 +14,12 @@ CREATE TABLE ArquivosStorage (
     UploadPor NVARCHAR(200),
     Tags NVARCHAR(MAX), -- JSON com tags adicionais
     Ativo BIT DEFAULT 1,
+    DataExclusao DATETIME2 NULL, -- Data do soft delete (expurgo dos inativos)
+    HashSha256 BINARY(32) NULL, -- SHA-256 do conteúdo (deduplicação)
+    ETagBlob NVARCHAR(100) NULL, -- ETag do blob no Azure (cache HTTP dos downloads)
+    CodificacaoConteudo VARCHAR(10) NULL, -- Compressão do blob (gzip/zstd; NULL = sem compressão)
+    TamanhoArmazenadoBytes BIGINT NULL, -- Tamanho do blob comprimido (NULL = TamanhoBytes)
+    VersaoRegistro ROWVERSION, -- Muda a cada alteração do registro (ETag do /info)
     CONSTRAINT CK_TamanhoBytes CHECK (TamanhoBytes >= 0)
 );
 
@@ -22,6 +29,45 @@ CREATE INDEX IX_ArquivosStorage_NomeOriginal ON ArquivosStorage(NomeOriginal);
 CREATE INDEX IX_ArquivosStorage_Container ON ArquivosStorage(Container);
 CREATE INDEX IX_ArquivosStorage_Ativo ON ArquivosStorage(Ativo);
 
+-- Listagem paginada por cursor (DataUpload, Id) dos arquivos ativos
+CREATE INDEX IX_ArquivosStorage_Ativos_DataUpload_Id
+    ON ArquivosStorage(DataUpload DESC, Id DESC)
+    INCLUDE (NomeOriginal, TamanhoBytes, TipoConteudo, UploadPor, CaminhoBlob)
+    WHERE Ativo = 1;
+
+-- Listagem de uma pasta (filtro por Pasta, ordenada por DataUpload)
+CREATE INDEX IX_ArquivosStorage_Pasta_Ativo_DataUpload
+    ON ArquivosStorage(Pasta, Ativo, DataUpload DESC, Id DESC)
+    INCLUDE (NomeOriginal, TamanhoBytes, TipoConteudo, UploadPor);
+
+-- Expurgo dos inativos: arquivos marcados como inativos na ordem do soft delete
+CREATE INDEX IX_ArquivosStorage_Inativos_DataExclusao
+    ON ArquivosStorage(DataExclusao, Id)
+    WHERE Ativo = 0;
+
+-- Busca (/buscar): usuário, tipo de conteúdo e faixa de tamanho dos arquivos ativos
+CREATE INDEX IX_ArquivosStorage_Ativos_UploadPor
+    ON ArquivosStorage(UploadPor, DataUpload DESC, Id DESC)
+    INCLUDE (NomeOriginal, TamanhoBytes, TipoConteudo, Pasta)
+    WHERE Ativo = 1;
+
+CREATE INDEX IX_ArquivosStorage_Ativos_TipoConteudo
+    ON ArquivosStorage(TipoConteudo, DataUpload DESC, Id DESC)
+    INCLUDE (NomeOriginal, TamanhoBytes, UploadPor, Pasta)
+    WHERE Ativo = 1;
+
+CREATE INDEX IX_ArquivosStorage_Ativos_TamanhoBytes
+    ON ArquivosStorage(TamanhoBytes)
+    INCLUDE (NomeOriginal, TipoConteudo, DataUpload, UploadPor, Pasta)
+    WHERE Ativo = 1;
+
+-- Deduplicação por conteúdo: busca de blob idêntico e contagem de referências
+CREATE INDEX IX_ArquivosStorage_HashSha256
+    ON ArquivosStorage(HashSha256, TamanhoBytes)
+    INCLUDE (NomeArmazenado, CaminhoBlob, UrlBlob, Ativo, Container, ETagBlob,
+             CodificacaoConteudo, TamanhoArmazenadoBytes)
+    WHERE HashSha256 IS NOT NULL;
+
 -- Comentários nas colunas
 EXEC sp_addextendedproperty
     @name = N'MS_Description', @value = 'Identificador único do arquivo',
@@ -47,8 +93,38 @@ EXEC sp_addextendedproperty
     @level1type = N'TABLE', @level1name = N'ArquivosStorage',
     @level2type = N'COLUMN', @level2name = N'CaminhoBlob';
 
+EXEC sp_addextendedproperty
+    @name = N'MS_Description', @value = 'Pasta do blob no container, normalizada (vazia para a raiz)',
+    @level0type = N'SCHEMA', @level0name = N'dbo',
+    @level1type = N'TABLE', @level1name = N'ArquivosStorage',
+    @level2type = N'COLUMN', @level2name = N'Pasta';
+
 EXEC sp_addextendedproperty
     @name = N'MS_Description', @value = 'URL completa do blob no Azure Storage',
     @level0type = N'SCHEMA', @level0name = N'dbo',
     @level1type = N'TABLE', @level1name = N'ArquivosStorage',
     @level2type = N'COLUMN', @level2name = N'UrlBlob';
+
+EXEC sp_addextendedproperty
+    @name = N'MS_Description', @value = 'SHA-256 do conteúdo; registros com o mesmo hash podem compartilhar o blob',
+    @level0type = N'SCHEMA', @level0name = N'dbo',
+    @level1type = N'TABLE', @level1name = N'ArquivosStorage',
+    @level2type = N'COLUMN', @level2name = N'HashSha256';
+
+EXEC sp_addextendedproperty
+    @name = N'MS_Description', @value = 'ETag do blob no Azure, usado nos downloads condicionais (If-None-Match/If-Range)',
+    @level0type = N'SCHEMA', @level0name = N'dbo',
+    @level1type = N'TABLE', @level1name = N'ArquivosStorage',
+    @level2type = N'COLUMN', @level2name = N'ETagBlob';
+
+EXEC sp_addextendedproperty
+    @name = N'MS_Description', @value = 'Compressão do conteúdo no blob (content_encoding: gzip ou zstd); NULL se gravado sem compressão',
+    @level0type = N'SCHEMA', @level0name = N'dbo',
+    @level1type = N'TABLE', @level1name = N'ArquivosStorage',
+    @level2type = N'COLUMN', @level2name = N'CodificacaoConteudo';
+
+EXEC sp_addextendedproperty
+    @name = N'MS_Description', @value = 'Tamanho do blob comprimido; TamanhoBytes é sempre o tamanho do conteúdo original',
+    @level0type = N'SCHEMA', @level0name = N'dbo',
+    @level1type = N'TABLE', @level1name = N'ArquivosStorage',
+    @level2type = N'COLUMN', @level2name = N'TamanhoArmazenadoBytes';
@@ -0,0 +1,12 @@
+-- Contadores de arquivos ativos por pasta, mantidos na mesma transação dos
+-- uploads e exclusões (totais de /listar e /estatisticas sem COUNT(*))
+-- Escopo 'pasta': arquivos diretamente na pasta
+-- Escopo 'arvore': arquivos na pasta e em todas as subpastas; a linha com
+-- Pasta = '' guarda o total geral
+CREATE TABLE ArquivosContadores (
+    Escopo NVARCHAR(20) NOT NULL, -- pasta | arvore
+    Pasta NVARCHAR(400) NOT NULL,
+    TotalArquivos BIGINT NOT NULL DEFAULT 0,
+    TotalBytes BIGINT NOT NULL DEFAULT 0,
+    CONSTRAINT PK_ArquivosContadores PRIMARY KEY (Escopo, Pasta)
+);
@@ -0,0 +1,27 @@
+-- Variantes geradas a partir das imagens (miniatura e pré-visualização;
+-- executar depois de create_table_arquivos.sql)
+-- Uma linha por arquivo e variante. O blob da variante fica na mesma pasta
+-- do original ("<pasta>/<id do arquivo>.<variante>.jpg"). Enquanto a
+-- variante está pendente (ou se falhou), o download entrega o original.
+CREATE TABLE ArquivosDerivados (
+    ArquivoId UNIQUEIDENTIFIER NOT NULL,
+    Variante VARCHAR(20) NOT NULL, -- thumb, preview
+    Status VARCHAR(20) NOT NULL DEFAULT 'pendente', -- pendente, concluido, falhou
+    Tentativas INT NOT NULL DEFAULT 0, -- Falhas; volta a pendente até o limite
+    CaminhoBlob NVARCHAR(450) NULL, -- Preenchido ao concluir
+    TamanhoBytes BIGINT NULL,
+    Largura INT NULL,
+    Altura INT NULL,
+    ETagBlob NVARCHAR(100) NULL,
+    DataCriacao DATETIME2 NOT NULL DEFAULT GETDATE(), -- Atualizada ao reenfileirar
+    DataConclusao DATETIME2 NULL,
+    Erro NVARCHAR(500) NULL,
+    CONSTRAINT PK_ArquivosDerivados PRIMARY KEY (ArquivoId, Variante),
+    CONSTRAINT FK_ArquivosDerivados_ArquivosStorage FOREIGN KEY (ArquivoId)
+        REFERENCES ArquivosStorage(Id) ON DELETE CASCADE
+);
+
+-- Reconciliação: blobs de variantes referenciados por algum registro
+CREATE INDEX IX_ArquivosDerivados_CaminhoBlob
+    ON ArquivosDerivados(CaminhoBlob)
+    WHERE CaminhoBlob IS NOT NULL;
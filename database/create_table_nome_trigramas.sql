@@ -0,0 +1,16 @@
+-- Trigramas dos nomes dos arquivos (executar depois de
+-- create_table_arquivos.sql)
+-- A busca por parte do nome (/buscar?nome=) não pode usar o índice de
+-- NomeOriginal com LIKE '%termo%'; cada arquivo ganha aqui uma linha por
+-- sequência distinta de 3 caracteres do nome, em minúsculas, e a busca
+-- procura os arquivos que têm todos os trigramas do termo.
+CREATE TABLE ArquivosNomeTrigramas (
+    Trigrama NVARCHAR(3) COLLATE Latin1_General_BIN2 NOT NULL,
+    ArquivoId UNIQUEIDENTIFIER NOT NULL,
+    CONSTRAINT PK_ArquivosNomeTrigramas PRIMARY KEY (Trigrama, ArquivoId),
+    CONSTRAINT FK_ArquivosNomeTrigramas_ArquivosStorage FOREIGN KEY (ArquivoId)
+        REFERENCES ArquivosStorage(Id) ON DELETE CASCADE
+);
+
+-- Exclusão em cascata a partir de ArquivosStorage
+CREATE INDEX IX_ArquivosNomeTrigramas_ArquivoId ON ArquivosNomeTrigramas(ArquivoId);
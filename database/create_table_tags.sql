@@ -0,0 +1,15 @@
+-- Tags dos arquivos normalizadas, uma linha por chave (executar depois de
+-- create_table_arquivos.sql)
+-- O JSON completo continua em ArquivosStorage.Tags; esta tabela existe para o
+-- filtro /listar?tag=chave:valor, resolvido por busca no índice (Chave, Valor).
+CREATE TABLE ArquivosTags (
+    ArquivoId UNIQUEIDENTIFIER NOT NULL,
+    Chave NVARCHAR(100) NOT NULL,
+    Valor NVARCHAR(400) NOT NULL, -- Texto; valores não-texto em JSON (123, true)
+    CONSTRAINT PK_ArquivosTags PRIMARY KEY (ArquivoId, Chave),
+    CONSTRAINT FK_ArquivosTags_ArquivosStorage FOREIGN KEY (ArquivoId)
+        REFERENCES ArquivosStorage(Id) ON DELETE CASCADE
+);
+
+-- Filtro por tag
+CREATE INDEX IX_ArquivosTags_Chave_Valor ON ArquivosTags(Chave, Valor);
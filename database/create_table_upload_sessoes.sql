@@ -0,0 +1,27 @@
+-- Tabela para as sessões de upload em partes (uploads retomáveis) e dos
+-- uploads diretos ao blob via URL SAS
+-- Cada chunk enviado é gravado como um bloco não confirmado do blob; a sessão
+-- guarda apenas os dados necessários para validar o conteúdo e registrar o
+-- arquivo em ArquivosStorage na conclusão.
+CREATE TABLE ArquivosUploadSessoes (
+    Id UNIQUEIDENTIFIER PRIMARY KEY DEFAULT NEWID(),
+    Tipo NVARCHAR(20) NOT NULL DEFAULT 'chunks', -- chunks | sas
+    NomeOriginal NVARCHAR(500) NOT NULL,
+    NomeArmazenado NVARCHAR(500) NOT NULL,
+    CaminhoBlob NVARCHAR(1000) NOT NULL,
+    TipoConteudo NVARCHAR(200),
+    TamanhoBytes BIGINT NOT NULL,
+    TamanhoChunk INT NOT NULL,
+    TotalChunks INT NOT NULL,
+    UploadPor NVARCHAR(200),
+    Tags NVARCHAR(MAX), -- JSON com tags adicionais
+    Status NVARCHAR(20) NOT NULL DEFAULT 'pendente', -- pendente | concluida
+    ArquivoId UNIQUEIDENTIFIER NULL, -- Id em ArquivosStorage após a conclusão
+    DataCriacao DATETIME2 DEFAULT GETDATE(),
+    DataExpiracao DATETIME2 NOT NULL,
+    CONSTRAINT CK_UploadSessoes_TamanhoBytes CHECK (TamanhoBytes >= 0),
+    CONSTRAINT CK_UploadSessoes_TamanhoChunk CHECK (TamanhoChunk > 0)
+);
+
+-- Índice para limpeza de sessões expiradas
+CREATE INDEX IX_ArquivosUploadSessoes_DataExpiracao ON ArquivosUploadSessoes(DataExpiracao);
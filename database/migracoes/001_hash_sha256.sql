@@ -0,0 +1,17 @@
+-- Migração: deduplicação de uploads por SHA-256
+-- Para bancos criados antes da coluna HashSha256. Arquivos já existentes
+-- ficam sem hash e nunca são compartilhados entre registros.
+IF COL_LENGTH('ArquivosStorage', 'HashSha256') IS NULL
+    ALTER TABLE ArquivosStorage ADD HashSha256 BINARY(32) NULL;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ArquivosStorage_HashSha256'
+      AND object_id = OBJECT_ID('ArquivosStorage')
+)
+    CREATE INDEX IX_ArquivosStorage_HashSha256
+        ON ArquivosStorage(HashSha256, TamanhoBytes)
+        INCLUDE (NomeArmazenado, CaminhoBlob, UrlBlob, Ativo, Container)
+        WHERE HashSha256 IS NOT NULL;
+GO
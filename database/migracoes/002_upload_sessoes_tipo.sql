@@ -0,0 +1,8 @@
+-- Migração: uploads diretos ao blob via URL SAS
+-- As reservas de upload direto usam a mesma tabela das sessões em partes;
+-- sessões já existentes são sessões em partes.
+IF COL_LENGTH('ArquivosUploadSessoes', 'Tipo') IS NULL
+    ALTER TABLE ArquivosUploadSessoes
+        ADD Tipo NVARCHAR(20) NOT NULL
+            CONSTRAINT DF_ArquivosUploadSessoes_Tipo DEFAULT 'chunks';
+GO
@@ -0,0 +1,23 @@
+-- Migração: GET condicional (ETag / Last-Modified) em downloads e /info
+-- Registros já existentes ficam sem ETagBlob; para eles o ETag é consultado
+-- nas propriedades do blob quando o cliente envia If-None-Match/If-Range.
+IF COL_LENGTH('ArquivosStorage', 'ETagBlob') IS NULL
+    ALTER TABLE ArquivosStorage ADD ETagBlob NVARCHAR(100) NULL;
+GO
+
+IF COL_LENGTH('ArquivosStorage', 'VersaoRegistro') IS NULL
+    ALTER TABLE ArquivosStorage ADD VersaoRegistro ROWVERSION;
+GO
+
+-- Manter o índice de deduplicação cobrindo a consulta (inclui ETagBlob)
+IF EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ArquivosStorage_HashSha256'
+      AND object_id = OBJECT_ID('ArquivosStorage')
+)
+    CREATE INDEX IX_ArquivosStorage_HashSha256
+        ON ArquivosStorage(HashSha256, TamanhoBytes)
+        INCLUDE (NomeArmazenado, CaminhoBlob, UrlBlob, Ativo, Container, ETagBlob)
+        WHERE HashSha256 IS NOT NULL
+        WITH (DROP_EXISTING = ON);
+GO
@@ -0,0 +1,13 @@
+-- Migração: paginação por cursor em /listar
+-- Índice filtrado dos arquivos ativos na ordem da listagem; cada página
+-- passa a ser uma busca no índice, sem percorrer as páginas anteriores.
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ArquivosStorage_Ativos_DataUpload_Id'
+      AND object_id = OBJECT_ID('ArquivosStorage')
+)
+    CREATE INDEX IX_ArquivosStorage_Ativos_DataUpload_Id
+        ON ArquivosStorage(DataUpload DESC, Id DESC)
+        INCLUDE (NomeOriginal, TamanhoBytes, TipoConteudo, UploadPor, CaminhoBlob)
+        WHERE Ativo = 1;
+GO
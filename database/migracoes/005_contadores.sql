@@ -0,0 +1,58 @@
+-- Migração: contadores de arquivos e bytes por pasta
+-- Cria ArquivosContadores e calcula os totais a partir dos arquivos ativos
+-- existentes. Aplicar com a API parada: uploads e exclusões feitos durante o
+-- cálculo inicial não seriam contados.
+IF OBJECT_ID('ArquivosContadores') IS NULL
+    CREATE TABLE ArquivosContadores (
+        Escopo NVARCHAR(20) NOT NULL, -- pasta | arvore
+        Pasta NVARCHAR(400) NOT NULL,
+        TotalArquivos BIGINT NOT NULL DEFAULT 0,
+        TotalBytes BIGINT NOT NULL DEFAULT 0,
+        CONSTRAINT PK_ArquivosContadores PRIMARY KEY (Escopo, Pasta)
+    );
+GO
+
+IF NOT EXISTS (SELECT 1 FROM ArquivosContadores)
+BEGIN
+    -- Pasta de cada arquivo: tudo antes da última '/' do caminho do blob
+    WITH Pastas AS (
+        SELECT
+            CAST(CASE WHEN CHARINDEX('/', CaminhoBlob) > 0
+                 THEN LEFT(CaminhoBlob, LEN(CaminhoBlob) - CHARINDEX('/', REVERSE(CaminhoBlob)))
+                 ELSE '' END AS NVARCHAR(400)) AS Pasta,
+            TamanhoBytes
+        FROM ArquivosStorage
+        WHERE Ativo = 1
+    )
+    INSERT INTO ArquivosContadores (Escopo, Pasta, TotalArquivos, TotalBytes)
+    SELECT 'pasta', Pasta, COUNT(*), SUM(TamanhoBytes)
+    FROM Pastas
+    GROUP BY Pasta;
+
+    -- Árvore: cada pasta soma nela mesma e em todos os seus ancestrais
+    WITH Ancestrais AS (
+        SELECT Pasta AS Ancestral, TotalArquivos, TotalBytes
+        FROM ArquivosContadores
+        WHERE Escopo = 'pasta' AND Pasta <> ''
+        UNION ALL
+        SELECT CAST(CASE WHEN CHARINDEX('/', Ancestral) > 0
+                    THEN LEFT(Ancestral, LEN(Ancestral) - CHARINDEX('/', REVERSE(Ancestral)))
+                    ELSE '' END AS NVARCHAR(400)),
+               TotalArquivos, TotalBytes
+        FROM Ancestrais
+        WHERE Ancestral <> ''
+    )
+    INSERT INTO ArquivosContadores (Escopo, Pasta, TotalArquivos, TotalBytes)
+    SELECT 'arvore', Ancestral, SUM(TotalArquivos), SUM(TotalBytes)
+    FROM (
+        SELECT Ancestral, TotalArquivos, TotalBytes FROM Ancestrais
+        UNION ALL
+        -- Arquivos na raiz do container entram apenas no total geral
+        SELECT '', TotalArquivos, TotalBytes
+        FROM ArquivosContadores
+        WHERE Escopo = 'pasta' AND Pasta = ''
+    ) AS t
+    GROUP BY Ancestral
+    OPTION (MAXRECURSION 0);
+END
+GO
@@ -0,0 +1,124 @@
+-- Migração: coluna indexada Pasta para o filtro por pasta de /listar
+-- (substitui CaminhoBlob LIKE 'pasta/%', que percorria a tabela inteira)
+-- O preenchimento dos registros existentes é feito em lotes pequenos, em
+-- transações curtas, para não bloquear a tabela. Pode ser reexecutado.
+
+-- Pasta de um caminho de blob com as regras de
+-- AzureStorageManager._normalize_folder: tudo antes da última '/', com
+-- barras invertidas convertidas em '/', cada parte sem os espaços das
+-- pontas e sem partes vazias (barras repetidas, no início ou no fim).
+-- Versões anteriores da API gravavam a pasta como recebida.
+CREATE OR ALTER FUNCTION dbo.Migracao006PastaNormalizada (@CaminhoBlob NVARCHAR(1000))
+RETURNS NVARCHAR(1000)
+AS
+BEGIN
+    DECLARE @Posicao INT = CHARINDEX(N'/', REVERSE(@CaminhoBlob));
+    IF @Posicao = 0
+        RETURN N'';
+
+    -- DATALENGTH conta os espaços finais, que LEN ignora
+    DECLARE @Resto NVARCHAR(1000) =
+        REPLACE(LEFT(@CaminhoBlob, DATALENGTH(@CaminhoBlob) / 2 - @Posicao), N'\', N'/') + N'/';
+    DECLARE @Espacos NVARCHAR(6) = NCHAR(32) + NCHAR(9) + NCHAR(10) + NCHAR(11) + NCHAR(12) + NCHAR(13);
+    DECLARE @Pasta NVARCHAR(1000) = N'';
+    DECLARE @Parte NVARCHAR(1000);
+
+    WHILE DATALENGTH(@Resto) > 0
+    BEGIN
+        SET @Posicao = CHARINDEX(N'/', @Resto);
+        SET @Parte = TRIM(@Espacos FROM LEFT(@Resto, @Posicao - 1));
+        SET @Resto = SUBSTRING(@Resto, @Posicao + 1, 1000);
+        IF DATALENGTH(@Parte) > 0
+            SET @Pasta = CASE WHEN DATALENGTH(@Pasta) > 0 THEN @Pasta + N'/' ELSE N'' END + @Parte;
+    END
+
+    RETURN @Pasta;
+END
+GO
+
+-- Pastas com mais de 400 caracteres (MAX_FOLDER_LENGTH) não cabem na
+-- coluna: interromper antes de qualquer alteração. Os registros são
+-- listados; mova os arquivos para uma pasta de nome menor e reexecute.
+IF EXISTS (
+    SELECT 1 FROM ArquivosStorage
+    WHERE DATALENGTH(CaminhoBlob) / 2 > 400
+      AND DATALENGTH(dbo.Migracao006PastaNormalizada(CaminhoBlob)) / 2 > 400
+)
+BEGIN
+    SELECT Id, CaminhoBlob
+    FROM ArquivosStorage
+    WHERE DATALENGTH(CaminhoBlob) / 2 > 400
+      AND DATALENGTH(dbo.Migracao006PastaNormalizada(CaminhoBlob)) / 2 > 400;
+
+    RAISERROR('Há arquivos em pastas com mais de 400 caracteres; a migração não foi aplicada.', 16, 1);
+    SET NOEXEC ON;
+END
+GO
+
+IF COL_LENGTH('ArquivosStorage', 'Pasta') IS NULL
+    ALTER TABLE ArquivosStorage ADD Pasta NVARCHAR(400) NULL;
+GO
+
+DECLARE @TamanhoLote INT = 5000;
+-- O GUID zero antecede todos os outros na ordem do UNIQUEIDENTIFIER
+DECLARE @UltimoId UNIQUEIDENTIFIER = '00000000-0000-0000-0000-000000000000';
+DECLARE @Lote TABLE (Id UNIQUEIDENTIFIER PRIMARY KEY);
+
+WHILE 1 = 1
+BEGIN
+    DELETE FROM @Lote;
+
+    -- Percorre a chave primária em ordem (busca no índice a partir do
+    -- último Id), sem reler os lotes anteriores
+    INSERT INTO @Lote (Id)
+    SELECT TOP (@TamanhoLote) Id
+    FROM ArquivosStorage
+    WHERE Id > @UltimoId
+    ORDER BY Id;
+
+    IF @@ROWCOUNT = 0
+        BREAK;
+
+    UPDATE a
+    SET Pasta = dbo.Migracao006PastaNormalizada(a.CaminhoBlob)
+    FROM ArquivosStorage a
+    INNER JOIN @Lote l ON l.Id = a.Id
+    WHERE a.Pasta IS NULL;
+
+    SELECT TOP 1 @UltimoId = Id FROM @Lote ORDER BY Id DESC;
+END
+GO
+
+-- Registros inseridos durante o preenchimento (versão anterior da API)
+UPDATE ArquivosStorage
+SET Pasta = dbo.Migracao006PastaNormalizada(CaminhoBlob)
+WHERE Pasta IS NULL;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.default_constraints
+    WHERE parent_object_id = OBJECT_ID('ArquivosStorage')
+      AND parent_column_id = COLUMNPROPERTY(OBJECT_ID('ArquivosStorage'), 'Pasta', 'ColumnId')
+)
+    ALTER TABLE ArquivosStorage ADD CONSTRAINT DF_ArquivosStorage_Pasta DEFAULT '' FOR Pasta;
+GO
+
+IF COLUMNPROPERTY(OBJECT_ID('ArquivosStorage'), 'Pasta', 'AllowsNull') = 1
+    ALTER TABLE ArquivosStorage ALTER COLUMN Pasta NVARCHAR(400) NOT NULL;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ArquivosStorage_Pasta_Ativo_DataUpload'
+      AND object_id = OBJECT_ID('ArquivosStorage')
+)
+    CREATE INDEX IX_ArquivosStorage_Pasta_Ativo_DataUpload
+        ON ArquivosStorage(Pasta, Ativo, DataUpload DESC, Id DESC)
+        INCLUDE (NomeOriginal, TamanhoBytes, TipoConteudo, UploadPor);
+GO
+
+SET NOEXEC OFF;
+GO
+
+DROP FUNCTION IF EXISTS dbo.Migracao006PastaNormalizada;
+GO
@@ -0,0 +1,38 @@
+-- Migração: tags em JSON e tabela ArquivosTags (filtro /listar?tag=)
+-- Versões anteriores gravavam em Tags a representação Python do dicionário
+-- ({'chave': 'valor'}); quando a troca de aspas resulta em JSON válido, a
+-- coluna é convertida. Tags que continuarem inválidas ficam fora do filtro.
+IF OBJECT_ID('ArquivosTags') IS NULL
+BEGIN
+    CREATE TABLE ArquivosTags (
+        ArquivoId UNIQUEIDENTIFIER NOT NULL,
+        Chave NVARCHAR(100) NOT NULL,
+        Valor NVARCHAR(400) NOT NULL,
+        CONSTRAINT PK_ArquivosTags PRIMARY KEY (ArquivoId, Chave),
+        CONSTRAINT FK_ArquivosTags_ArquivosStorage FOREIGN KEY (ArquivoId)
+            REFERENCES ArquivosStorage(Id) ON DELETE CASCADE
+    );
+
+    CREATE INDEX IX_ArquivosTags_Chave_Valor ON ArquivosTags(Chave, Valor);
+END
+GO
+
+UPDATE ArquivosStorage
+SET Tags = REPLACE(Tags, '''', '"')
+WHERE Tags IS NOT NULL
+  AND ISJSON(Tags) = 0
+  AND ISJSON(REPLACE(Tags, '''', '"')) = 1;
+GO
+
+-- Apenas objetos JSON; arquivos que já têm tags na tabela são ignorados
+-- (o script pode ser reexecutado)
+INSERT INTO ArquivosTags (ArquivoId, Chave, Valor)
+SELECT a.Id, j.[key], CASE WHEN j.[type] = 0 THEN 'null' ELSE j.[value] END
+FROM ArquivosStorage a
+CROSS APPLY OPENJSON(
+    CASE WHEN ISJSON(a.Tags) = 1 AND LEFT(LTRIM(a.Tags), 1) = '{' THEN a.Tags END
+) j
+WHERE LEN(j.[key]) BETWEEN 1 AND 100
+  AND (j.[type] = 0 OR LEN(j.[value]) <= 400)
+  AND NOT EXISTS (SELECT 1 FROM ArquivosTags t WHERE t.ArquivoId = a.Id);
+GO
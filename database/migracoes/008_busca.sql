@@ -0,0 +1,90 @@
+-- Migração: busca por vários critérios (/buscar)
+-- Cria ArquivosNomeTrigramas (busca por parte do nome) e os índices de
+-- usuário, tipo de conteúdo e tamanho. Os trigramas dos arquivos existentes
+-- são gerados em lotes pequenos, em transações curtas. Pode ser reexecutado.
+IF OBJECT_ID('ArquivosNomeTrigramas') IS NULL
+BEGIN
+    CREATE TABLE ArquivosNomeTrigramas (
+        Trigrama NVARCHAR(3) COLLATE Latin1_General_BIN2 NOT NULL,
+        ArquivoId UNIQUEIDENTIFIER NOT NULL,
+        CONSTRAINT PK_ArquivosNomeTrigramas PRIMARY KEY (Trigrama, ArquivoId),
+        CONSTRAINT FK_ArquivosNomeTrigramas_ArquivosStorage FOREIGN KEY (ArquivoId)
+            REFERENCES ArquivosStorage(Id) ON DELETE CASCADE
+    );
+
+    CREATE INDEX IX_ArquivosNomeTrigramas_ArquivoId ON ArquivosNomeTrigramas(ArquivoId);
+END
+GO
+
+DECLARE @TamanhoLote INT = 2000;
+-- O GUID zero antecede todos os outros na ordem do UNIQUEIDENTIFIER
+DECLARE @UltimoId UNIQUEIDENTIFIER = '00000000-0000-0000-0000-000000000000';
+DECLARE @Lote TABLE (Id UNIQUEIDENTIFIER PRIMARY KEY);
+
+WHILE 1 = 1
+BEGIN
+    DELETE FROM @Lote;
+
+    -- Percorre a chave primária em ordem (busca no índice a partir do
+    -- último Id), sem reler os lotes anteriores
+    INSERT INTO @Lote (Id)
+    SELECT TOP (@TamanhoLote) Id
+    FROM ArquivosStorage
+    WHERE Id > @UltimoId
+    ORDER BY Id;
+
+    IF @@ROWCOUNT = 0
+        BREAK;
+
+    -- Uma linha por posição do nome (DATALENGTH conta os espaços finais,
+    -- que LEN ignora); arquivos que já têm trigramas são ignorados
+    INSERT INTO ArquivosNomeTrigramas (Trigrama, ArquivoId)
+    SELECT DISTINCT
+        SUBSTRING(LOWER(a.NomeOriginal), p.Posicao, 3) COLLATE Latin1_General_BIN2,
+        a.Id
+    FROM ArquivosStorage a
+    INNER JOIN @Lote l ON l.Id = a.Id
+    CROSS APPLY (
+        SELECT TOP (CASE WHEN DATALENGTH(a.NomeOriginal) / 2 >= 3
+                         THEN DATALENGTH(a.NomeOriginal) / 2 - 2 ELSE 0 END)
+            ROW_NUMBER() OVER (ORDER BY (SELECT NULL)) AS Posicao
+        FROM sys.all_columns
+    ) p
+    WHERE NOT EXISTS (SELECT 1 FROM ArquivosNomeTrigramas t WHERE t.ArquivoId = a.Id);
+
+    SELECT TOP 1 @UltimoId = Id FROM @Lote ORDER BY Id DESC;
+END
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ArquivosStorage_Ativos_UploadPor'
+      AND object_id = OBJECT_ID('ArquivosStorage')
+)
+    CREATE INDEX IX_ArquivosStorage_Ativos_UploadPor
+        ON ArquivosStorage(UploadPor, DataUpload DESC, Id DESC)
+        INCLUDE (NomeOriginal, TamanhoBytes, TipoConteudo, Pasta)
+        WHERE Ativo = 1;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ArquivosStorage_Ativos_TipoConteudo'
+      AND object_id = OBJECT_ID('ArquivosStorage')
+)
+    CREATE INDEX IX_ArquivosStorage_Ativos_TipoConteudo
+        ON ArquivosStorage(TipoConteudo, DataUpload DESC, Id DESC)
+        INCLUDE (NomeOriginal, TamanhoBytes, UploadPor, Pasta)
+        WHERE Ativo = 1;
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ArquivosStorage_Ativos_TamanhoBytes'
+      AND object_id = OBJECT_ID('ArquivosStorage')
+)
+    CREATE INDEX IX_ArquivosStorage_Ativos_TamanhoBytes
+        ON ArquivosStorage(TamanhoBytes)
+        INCLUDE (NomeOriginal, TipoConteudo, DataUpload, UploadPor, Pasta)
+        WHERE Ativo = 1;
+GO
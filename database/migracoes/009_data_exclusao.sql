@@ -0,0 +1,32 @@
+-- Migração: data do soft delete (DataExclusao) para o expurgo dos inativos
+-- (src/purge_inactive_files.py)
+-- A data real da exclusão dos arquivos já inativos não é conhecida: eles
+-- recebem a data da migração, e o prazo de retenção conta a partir dela.
+-- O preenchimento é feito em lotes pequenos. Pode ser reexecutado (por
+-- exemplo, depois de publicar a nova versão da API).
+IF COL_LENGTH('ArquivosStorage', 'DataExclusao') IS NULL
+    ALTER TABLE ArquivosStorage ADD DataExclusao DATETIME2 NULL;
+GO
+
+DECLARE @TamanhoLote INT = 5000;
+
+WHILE 1 = 1
+BEGIN
+    UPDATE TOP (@TamanhoLote) ArquivosStorage
+    SET DataExclusao = GETDATE()
+    WHERE Ativo = 0 AND DataExclusao IS NULL;
+
+    IF @@ROWCOUNT < @TamanhoLote
+        BREAK;
+END
+GO
+
+IF NOT EXISTS (
+    SELECT 1 FROM sys.indexes
+    WHERE name = 'IX_ArquivosStorage_Inativos_DataExclusao'
+      AND object_id = OBJECT_ID('ArquivosStorage')
+)
+    CREATE INDEX IX_ArquivosStorage_Inativos_DataExclusao
+        ON ArquivosStorage(DataExclusao, Id)
+        WHERE Ativo = 0;
+GO
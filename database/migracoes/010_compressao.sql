@@ -0,0 +1,19 @@
+-- Migração: compressão dos arquivos no storage (UPLOAD_COMPRESSION)
+-- Registros existentes ficam com NULL (blob sem compressão). Aplique antes
+-- de publicar a nova versão da API.
+IF COL_LENGTH('ArquivosStorage', 'CodificacaoConteudo') IS NULL
+    ALTER TABLE ArquivosStorage ADD CodificacaoConteudo VARCHAR(10) NULL;
+GO
+
+IF COL_LENGTH('ArquivosStorage', 'TamanhoArmazenadoBytes') IS NULL
+    ALTER TABLE ArquivosStorage ADD TamanhoArmazenadoBytes BIGINT NULL;
+GO
+
+-- Deduplicação: o blob reaproveitado traz a compressão e o tamanho armazenado
+CREATE INDEX IX_ArquivosStorage_HashSha256
+    ON ArquivosStorage(HashSha256, TamanhoBytes)
+    INCLUDE (NomeArmazenado, CaminhoBlob, UrlBlob, Ativo, Container, ETagBlob,
+             CodificacaoConteudo, TamanhoArmazenadoBytes)
+    WHERE HashSha256 IS NOT NULL
+    WITH (DROP_EXISTING = ON);
+GO
@@ -0,0 +1,35 @@
+-- Migração: miniaturas e pré-visualizações das imagens (/download?variante=)
+-- Cria ArquivosDerivados (ver create_table_derivados.sql). As imagens já
+-- existentes não são processadas aqui: a variante é gerada no primeiro
+-- pedido, e até lá o download entrega o original. Pode ser reexecutado.
+IF OBJECT_ID('ArquivosDerivados') IS NULL
+BEGIN
+    CREATE TABLE ArquivosDerivados (
+        ArquivoId UNIQUEIDENTIFIER NOT NULL,
+        Variante VARCHAR(20) NOT NULL,
+        Status VARCHAR(20) NOT NULL DEFAULT 'pendente',
+        Tentativas INT NOT NULL DEFAULT 0,
+        CaminhoBlob NVARCHAR(450) NULL,
+        TamanhoBytes BIGINT NULL,
+        Largura INT NULL,
+        Altura INT NULL,
+        ETagBlob NVARCHAR(100) NULL,
+        DataCriacao DATETIME2 NOT NULL DEFAULT GETDATE(),
+        DataConclusao DATETIME2 NULL,
+        Erro NVARCHAR(500) NULL,
+        CONSTRAINT PK_ArquivosDerivados PRIMARY KEY (ArquivoId, Variante),
+        CONSTRAINT FK_ArquivosDerivados_ArquivosStorage FOREIGN KEY (ArquivoId)
+            REFERENCES ArquivosStorage(Id) ON DELETE CASCADE
+    );
+
+    CREATE INDEX IX_ArquivosDerivados_CaminhoBlob
+        ON ArquivosDerivados(CaminhoBlob)
+        WHERE CaminhoBlob IS NOT NULL;
+END
+GO
+
+-- Bancos em que a tabela foi criada sem a contagem de tentativas
+IF COL_LENGTH('ArquivosDerivados', 'Tentativas') IS NULL
+    ALTER TABLE ArquivosDerivados ADD Tentativas INT NOT NULL
+        CONSTRAINT DF_ArquivosDerivados_Tentativas DEFAULT 0;
+GO
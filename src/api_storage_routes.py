@@ -3,11 +3,20 @@ Endpoints da API Flask para gerenciamento de arquivos no Azure Blob Storage
 Integração com Power Apps
 """
 
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, request, jsonify, send_file, current_app
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
+from urllib.parse import quote
+from contextlib import ExitStack
+from datetime import datetime
 import os
-import io
-from azure_storage_manager import AzureStorageManager
+import tempfile
+import unicodedata
+from azure_storage_manager import AzureStorageManager, CONTENT_ENCODINGS, DERIVATIVE_VARIANTS
+from blob_disk_cache import BlobDiskCache
+from metadata_cache import MetadataCache, LocalMetadataStore, RedisMetadataStore
+from json_upload_stream import JsonUploadParser
 
 # Criar Blueprint
 storage_bp = Blueprint('storage', __name__, url_prefix='/api/arquivos')
@@ -17,16 +26,101 @@ STORAGE_ACCOUNT = os.getenv('AZURE_STORAGE_ACCOUNT', 'staudicoreapiprod')
 STORAGE_KEY = os.getenv('AZURE_STORAGE_KEY')
 CONTAINER_NAME = os.getenv('AZURE_STORAGE_CONTAINER', 'arquivos')
 SQL_CONNECTION_STRING = os.getenv('SQL_CONNECTION_STRING')
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE_MB', 4)) * 1024 * 1024
+UPLOAD_MAX_CONCURRENCY = int(os.getenv('UPLOAD_MAX_CONCURRENCY', 4))
+UPLOAD_POOL_SIZE = int(os.getenv('UPLOAD_POOL_SIZE', 16))
+BATCH_UPLOAD_CONCURRENCY = int(os.getenv('BATCH_UPLOAD_CONCURRENCY', 4))
+MAX_BATCH_FILES = int(os.getenv('MAX_BATCH_FILES', 50))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv('DOWNLOAD_CHUNK_SIZE_MB', 4)) * 1024 * 1024
+DOWNLOAD_CACHE_DIR = os.getenv('DOWNLOAD_CACHE_DIR')
+DOWNLOAD_CACHE_MAX_MB = int(os.getenv('DOWNLOAD_CACHE_MAX_MB', 1024))
+DB_POOL_MIN_SIZE = int(os.getenv('DB_POOL_MIN_SIZE', 1))
+DB_POOL_MAX_SIZE = int(os.getenv('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))
+DB_POOL_MAX_AGE = int(os.getenv('DB_POOL_MAX_AGE', 1800))
+METADATA_CACHE_TTL = int(os.getenv('METADATA_CACHE_TTL', 60))
+METADATA_CACHE_NEGATIVE_TTL = int(os.getenv('METADATA_CACHE_NEGATIVE_TTL', 10))
+METADATA_CACHE_MAX_ENTRIES = int(os.getenv('METADATA_CACHE_MAX_ENTRIES', 10000))
+METADATA_CACHE_REDIS_URL = os.getenv('METADATA_CACHE_REDIS_URL')
+DIRECT_UPLOAD_EXPIRY_MINUTES = int(os.getenv('DIRECT_UPLOAD_EXPIRY_MINUTES', 15))
+MAX_BULK_DELETE_IDS = int(os.getenv('MAX_BULK_DELETE_IDS', 10000))
+MAX_BATCH_URL_IDS = int(os.getenv('MAX_BATCH_URL_IDS', 500))
+SAS_EXPIRY_BUCKET_MINUTES = int(os.getenv('SAS_EXPIRY_BUCKET_MINUTES', 15))
+ZIP_PREFETCH = int(os.getenv('ZIP_PREFETCH', 3))
+ZIP_PREFETCH_POOL_SIZE = int(os.getenv('ZIP_PREFETCH_POOL_SIZE', 16))
+MAX_ZIP_FILES = int(os.getenv('MAX_ZIP_FILES', 1000))
+UPLOAD_COMPRESSION = os.getenv('UPLOAD_COMPRESSION') or None
+UPLOAD_COMPRESSION_MIN_SIZE = int(os.getenv('UPLOAD_COMPRESSION_MIN_KB', 8)) * 1024
+DERIVATIVE_WORKERS = int(os.getenv('DERIVATIVE_WORKERS', 2))
+DERIVATIVE_QUEUE_SIZE = int(os.getenv('DERIVATIVE_QUEUE_SIZE', 100))
 
 # Inicializar gerenciador de storage
 storage_manager = AzureStorageManager(
     storage_account=STORAGE_ACCOUNT,
     storage_key=STORAGE_KEY,
     container_name=CONTAINER_NAME,
-    sql_connection_string=SQL_CONNECTION_STRING
+    sql_connection_string=SQL_CONNECTION_STRING,
+    upload_chunk_size=UPLOAD_CHUNK_SIZE,
+    upload_max_concurrency=UPLOAD_MAX_CONCURRENCY,
+    upload_pool_size=UPLOAD_POOL_SIZE,
+    batch_upload_concurrency=BATCH_UPLOAD_CONCURRENCY,
+    download_chunk_size=DOWNLOAD_CHUNK_SIZE,
+    disk_cache=BlobDiskCache(
+        DOWNLOAD_CACHE_DIR,
+        max_bytes=DOWNLOAD_CACHE_MAX_MB * 1024 * 1024
+    ) if DOWNLOAD_CACHE_DIR else None,
+    db_pool_min_size=DB_POOL_MIN_SIZE,
+    db_pool_max_size=DB_POOL_MAX_SIZE,
+    db_pool_timeout=DB_POOL_TIMEOUT,
+    db_pool_max_age=DB_POOL_MAX_AGE,
+    metadata_cache=MetadataCache(
+        ttl=METADATA_CACHE_TTL,
+        negative_ttl=METADATA_CACHE_NEGATIVE_TTL,
+        store=RedisMetadataStore(METADATA_CACHE_REDIS_URL) if METADATA_CACHE_REDIS_URL
+        else LocalMetadataStore(METADATA_CACHE_MAX_ENTRIES)
+    ) if METADATA_CACHE_TTL > 0 else None,
+    sas_expiry_bucket_minutes=SAS_EXPIRY_BUCKET_MINUTES,
+    zip_prefetch=ZIP_PREFETCH,
+    zip_prefetch_pool_size=ZIP_PREFETCH_POOL_SIZE,
+    compression=UPLOAD_COMPRESSION,
+    compression_min_size=UPLOAD_COMPRESSION_MIN_SIZE,
+    derivative_workers=DERIVATIVE_WORKERS,
+    derivative_queue_size=DERIVATIVE_QUEUE_SIZE
 )
 
 
+@storage_bp.before_request
+def _begin_db_request():
+    """As consultas de uma requisição reaproveitam a mesma conexão do pool, se livre"""
+    storage_manager.db_pool.begin_request()
+
+
+@storage_bp.teardown_request
+def _end_db_request(error):
+    storage_manager.db_pool.end_request()
+
+
+def _attachment_headers(response: Response, filename: str) -> None:
+    """Define Content-Disposition de anexo (mesma codificação do send_file)"""
+    try:
+        filename.encode("ascii")
+        names = {"filename": filename}
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize("NFKD", filename).encode("ascii", "ignore").decode("ascii")
+        names = {"filename": simple, "filename*": f"UTF-8''{quote(filename, safe='!#$&+^`|~')}"}
+    response.headers.set("Content-Disposition", "attachment", **names)
+
+
+def _cache_headers(response: Response, etag, last_modified=None, weak=False) -> None:
+    """Define os validadores do cache HTTP (o cliente revalida a cada uso)"""
+    if etag:
+        response.set_etag(etag.strip('"'), weak=weak)
+    if last_modified:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+
+
 @storage_bp.route('/upload', methods=['POST'])
 def upload_file():
     """
@@ -54,22 +148,35 @@ def upload_file():
         # Verificar se é JSON (base64) ou multipart
         if request.content_type and 'application/json' in request.content_type:
             # Formato JSON com base64 (comum no Power Apps)
-            data = request.get_json()
+            # O corpo é lido em partes e o base64 decodificado para um buffer
+            # que só vai para disco acima de um bloco de upload. A ordem dos
+            # campos no JSON não é garantida, então os metadados (pasta,
+            # usuário, tags) só são conhecidos depois de ler o corpo inteiro.
+            with tempfile.SpooledTemporaryFile(max_size=UPLOAD_CHUNK_SIZE) as file_buffer:
+                parser = JsonUploadParser(request.stream)
+                try:
+                    data = parser.parse(file_buffer)
+                except ValueError as e:
+                    return jsonify({
+                        "sucesso": False,
+                        "mensagem": f"JSON ou base64 inválido: {str(e)}"
+                    }), 400
 
-            if not data or 'arquivo' not in data or 'nome_arquivo' not in data:
-                return jsonify({
-                    "sucesso": False,
-                    "mensagem": "Campos obrigatórios: 'arquivo' (base64) e 'nome_arquivo'"
-                }), 400
+                if not parser.file_found or 'nome_arquivo' not in data:
+                    return jsonify({
+                        "sucesso": False,
+                        "mensagem": "Campos obrigatórios: 'arquivo' (base64) e 'nome_arquivo'"
+                    }), 400
 
-            resultado = storage_manager.upload_file_base64(
-                file_content_base64=data['arquivo'],
-                original_filename=data['nome_arquivo'],
-                content_type=data.get('tipo_conteudo', 'application/octet-stream'),
-                upload_user=data.get('usuario'),
-                tags=data.get('tags'),
-                folder=data.get('pasta')
-            )
+                file_buffer.seek(0)
+                resultado = storage_manager.upload_file_stream(
+                    file_stream=file_buffer,
+                    original_filename=data['nome_arquivo'],
+                    content_type=data.get('tipo_conteudo') or 'application/octet-stream',
+                    upload_user=data.get('usuario'),
+                    tags=data.get('tags'),
+                    folder=data.get('pasta')
+                )
 
         else:
             # Formato multipart/form-data
@@ -87,11 +194,9 @@ def upload_file():
                     "mensagem": "Nome de arquivo vazio"
                 }), 400
 
-            # Ler conteúdo do arquivo
-            file_content = file.read()
-
-            resultado = storage_manager.upload_file(
-                file_content=file_content,
+            # Enviar o conteúdo em blocos, sem carregar o arquivo inteiro em memória
+            resultado = storage_manager.upload_file_stream(
+                file_stream=file.stream,
                 original_filename=secure_filename(file.filename),
                 content_type=file.content_type or 'application/octet-stream',
                 upload_user=request.form.get('usuario'),
@@ -102,6 +207,345 @@ def upload_file():
         status_code = 200 if resultado.get('sucesso') else 400
         return jsonify(resultado), status_code
 
+    except HTTPException:
+        # Ex.: 413 quando o corpo excede MAX_CONTENT_LENGTH
+        raise
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/upload/lote', methods=['POST'])
+def upload_files():
+    """
+    Endpoint para upload de vários arquivos em uma única requisição
+
+    Os arquivos são enviados ao storage em paralelo e registrados no banco
+    em uma única transação. A resposta traz o resultado de cada arquivo.
+
+    Exemplo multipart/form-data (recomendado):
+    - files: arquivos binários (campo repetido)
+    - usuario: usuário que fez upload (opcional)
+    - pasta: pasta dentro do container (opcional)
+
+    Exemplo JSON (Power Apps):
+    {
+        "arquivos": [
+            {"arquivo": "base64...", "nome_arquivo": "foto1.jpg", "tipo_conteudo": "image/jpeg"},
+            {"arquivo": "base64...", "nome_arquivo": "foto2.jpg", "tipo_conteudo": "image/jpeg"}
+        ],
+        "usuario": "usuario@email.com",
+        "pasta": "fotos" (opcional)
+    }
+
+    O JSON é lido em partes, como no /upload: o base64 de cada arquivo é
+    decodificado para um buffer próprio, que só vai para disco acima de um
+    bloco de upload.
+    """
+    # Buffers dos arquivos do lote JSON, abertos até o fim do upload
+    with ExitStack() as buffers:
+        try:
+            if request.content_type and 'application/json' in request.content_type:
+                parser = JsonUploadParser(request.stream)
+                try:
+                    data, arquivos = parser.parse_list(
+                        'arquivos',
+                        lambda: buffers.enter_context(tempfile.SpooledTemporaryFile(max_size=UPLOAD_CHUNK_SIZE)),
+                        max_items=MAX_BATCH_FILES
+                    )
+                except ValueError as e:
+                    return jsonify({
+                        "sucesso": False,
+                        "mensagem": f"Lote inválido: {str(e)}"
+                    }), 400
+
+                if any(buffer is None or 'nome_arquivo' not in a for a, buffer in arquivos):
+                    return jsonify({
+                        "sucesso": False,
+                        "mensagem": "Cada item de 'arquivos' exige 'arquivo' (base64) e 'nome_arquivo'"
+                    }), 400
+
+                files = []
+                for a, buffer in arquivos:
+                    buffer.seek(0)
+                    files.append({
+                        "file_stream": buffer,
+                        "original_filename": a['nome_arquivo'],
+                        "content_type": a.get('tipo_conteudo') or 'application/octet-stream',
+                        "tags": a.get('tags')
+                    })
+                upload_user = data.get('usuario')
+                folder = data.get('pasta')
+
+            else:
+                files = [
+                    {
+                        "file_stream": f.stream,
+                        "original_filename": secure_filename(f.filename),
+                        "content_type": f.content_type or 'application/octet-stream',
+                        "tags": request.form.get('tags')
+                    }
+                    for f in request.files.getlist('files')
+                    if f.filename
+                ]
+                upload_user = request.form.get('usuario')
+                folder = request.form.get('pasta')
+
+            if not files:
+                return jsonify({
+                    "sucesso": False,
+                    "mensagem": "Nenhum arquivo enviado"
+                }), 400
+
+            if len(files) > MAX_BATCH_FILES:
+                return jsonify({
+                    "sucesso": False,
+                    "mensagem": f"Máximo de {MAX_BATCH_FILES} arquivos por lote"
+                }), 400
+
+            resultado = storage_manager.upload_files(
+                files=files,
+                upload_user=upload_user,
+                folder=folder
+            )
+
+            status_code = 200 if resultado.get('sucesso') else 400
+            return jsonify(resultado), status_code
+
+        except HTTPException:
+            raise
+        except Exception as e:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": f"Erro no servidor: {str(e)}"
+            }), 500
+
+
+@storage_bp.route('/upload/sessao', methods=['POST'])
+def create_upload_session():
+    """
+    Endpoint para iniciar um upload em partes (retomável)
+
+    Indicado para arquivos grandes em redes instáveis: se uma requisição
+    falhar, apenas os chunks que faltam precisam ser reenviados.
+
+    Exemplo JSON:
+    {
+        "nome_arquivo": "exame.pdf",
+        "tamanho_bytes": 41943040,
+        "tipo_conteudo": "application/pdf",
+        "usuario": "usuario@email.com",
+        "pasta": "documentos_medicos" (opcional)
+    }
+
+    Fluxo:
+    1. POST /upload/sessao -> retorna sessao_id, tamanho_chunk e total_chunks
+    2. PUT /upload/sessao/<sessao_id>/chunk/<n> com o conteúdo binário de cada chunk
+    3. POST /upload/sessao/<sessao_id>/concluir
+    Após uma falha, GET /upload/sessao/<sessao_id> informa os chunks pendentes.
+    """
+    try:
+        data = request.get_json(silent=True)
+
+        if not isinstance(data, dict) or 'nome_arquivo' not in data or 'tamanho_bytes' not in data:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": "Campos obrigatórios: 'nome_arquivo' e 'tamanho_bytes'"
+            }), 400
+
+        try:
+            tamanho_bytes = int(data['tamanho_bytes'])
+        except (TypeError, ValueError):
+            return jsonify({
+                "sucesso": False,
+                "mensagem": "Campo 'tamanho_bytes' inválido: informe o tamanho do arquivo em bytes"
+            }), 400
+        max_content_length = current_app.config.get('MAX_CONTENT_LENGTH')
+        if max_content_length and tamanho_bytes > max_content_length:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": f"Arquivo muito grande. Máximo: {max_content_length // (1024 * 1024)} MB"
+            }), 413
+
+        resultado = storage_manager.create_upload_session(
+            original_filename=data['nome_arquivo'],
+            content_type=data.get('tipo_conteudo') or 'application/octet-stream',
+            file_size=tamanho_bytes,
+            upload_user=data.get('usuario'),
+            tags=data.get('tags'),
+            folder=data.get('pasta')
+        )
+
+        status_code = 200 if resultado.get('sucesso') else 400
+        return jsonify(resultado), status_code
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/upload/sessao/<sessao_id>', methods=['GET'])
+def get_upload_session(sessao_id):
+    """
+    Endpoint para consultar o andamento de um upload em partes
+
+    Retorna os chunks já recebidos e os pendentes
+    """
+    try:
+        resultado = storage_manager.get_upload_session(sessao_id)
+
+        status_code = 200 if resultado.get('sucesso') else 404
+        return jsonify(resultado), status_code
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/upload/sessao/<sessao_id>/chunk/<int:indice>', methods=['PUT'])
+def upload_session_chunk(sessao_id, indice):
+    """
+    Endpoint para enviar um chunk de um upload em partes
+
+    O corpo da requisição é o conteúdo binário do chunk. Todos os chunks têm
+    'tamanho_chunk' bytes, exceto o último.
+
+    Exemplo:
+    PUT /api/arquivos/upload/sessao/<sessao_id>/chunk/0
+    """
+    try:
+        if request.content_length is None:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": "Cabeçalho Content-Length obrigatório"
+            }), 411
+
+        resultado = storage_manager.upload_session_chunk(
+            session_id=sessao_id,
+            chunk_index=indice,
+            chunk_stream=request.stream,
+            length=request.content_length
+        )
+
+        status_code = 200 if resultado.get('sucesso') else 400
+        return jsonify(resultado), status_code
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/upload/sessao/<sessao_id>/concluir', methods=['POST'])
+def commit_upload_session(sessao_id):
+    """
+    Endpoint para concluir um upload em partes
+
+    Confirma os chunks recebidos e registra o arquivo. Se houver chunks
+    pendentes, retorna a lista em 'chunks_pendentes'.
+    """
+    try:
+        resultado = storage_manager.commit_upload_session(sessao_id)
+
+        status_code = 200 if resultado.get('sucesso') else 400
+        return jsonify(resultado), status_code
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/upload/sas', methods=['POST'])
+def create_direct_upload():
+    """
+    Endpoint para reservar um upload direto ao Azure Storage
+
+    O arquivo não passa pela API: o cliente recebe uma URL SAS que só
+    permite criar o blob reservado, válida por poucos minutos. O tamanho
+    declarado está sujeito ao mesmo limite dos demais uploads
+    (MAX_FILE_SIZE_MB).
+
+    Exemplo JSON:
+    {
+        "nome_arquivo": "video.mp4",
+        "tamanho_bytes": 31457280,
+        "tipo_conteudo": "video/mp4",
+        "usuario": "usuario@email.com",
+        "pasta": "videos" (opcional)
+    }
+
+    Fluxo:
+    1. POST /upload/sas -> retorna sessao_id, url_upload e cabecalhos
+    2. PUT url_upload com o conteúdo e os cabecalhos retornados (direto no Azure)
+    3. POST /upload/sas/<sessao_id>/confirmar
+    """
+    try:
+        data = request.get_json(silent=True)
+
+        if not isinstance(data, dict) or 'nome_arquivo' not in data or 'tamanho_bytes' not in data:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": "Campos obrigatórios: 'nome_arquivo' e 'tamanho_bytes'"
+            }), 400
+
+        try:
+            tamanho_bytes = int(data['tamanho_bytes'])
+        except (TypeError, ValueError):
+            return jsonify({
+                "sucesso": False,
+                "mensagem": "Campo 'tamanho_bytes' inválido: informe o tamanho do arquivo em bytes"
+            }), 400
+        max_content_length = current_app.config.get('MAX_CONTENT_LENGTH')
+        if max_content_length and tamanho_bytes > max_content_length:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": f"Arquivo muito grande. Máximo: {max_content_length // (1024 * 1024)} MB"
+            }), 413
+
+        resultado = storage_manager.create_direct_upload(
+            original_filename=data['nome_arquivo'],
+            content_type=data.get('tipo_conteudo') or 'application/octet-stream',
+            file_size=tamanho_bytes,
+            upload_user=data.get('usuario'),
+            tags=data.get('tags'),
+            folder=data.get('pasta'),
+            expiry_minutes=DIRECT_UPLOAD_EXPIRY_MINUTES
+        )
+
+        status_code = 200 if resultado.get('sucesso') else 400
+        return jsonify(resultado), status_code
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/upload/sas/<sessao_id>/confirmar', methods=['POST'])
+def confirm_direct_upload(sessao_id):
+    """
+    Endpoint para confirmar um upload direto ao Azure Storage
+
+    Confere tamanho e tipo do blob enviado e registra o arquivo
+    """
+    try:
+        resultado = storage_manager.confirm_direct_upload(sessao_id)
+
+        status_code = 200 if resultado.get('sucesso') else 400
+        return jsonify(resultado), status_code
+
     except Exception as e:
         return jsonify({
             "sucesso": False,
@@ -117,39 +561,259 @@ def download_file(file_id):
     Parâmetros de query:
     - url_apenas: Se true, retorna apenas a URL com SAS token (padrão: false)
     - validade_horas: Tempo de validade da URL em horas (padrão: 1)
+    - variante: Miniatura de uma imagem, "thumb" (200px) ou "preview"
+      (1024px), em JPEG; enquanto a variante não estiver pronta, é enviado o
+      original. O cabeçalho X-Variante informa o que foi enviado.
+
+    O download direto aceita os cabeçalhos Range (um intervalo de bytes,
+    resposta 206) e If-Range, e responde 304 a If-None-Match (ETag do blob)
+    e If-Modified-Since (data do upload) sem ler o conteúdo.
+
+    Arquivos gravados comprimidos são enviados comprimidos (Content-Encoding)
+    se o cliente aceitar a compressão (Accept-Encoding), e descomprimidos
+    caso contrário; para eles, Range não é suportado.
 
     Exemplos:
     - GET /api/arquivos/download/123e4567-e89b-12d3  -> Baixa o arquivo diretamente
     - GET /api/arquivos/download/123e4567-e89b-12d3?url_apenas=true  -> Retorna URL temporária
+    - GET /api/arquivos/download/123e4567-e89b-12d3?variante=thumb  -> Baixa a miniatura
     """
     try:
         url_apenas = request.args.get('url_apenas', 'false').lower() == 'true'
         validade_horas = int(request.args.get('validade_horas', 1))
+        variante = request.args.get('variante') or None
+
+        if variante and variante not in DERIVATIVE_VARIANTS:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": f"Variante inválida; use uma de: {', '.join(DERIVATIVE_VARIANTS)}"
+            }), 400
 
         if url_apenas:
             # Retornar apenas URL com SAS token
             resultado = storage_manager.generate_download_url(
                 file_id=file_id,
-                expiry_hours=validade_horas
+                expiry_hours=validade_horas,
+                variant=variante
             )
 
             status_code = 200 if resultado.get('sucesso') else 404
             return jsonify(resultado), status_code
 
         else:
-            # Download direto do arquivo
-            resultado = storage_manager.download_file(file_id)
+            # Download direto do arquivo, enviado em partes conforme é lido
+            # do storage
+            file_info = storage_manager.get_file_info(file_id)
+            if not file_info:
+                return jsonify({
+                    "sucesso": False,
+                    "mensagem": "Arquivo não encontrado"
+                }), 404
+
+            if variante:
+                file_info = storage_manager.get_derivative_info(file_info, variante) or file_info
+            variante_enviada = file_info.get('variante') or 'original'
+
+            codificacao = file_info.get('codificacao_conteudo')
+            accept_ranges = 'none' if codificacao else 'bytes'
+
+            # GET condicional: responder 304 sem ler o conteúdo do blob
+            etag = file_info['etag_blob']
+            if request.if_none_match or request.if_range:
+                etag = storage_manager.get_blob_etag(file_info)
+            data_upload = file_info['data_upload']
+            last_modified = datetime.fromisoformat(data_upload) if data_upload else None
+            if not is_resource_modified(
+                request.environ,
+                etag=etag.strip('"') if etag else None,
+                last_modified=last_modified
+            ):
+                response = Response(status=304)
+                response.headers['Accept-Ranges'] = accept_ranges
+                response.headers['X-Variante'] = variante_enviada
+                _cache_headers(response, etag, last_modified, weak=bool(codificacao))
+                if codificacao:
+                    response.vary.add('Accept-Encoding')
+                return response
+
+            # Range: apenas um intervalo de bytes é suportado; pedidos com
+            # vários intervalos (ou de arquivos comprimidos) recebem o
+            # arquivo inteiro
+            byte_range = None
+            tamanho_total = file_info['tamanho_bytes']
+            if (not codificacao and request.range and request.range.units == 'bytes'
+                    and len(request.range.ranges) == 1):
+                byte_range = request.range.range_for_length(tamanho_total)
+                if byte_range is None:
+                    response = jsonify({
+                        "sucesso": False,
+                        "mensagem": "Intervalo solicitado inválido"
+                    })
+                    response.status_code = 416
+                    response.headers['Content-Range'] = f"bytes */{tamanho_total}"
+                    response.headers['Accept-Ranges'] = 'bytes'
+                    return response
+
+            resultado = storage_manager.download_file_stream(
+                file_id,
+                byte_range=byte_range,
+                if_range=request.if_range.etag or request.if_range.date,
+                file_info=file_info,
+                accept_encodings=[
+                    encoding for encoding in CONTENT_ENCODINGS
+                    if request.accept_encodings.quality(encoding) > 0
+                ]
+            )
 
             if not resultado.get('sucesso'):
                 return jsonify(resultado), 404
 
-            # Retornar arquivo como stream
-            return send_file(
-                io.BytesIO(resultado['conteudo']),
-                mimetype=resultado['tipo_conteudo'],
-                as_attachment=True,
-                download_name=resultado['nome_original']
+            if resultado.get('arquivo_cache'):
+                # Cópia local: send_file repassa o arquivo pelo file_wrapper do
+                # servidor (sendfile) e trata Range/If-Range sozinho
+                response = send_file(
+                    resultado['arquivo_cache'],
+                    mimetype=resultado['tipo_conteudo'] or 'application/octet-stream',
+                    as_attachment=True,
+                    download_name=resultado['nome_original'],
+                    conditional=True,
+                    etag=resultado['etag'].strip('"'),
+                    last_modified=last_modified
+                )
+                _cache_headers(response, resultado['etag'], last_modified)
+                response.headers['X-Variante'] = variante_enviada
+                return response
+
+            response = Response(
+                resultado['chunks'],
+                mimetype=resultado['tipo_conteudo'] or 'application/octet-stream',
+                direct_passthrough=True
             )
+            response.content_length = resultado['tamanho_bytes']
+            response.headers['Accept-Ranges'] = accept_ranges
+            response.headers['X-Variante'] = variante_enviada
+            # As duas representações (comprimida ou não) compartilham o ETag
+            # do blob: fraco, para não valer como validador de intervalos
+            _cache_headers(response, resultado['etag'] or etag, last_modified, weak=bool(codificacao))
+            if codificacao:
+                response.vary.add('Accept-Encoding')
+            if resultado['codificacao']:
+                response.content_encoding = resultado['codificacao']
+            if resultado['parcial']:
+                inicio, fim = resultado['intervalo']
+                response.status_code = 206
+                response.headers['Content-Range'] = f"bytes {inicio}-{fim - 1}/{tamanho_total}"
+            _attachment_headers(response, resultado['nome_original'])
+            return response
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/download/urls', methods=['POST'])
+def generate_download_urls():
+    """
+    Endpoint para obter as URLs temporárias (SAS) de vários arquivos em uma
+    única requisição (ex.: galerias de miniaturas)
+
+    Exemplo JSON:
+    {
+        "ids": ["123e4567-...", "..."],
+        "validade_horas": 1 (opcional)
+    }
+
+    Dentro do mesmo intervalo de expiração, um arquivo recebe sempre a mesma
+    URL, que pode ser reaproveitada pelo cache HTTP do cliente.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids')
+
+        if not isinstance(ids, list) or not ids:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": "Campo obrigatório: 'ids' (lista)"
+            }), 400
+
+        if len(ids) > MAX_BATCH_URL_IDS:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": f"Máximo de {MAX_BATCH_URL_IDS} IDs por requisição"
+            }), 400
+
+        resultado = storage_manager.generate_download_urls(
+            file_ids=ids,
+            expiry_hours=int(data.get('validade_horas', 1))
+        )
+
+        status_code = 200 if resultado.get('sucesso') else 400
+        return jsonify(resultado), status_code
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/download/zip', methods=['GET', 'POST'])
+def export_zip():
+    """
+    Endpoint para baixar vários arquivos em um único ZIP
+
+    O ZIP é montado enquanto é enviado (sem Content-Length): cada arquivo é
+    gravado conforme é lido do storage, e os próximos são abertos em
+    paralelo. Arquivos que não puderam ser incluídos são listados em
+    ERROS.txt, dentro do ZIP.
+
+    Parâmetros (query no GET, JSON no POST) - informe 'ids' ou 'pasta':
+    - ids: IDs dos arquivos (no GET, 'id' repetido)
+    - pasta: Pasta exportada
+    - subpastas: Se true, inclui as subpastas, mantendo a estrutura (padrão: false)
+
+    Exemplos:
+    - GET /api/arquivos/download/zip?pasta=pacientes/123&subpastas=true
+    - POST /api/arquivos/download/zip  {"ids": ["123e4567-...", "..."]}
+    """
+    try:
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            ids = data.get('ids') or []
+            pasta = data.get('pasta')
+            subpastas = bool(data.get('subpastas'))
+        else:
+            ids = request.args.getlist('id')
+            pasta = request.args.get('pasta')
+            subpastas = request.args.get('subpastas', 'false').lower() == 'true'
+
+        if not isinstance(ids, list) or bool(ids) == (pasta is not None):
+            return jsonify({
+                "sucesso": False,
+                "mensagem": "Informe 'ids' (lista) ou 'pasta'"
+            }), 400
+
+        resultado = storage_manager.export_zip(
+            file_ids=ids,
+            folder=pasta,
+            include_subfolders=subpastas,
+            max_files=MAX_ZIP_FILES
+        )
+
+        if not resultado.get('sucesso'):
+            status_code = 404 if resultado.get('mensagem') == "Nenhum arquivo encontrado" else 400
+            return jsonify(resultado), status_code
+
+        response = Response(
+            resultado['chunks'],
+            mimetype='application/zip',
+            direct_passthrough=True
+        )
+        response.cache_control.no_store = True
+        _attachment_headers(response, resultado['nome_arquivo'])
+        return response
 
     except Exception as e:
         return jsonify({
@@ -163,7 +827,8 @@ def get_file_info(file_id):
     """
     Endpoint para obter informações de um arquivo
 
-    Retorna metadados do arquivo sem fazer download
+    Retorna metadados do arquivo sem fazer download. O ETag acompanha a
+    versão do registro: com If-None-Match, responde 304 se nada mudou.
     """
     try:
         file_info = storage_manager.get_file_info(file_id)
@@ -174,10 +839,12 @@ def get_file_info(file_id):
                 "mensagem": "Arquivo não encontrado"
             }), 404
 
-        return jsonify({
+        response = jsonify({
             "sucesso": True,
             "arquivo": file_info
-        }), 200
+        })
+        _cache_headers(response, f"v{file_info['versao_registro']}")
+        return response.make_conditional(request)
 
     except Exception as e:
         return jsonify({
@@ -194,10 +861,19 @@ def list_files():
     Parâmetros de query:
     - limite: Número máximo de registros (padrão: 100)
     - offset: Offset para paginação (padrão: 0)
+    - cursor: Paginação por cursor (recomendada): vazio na primeira página,
+      depois o 'proximo_cursor' da resposta anterior
     - pasta: Filtrar por pasta específica
+    - subpastas: Se false, lista apenas os arquivos da própria pasta, sem os das
+      subpastas (padrão: true)
+    - tag: Filtrar por tag no formato chave:valor (pode ser repetido)
+    - com_url: Se true, inclui a URL temporária (SAS) de download de cada arquivo
+    - validade_horas: Validade mínima das URLs em horas (padrão: 1)
 
-    Exemplo:
+    Exemplos:
     GET /api/arquivos/listar?limite=50&offset=0&pasta=documentos_medicos
+    GET /api/arquivos/listar?limite=50&cursor=&pasta=documentos_medicos
+    GET /api/arquivos/listar?tag=paciente:123&tag=tipo:exame
     """
     try:
         limite = int(request.args.get('limite', 100))
@@ -207,7 +883,61 @@ def list_files():
         resultado = storage_manager.list_files(
             limit=limite,
             offset=offset,
-            folder=pasta
+            folder=pasta,
+            cursor=request.args.get('cursor'),
+            include_subfolders=request.args.get('subpastas', 'true').lower() == 'true',
+            tags=request.args.getlist('tag'),
+            include_urls=request.args.get('com_url', 'false').lower() == 'true',
+            url_expiry_hours=int(request.args.get('validade_horas', 1))
+        )
+
+        status_code = 200 if resultado.get('sucesso') else 400
+        return jsonify(resultado), status_code
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
+@storage_bp.route('/buscar', methods=['GET'])
+def search_files():
+    """
+    Endpoint para buscar arquivos por vários critérios combinados
+
+    Parâmetros de query (todos opcionais):
+    - nome: Parte do nome original (mínimo 3 caracteres)
+    - usuario: Usuário que fez o upload
+    - tipo_conteudo: Tipo MIME exato, ou "tipo/*" (ex.: image/*)
+    - tamanho_min / tamanho_max: Faixa de tamanho em bytes
+    - data_inicio / data_fim: Faixa da data de upload (ISO 8601; uma data
+      sem horário em data_fim inclui o dia inteiro)
+    - pasta, subpastas, tag: Como em /listar
+    - limite: Número máximo de registros (padrão: 100)
+    - cursor: 'proximo_cursor' da resposta anterior
+
+    Exemplos:
+    GET /api/arquivos/buscar?nome=exame&tipo_conteudo=application/pdf
+    GET /api/arquivos/buscar?usuario=usuario@email.com&data_inicio=2025-01-01&data_fim=2025-01-31
+    """
+    try:
+        tamanho_min = request.args.get('tamanho_min')
+        tamanho_max = request.args.get('tamanho_max')
+
+        resultado = storage_manager.search_files(
+            name=request.args.get('nome'),
+            upload_user=request.args.get('usuario'),
+            content_type=request.args.get('tipo_conteudo'),
+            min_size=int(tamanho_min) if tamanho_min else None,
+            max_size=int(tamanho_max) if tamanho_max else None,
+            date_from=request.args.get('data_inicio'),
+            date_to=request.args.get('data_fim'),
+            folder=request.args.get('pasta'),
+            include_subfolders=request.args.get('subpastas', 'true').lower() == 'true',
+            tags=request.args.getlist('tag'),
+            limit=int(request.args.get('limite', 100)),
+            cursor=request.args.get('cursor')
         )
 
         status_code = 200 if resultado.get('sucesso') else 400
@@ -220,6 +950,30 @@ def list_files():
         }), 500
 
 
+@storage_bp.route('/estatisticas', methods=['GET'])
+def get_statistics():
+    """
+    Endpoint com a quantidade de arquivos ativos e o total de bytes
+
+    Parâmetros de query:
+    - pasta: Pasta (opcional; sem pasta, retorna os totais gerais)
+
+    Exemplo:
+    GET /api/arquivos/estatisticas?pasta=documentos_medicos
+    """
+    try:
+        resultado = storage_manager.get_statistics(folder=request.args.get('pasta'))
+
+        status_code = 200 if resultado.get('sucesso') else 500
+        return jsonify(resultado), status_code
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
 @storage_bp.route('/deletar/<file_id>', methods=['DELETE'])
 def delete_file(file_id):
     """
@@ -248,6 +1002,55 @@ def delete_file(file_id):
         }), 500
 
 
+@storage_bp.route('/deletar/lote', methods=['POST'])
+def delete_files():
+    """
+    Endpoint para deletar vários arquivos em uma única requisição
+
+    Exemplo JSON:
+    {
+        "ids": ["123e4567-...", "..."] (opcional),
+        "pasta": "pacientes/123" (opcional),
+        "subpastas": false,
+        "permanente": false
+    }
+
+    Informe os IDs, a pasta ou ambos (com ambos, apenas os IDs que estão na
+    pasta). Por padrão, faz soft delete (marca como inativo).
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        ids = data.get('ids') or []
+
+        if not isinstance(ids, list) or (not ids and not data.get('pasta')):
+            return jsonify({
+                "sucesso": False,
+                "mensagem": "Informe 'ids' (lista) e/ou 'pasta'"
+            }), 400
+
+        if len(ids) > MAX_BULK_DELETE_IDS:
+            return jsonify({
+                "sucesso": False,
+                "mensagem": f"Máximo de {MAX_BULK_DELETE_IDS} IDs por requisição"
+            }), 400
+
+        resultado = storage_manager.delete_files(
+            file_ids=ids,
+            folder=data.get('pasta'),
+            include_subfolders=bool(data.get('subpastas')),
+            permanent=bool(data.get('permanente'))
+        )
+
+        status_code = 200 if resultado.get('sucesso') else 400
+        return jsonify(resultado), status_code
+
+    except Exception as e:
+        return jsonify({
+            "sucesso": False,
+            "mensagem": f"Erro no servidor: {str(e)}"
+        }), 500
+
+
 @storage_bp.route('/health', methods=['GET'])
 def health_check():
     """
@@ -257,7 +1060,10 @@ def health_check():
         "sucesso": True,
         "mensagem": "Serviço de arquivos funcionando",
         "storage_account": STORAGE_ACCOUNT,
-        "container": CONTAINER_NAME
+        "container": CONTAINER_NAME,
+        "pool_banco": storage_manager.db_pool.stats(),
+        "cache_metadados": storage_manager.metadata_cache.stats() if storage_manager.metadata_cache else None,
+        "cache_disco": storage_manager.disk_cache.stats() if storage_manager.disk_cache else None
     }), 200
 
 
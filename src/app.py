@@ -20,12 +20,15 @@ CORS(app, resources={
     r"/api/*": {
         "origins": "*",
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Variante"]
     }
 })
 
 # Configurações da aplicação
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50 MB max upload
+# O upload é enviado ao Azure em blocos, então o limite não afeta a memória por requisição
+MAX_FILE_SIZE_MB = int(os.getenv('MAX_FILE_SIZE_MB', 50))
+app.config['MAX_CONTENT_LENGTH'] = MAX_FILE_SIZE_MB * 1024 * 1024
 
 # Registrar rotas de storage
 register_storage_routes(app)
@@ -39,10 +42,18 @@ def index():
         "status": "online",
         "endpoints": {
             "upload": "/api/arquivos/upload",
+            "upload_lote": "/api/arquivos/upload/lote",
+            "upload_sessao": "/api/arquivos/upload/sessao",
+            "upload_sas": "/api/arquivos/upload/sas",
             "download": "/api/arquivos/download/{id}",
+            "download_urls": "/api/arquivos/download/urls",
+            "download_zip": "/api/arquivos/download/zip",
             "info": "/api/arquivos/info/{id}",
             "listar": "/api/arquivos/listar",
+            "buscar": "/api/arquivos/buscar",
+            "estatisticas": "/api/arquivos/estatisticas",
             "deletar": "/api/arquivos/deletar/{id}",
+            "deletar_lote": "/api/arquivos/deletar/lote",
             "health": "/api/arquivos/health"
         },
         "documentacao": "/api/docs"
@@ -65,7 +76,7 @@ def docs():
 def request_entity_too_large(error):
     return {
         "sucesso": False,
-        "mensagem": "Arquivo muito grande. Máximo: 50 MB"
+        "mensagem": f"Arquivo muito grande. Máximo: {MAX_FILE_SIZE_MB} MB"
     }, 413
 
 @app.errorhandler(404)
@@ -4,13 +4,386 @@ Integração com Power Apps
 """
 
 import os
+import io
+import re
+import gzip
+import zlib
 import uuid
+import json
 import base64
+import logging
+import binascii
+import hashlib
+import tempfile
+import threading
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import chain
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any, BinaryIO
-import pyodbc
-from azure.storage.blob import BlobServiceClient, generate_blob_sas, BlobSasPermissions
-from azure.core.exceptions import ResourceExistsError, ResourceNotFoundError
+from typing import Optional, Dict, Any, BinaryIO, List, Tuple, Union
+import requests
+from azure.core import MatchConditions
+from azure.core.pipeline.transport import RequestsTransport
+from azure.storage.blob import (
+    BlobServiceClient,
+    BlobBlock,
+    BlobPrefix,
+    ContentSettings,
+    generate_blob_sas,
+    BlobSasPermissions
+)
+from azure.core.exceptions import AzureError, ResourceExistsError, ResourceModifiedError, ResourceNotFoundError
+from json_upload_stream import Base64DecodingReader
+from blob_disk_cache import BlobDiskCache
+from metadata_cache import MetadataCache
+from sql_connection_pool import (
+    SqlConnectionPool,
+    DEFAULT_POOL_MIN_SIZE,
+    DEFAULT_POOL_MAX_SIZE,
+    DEFAULT_POOL_TIMEOUT,
+    DEFAULT_POOL_MAX_AGE
+)
+
+try:
+    import zstandard
+except ImportError:  # zstandard é opcional (apenas para a compressão zstd)
+    zstandard = None
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow é opcional (apenas para as miniaturas)
+    Image = ImageOps = None
+
+
+logger = logging.getLogger(__name__)
+
+# Tamanho padrão de cada bloco enviado ao Azure durante o upload (4 MB)
+DEFAULT_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Blocos enviados em paralelo por upload
+DEFAULT_UPLOAD_MAX_CONCURRENCY = 4
+
+# Limite de blocos enviados em paralelo no processo (somando todos os uploads)
+DEFAULT_UPLOAD_POOL_SIZE = 16
+
+# Arquivos de um lote enviados em paralelo (cada um usa o pool de blocos)
+DEFAULT_BATCH_UPLOAD_CONCURRENCY = 4
+
+# Tamanho de cada parte lida do Azure nos downloads em streaming (4 MB);
+# limita a memória usada por download
+DEFAULT_DOWNLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Downloads abertos antecipadamente na exportação ZIP, além do arquivo sendo
+# gravado; cada um mantém em memória no máximo uma parte (download_chunk_size)
+DEFAULT_ZIP_PREFETCH = 3
+
+# Limite de downloads abertos antecipadamente no processo (somando todas as
+# exportações)
+DEFAULT_ZIP_PREFETCH_POOL_SIZE = 16
+
+# Limite de arquivos por exportação ZIP
+DEFAULT_ZIP_MAX_FILES = 1000
+
+# Entrada do ZIP com os arquivos que não puderam ser incluídos
+ZIP_ERRORS_ENTRY = "ERROS.txt"
+
+# Compressão dos arquivos no storage (gravada no content_encoding do blob)
+CONTENT_ENCODING_GZIP = "gzip"
+CONTENT_ENCODING_ZSTD = "zstd"
+CONTENT_ENCODINGS = (CONTENT_ENCODING_GZIP, CONTENT_ENCODING_ZSTD)
+
+# Arquivos menores que isso não são comprimidos (o ganho não compensa)
+DEFAULT_COMPRESSION_MIN_SIZE = 8 * 1024
+
+# Tipos comprimidos, além de text/* e dos sufixos +json e +xml
+COMPRESSIBLE_CONTENT_TYPES = frozenset({
+    "application/json",
+    "application/x-ndjson",
+    "application/xml",
+    "application/csv",
+    "application/javascript",
+    "application/sql",
+    "application/x-yaml",
+    "application/yaml"
+})
+
+# Níveis de compressão: rápidos o bastante para comprimir durante o upload
+GZIP_COMPRESSION_LEVEL = 6
+ZSTD_COMPRESSION_LEVEL = 3
+
+# Tamanho de cada leitura do conteúdo a comprimir
+_COMPRESSION_READ_SIZE = 1024 * 1024
+
+# Variantes geradas a partir das imagens: nome e maior lado em pixels
+DERIVATIVE_VARIANTS = {
+    "thumb": 200,
+    "preview": 1024
+}
+
+# Tipos de imagem que geram variantes (gravadas sempre em JPEG)
+DERIVATIVE_SOURCE_CONTENT_TYPES = frozenset({
+    "image/jpeg",
+    "image/png",
+    "image/gif",
+    "image/webp",
+    "image/bmp",
+    "image/tiff"
+})
+DERIVATIVE_CONTENT_TYPE = "image/jpeg"
+DERIVATIVE_JPEG_QUALITY = 80
+
+# Imagens maiores que isso não geram variantes
+DERIVATIVE_MAX_SOURCE_SIZE = 64 * 1024 * 1024
+
+# Parte da imagem de origem mantida em memória durante a geração; o
+# restante vai para um arquivo temporário
+DERIVATIVE_SOURCE_MEMORY_SIZE = 8 * 1024 * 1024
+
+# Imagens processadas em paralelo e limite de imagens aguardando na fila
+DEFAULT_DERIVATIVE_WORKERS = 2
+DEFAULT_DERIVATIVE_QUEUE_SIZE = 100
+
+# Variante pendente há mais que isso volta para a fila no próximo pedido
+# (fila cheia no upload, processo reiniciado antes de gerá-la ou falha na
+# tentativa anterior)
+DERIVATIVE_RETRY_MINUTES = 10
+
+# Tentativas de geração antes de a variante ficar com falha definitiva
+DERIVATIVE_MAX_ATTEMPTS = 3
+
+# Status das variantes
+DERIVATIVE_PENDING = "pendente"
+DERIVATIVE_COMPLETED = "concluido"
+DERIVATIVE_FAILED = "falhou"
+
+# Validade padrão de uma sessão de upload em partes (o Azure descarta blocos
+# não confirmados após 7 dias)
+DEFAULT_UPLOAD_SESSION_EXPIRY_HOURS = 24
+
+# Colunas das listagens; DataUploadCursor: texto com a precisão completa do
+# DATETIME2 (o driver trunca o valor em microssegundos)
+_LIST_COLUMNS = """
+    Id, NomeOriginal, TamanhoBytes, TipoConteudo, DataUpload, UploadPor,
+    CONVERT(VARCHAR(27), DataUpload, 126) AS DataUploadCursor
+"""
+
+# Colunas de get_file_info
+_FILE_INFO_COLUMNS = """
+    Id, NomeOriginal, NomeArmazenado, CaminhoBlob,
+    UrlBlob, TamanhoBytes, TipoConteudo, Container,
+    StorageAccount, DataUpload, UploadPor, Tags, Ativo,
+    HashSha256, ETagBlob, VersaoRegistro, CodificacaoConteudo,
+    TamanhoArmazenadoBytes
+"""
+
+# Data do cursor de paginação (DATETIME2 no formato ISO 8601, estilo 126)
+_CURSOR_DATETIME = re.compile(r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,7})?$")
+
+# Tamanho máximo do nome de uma pasta (coluna Pasta de ArquivosStorage)
+MAX_FOLDER_LENGTH = 400
+
+# Tamanho máximo da chave e do valor de uma tag (tabela ArquivosTags)
+MAX_TAG_KEY_LENGTH = 100
+MAX_TAG_VALUE_LENGTH = 400
+
+# Busca por parte do nome: trigramas (sequências de 3 caracteres) de
+# NomeOriginal, indexados em ArquivosNomeTrigramas; termos mais curtos não
+# têm trigrama e exigiriam percorrer a tabela
+NAME_TRIGRAM_LENGTH = 3
+
+# Escopos de ArquivosContadores: arquivos diretamente na pasta, ou na pasta
+# e em todas as subpastas (a "arvore" da pasta vazia é o total geral)
+COUNTER_SCOPE_FOLDER = "pasta"
+COUNTER_SCOPE_TREE = "arvore"
+
+# As URLs SAS de download expiram no fim de intervalos fixos: pedidos do mesmo
+# arquivo dentro de um intervalo recebem a mesma URL (reaproveitada do cache
+# de tokens e do cache HTTP do cliente)
+DEFAULT_SAS_EXPIRY_BUCKET_MINUTES = 15
+DEFAULT_SAS_TOKEN_CACHE_SIZE = 10000
+
+# Registros alterados por instrução na exclusão em lote; cada parte é uma
+# transação curta, para não bloquear a tabela durante exclusões grandes
+DEFAULT_BULK_DELETE_CHUNK_SIZE = 5000
+
+# Máximo de blobs por requisição Blob Batch do Azure
+BLOB_BATCH_DELETE_SIZE = 256
+
+# Status das sessões de upload
+UPLOAD_SESSION_PENDING = "pendente"
+UPLOAD_SESSION_COMPLETED = "concluida"
+
+# Tipos de sessão de upload: em partes pela API ou direto no blob via SAS
+UPLOAD_SESSION_CHUNKS = "chunks"
+UPLOAD_SESSION_SAS = "sas"
+
+# Validade padrão da URL SAS de upload direto; a sessão continua válida por
+# mais um período para que o cliente confirme um upload que terminou no limite
+DEFAULT_DIRECT_UPLOAD_EXPIRY_MINUTES = 15
+DIRECT_UPLOAD_CONFIRM_GRACE_MINUTES = 60
+
+
+def _read_chunk(stream: BinaryIO, size: int) -> bytes:
+    """
+    Lê até `size` bytes de um stream, repetindo a leitura até completar o
+    bloco ou chegar ao fim do stream
+
+    Args:
+        stream: Stream binário de origem
+        size: Quantidade máxima de bytes a ler
+
+    Returns:
+        Bytes lidos (vazio quando o stream terminou)
+    """
+    parts = []
+    remaining = size
+    while remaining > 0:
+        data = stream.read(remaining)
+        if not data:
+            break
+        parts.append(data)
+        remaining -= len(data)
+    return b"".join(parts)
+
+
+class _HashingReader:
+    """Stream de leitura que calcula o SHA-256 e o tamanho do conteúdo lido"""
+
+    def __init__(self, stream: BinaryIO):
+        self._stream = stream
+        self._hash = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size: int = -1) -> bytes:
+        data = self._stream.read(size)
+        self._hash.update(data)
+        self.size += len(data)
+        return data
+
+    def digest(self) -> bytes:
+        return self._hash.digest()
+
+
+class _ChunkReader(io.RawIOBase):
+    """Stream de leitura sobre um iterador de partes (bytes)"""
+
+    def __init__(self, chunks):
+        super().__init__()
+        self._chunks = iter(chunks)
+        self._pending = memoryview(b"")
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                return 0
+            self._pending = memoryview(chunk)
+        size = min(len(buffer), len(self._pending))
+        buffer[:size] = self._pending[:size]
+        self._pending = self._pending[size:]
+        return size
+
+
+class _StagedBlob:
+    """
+    Conteúdo de um upload já lido e pendente de gravação definitiva no blob
+
+    Arquivos menores que um bloco ficam em memória e são enviados em uma
+    única requisição no commit; os maiores já estão no Azure como blocos não
+    confirmados. Se o commit não for feito (conteúdo idêntico a um blob já
+    existente ou a outro arquivo do mesmo lote), os blocos são descartados
+    pelo Azure após 7 dias.
+    """
+
+    def __init__(self, blob_client, size: int, data: Optional[bytes] = None, block_list=None):
+        self.blob_client = blob_client
+        self.size = size
+        self.etag = None
+        self._data = data
+        self._block_list = block_list
+
+    def commit(self, content_type: str, content_encoding: Optional[str] = None) -> str:
+        """
+        Grava o blob (falha se já existir, equivalente ao overwrite=False)
+
+        Args:
+            content_type: Tipo MIME do arquivo
+            content_encoding: Compressão do conteúdo enviado (ex.: "gzip")
+
+        Returns:
+            ETag do blob gravado
+        """
+        content_settings = ContentSettings(content_type=content_type, content_encoding=content_encoding)
+        if self._block_list is None:
+            response = self.blob_client.upload_blob(
+                self._data,
+                content_settings=content_settings,
+                overwrite=False
+            )
+        else:
+            response = self.blob_client.commit_block_list(
+                self._block_list,
+                content_settings=content_settings,
+                etag='*',
+                match_condition=MatchConditions.IfMissing
+            )
+        self.etag = response["etag"]
+        return self.etag
+
+
+class _SasTokenCache:
+    """LRU dos tokens SAS de leitura já assinados, por (blob, expiração)"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._tokens: "OrderedDict[Tuple[str, datetime], str]" = OrderedDict()
+
+    def get(self, key: Tuple[str, datetime]) -> Optional[str]:
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is not None:
+                self._tokens.move_to_end(key)
+            return token
+
+    def set(self, key: Tuple[str, datetime], token: str):
+        with self._lock:
+            self._tokens[key] = token
+            self._tokens.move_to_end(key)
+            while len(self._tokens) > self.max_entries:
+                self._tokens.popitem(last=False)
+
+
+class _ZipStreamSink(io.RawIOBase):
+    """
+    Destino não posicionável do ZipFile: acumula os bytes gravados até serem
+    repassados ao cliente com drain()
+
+    Sem seek, o ZipFile grava tamanho e CRC de cada entrada depois do
+    conteúdo (data descriptor), e o arquivo pode ser enviado enquanto é
+    montado.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._buffer += data
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        return data
 
 
 class AzureStorageManager:
@@ -21,7 +394,25 @@ class AzureStorageManager:
         storage_account: str,
         storage_key: str,
         container_name: str,
-        sql_connection_string: str
+        sql_connection_string: str,
+        upload_chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+        upload_max_concurrency: int = DEFAULT_UPLOAD_MAX_CONCURRENCY,
+        upload_pool_size: int = DEFAULT_UPLOAD_POOL_SIZE,
+        batch_upload_concurrency: int = DEFAULT_BATCH_UPLOAD_CONCURRENCY,
+        download_chunk_size: int = DEFAULT_DOWNLOAD_CHUNK_SIZE,
+        disk_cache: Optional[BlobDiskCache] = None,
+        db_pool_min_size: int = DEFAULT_POOL_MIN_SIZE,
+        db_pool_max_size: int = DEFAULT_POOL_MAX_SIZE,
+        db_pool_timeout: float = DEFAULT_POOL_TIMEOUT,
+        db_pool_max_age: float = DEFAULT_POOL_MAX_AGE,
+        metadata_cache: Optional[MetadataCache] = None,
+        sas_expiry_bucket_minutes: int = DEFAULT_SAS_EXPIRY_BUCKET_MINUTES,
+        zip_prefetch: int = DEFAULT_ZIP_PREFETCH,
+        zip_prefetch_pool_size: int = DEFAULT_ZIP_PREFETCH_POOL_SIZE,
+        compression: Optional[str] = None,
+        compression_min_size: int = DEFAULT_COMPRESSION_MIN_SIZE,
+        derivative_workers: int = 0,
+        derivative_queue_size: int = DEFAULT_DERIVATIVE_QUEUE_SIZE
     ):
         """
         Inicializa o gerenciador de storage
@@ -31,11 +422,117 @@ class AzureStorageManager:
             storage_key: Chave de acesso da conta
             container_name: Nome do container
             sql_connection_string: String de conexão do SQL Server
+            upload_chunk_size: Tamanho em bytes de cada bloco enviado no upload
+                (limita a memória usada por upload)
+            upload_max_concurrency: Blocos enviados em paralelo por upload
+            upload_pool_size: Limite de blocos enviados em paralelo no processo,
+                compartilhado entre todas as requisições
+            batch_upload_concurrency: Arquivos de um lote enviados em paralelo
+            download_chunk_size: Tamanho em bytes de cada parte lida do Azure
+                nos downloads em streaming
+            disk_cache: Cache em disco local dos blobs baixados (opcional)
+            db_pool_min_size: Conexões com o banco mantidas abertas sem uso
+            db_pool_max_size: Máximo de conexões com o banco abertas
+            db_pool_timeout: Segundos de espera por uma conexão livre
+            db_pool_max_age: Segundos até uma conexão ser substituída
+            metadata_cache: Cache dos metadados consultados em get_file_info
+                (opcional)
+            sas_expiry_bucket_minutes: Intervalo em minutos ao qual a
+                expiração das URLs SAS de download é arredondada (para cima)
+            zip_prefetch: Downloads abertos antecipadamente por exportação ZIP
+            zip_prefetch_pool_size: Limite de downloads abertos
+                antecipadamente no processo, compartilhado entre as exportações
+            compression: Compressão dos arquivos de tipos compressíveis no
+                upload ("gzip" ou "zstd"; None desabilita)
+            compression_min_size: Tamanho mínimo em bytes de um arquivo
+                comprimido
+            derivative_workers: Imagens processadas em paralelo para gerar
+                as variantes (miniaturas); 0 (padrão) desabilita a geração
+            derivative_queue_size: Limite de imagens aguardando na fila de
+                geração das variantes
         """
+        if upload_chunk_size <= 0:
+            raise ValueError("upload_chunk_size deve ser maior que zero")
+        if download_chunk_size <= 0:
+            raise ValueError("download_chunk_size deve ser maior que zero")
+        if upload_max_concurrency <= 0 or upload_pool_size <= 0:
+            raise ValueError("upload_max_concurrency e upload_pool_size devem ser maiores que zero")
+        if sas_expiry_bucket_minutes <= 0:
+            raise ValueError("sas_expiry_bucket_minutes deve ser maior que zero")
+        if zip_prefetch < 0 or zip_prefetch_pool_size <= 0:
+            raise ValueError("zip_prefetch não pode ser negativo e zip_prefetch_pool_size deve ser maior que zero")
+        if compression not in (None,) + CONTENT_ENCODINGS:
+            raise ValueError(f"compression deve ser um de: {', '.join(CONTENT_ENCODINGS)}")
+        if compression == CONTENT_ENCODING_ZSTD and zstandard is None:
+            raise ImportError("Instale o pacote zstandard para usar a compressão zstd: pip install zstandard")
+        if derivative_workers < 0:
+            raise ValueError("derivative_workers não pode ser negativo")
+        if derivative_workers and Image is None:
+            raise ImportError("Instale o pacote Pillow para gerar as miniaturas (ou use derivative_workers=0): pip install Pillow")
+
         self.storage_account = storage_account
         self.storage_key = storage_key
         self.container_name = container_name
         self.sql_connection_string = sql_connection_string
+        self.upload_chunk_size = upload_chunk_size
+        # Um upload nunca ocupa mais que o pool inteiro
+        self.upload_max_concurrency = min(upload_max_concurrency, upload_pool_size)
+        self.upload_pool_size = upload_pool_size
+        self.download_chunk_size = download_chunk_size
+        self.disk_cache = disk_cache
+        self.metadata_cache = metadata_cache
+        self.sas_expiry_bucket = timedelta(minutes=sas_expiry_bucket_minutes)
+        self._sas_tokens = _SasTokenCache(DEFAULT_SAS_TOKEN_CACHE_SIZE)
+        self.zip_prefetch = zip_prefetch
+        self.compression = compression
+        self.compression_min_size = compression_min_size
+        self.derivative_workers = derivative_workers
+
+        # Pool de conexões com o banco (reaproveitadas entre as operações)
+        self.db_pool = SqlConnectionPool(
+            sql_connection_string,
+            min_size=db_pool_min_size,
+            max_size=db_pool_max_size,
+            timeout=db_pool_timeout,
+            max_age=db_pool_max_age
+        )
+
+        # Pool de threads compartilhado por todos os uploads do processo
+        self._upload_executor = ThreadPoolExecutor(
+            max_workers=upload_pool_size,
+            thread_name_prefix="upload-bloco"
+        )
+
+        # Pool separado para os arquivos de um lote: cada arquivo envia os
+        # próprios blocos pelo pool acima, então usar o mesmo pool poderia
+        # travar com todas as threads esperando por blocos na fila
+        self._batch_executor = ThreadPoolExecutor(
+            max_workers=batch_upload_concurrency,
+            thread_name_prefix="upload-lote"
+        )
+
+        # Pool dos downloads abertos antecipadamente nas exportações ZIP
+        self._zip_executor = ThreadPoolExecutor(
+            max_workers=zip_prefetch_pool_size,
+            thread_name_prefix="download-zip"
+        )
+
+        # Pool da geração das variantes das imagens, com a fila limitada:
+        # com a fila cheia, a variante fica pendente e é enfileirada de novo
+        # quando for pedida (ver get_derivative_info)
+        self._derivative_executor = ThreadPoolExecutor(
+            max_workers=max(derivative_workers, 1),
+            thread_name_prefix="variantes"
+        )
+        self._derivative_slots = threading.BoundedSemaphore(max(derivative_workers, 1) + derivative_queue_size)
+
+        # Sessão HTTP com conexões suficientes para os envios em paralelo
+        # (o padrão do requests mantém apenas 10 conexões por host)
+        http_session = requests.Session()
+        http_session.mount("https://", requests.adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=upload_pool_size + zip_prefetch_pool_size + 10
+        ))
 
         # Criar cliente do Blob Storage
         connection_string = (
@@ -44,12 +541,25 @@ class AzureStorageManager:
             f"AccountKey={storage_key};"
             f"EndpointSuffix=core.windows.net"
         )
-        self.blob_service_client = BlobServiceClient.from_connection_string(connection_string)
+        # max_single_get_size/max_chunk_get_size: por padrão o SDK busca os
+        # primeiros 32 MB de uma vez ao abrir o download
+        self.blob_service_client = BlobServiceClient.from_connection_string(
+            connection_string,
+            max_block_size=upload_chunk_size,
+            max_single_get_size=download_chunk_size,
+            max_chunk_get_size=download_chunk_size,
+            transport=RequestsTransport(session=http_session, session_owner=False)
+        )
         self.container_client = self.blob_service_client.get_container_client(container_name)
 
     def _get_db_connection(self):
-        """Retorna uma conexão com o banco de dados"""
-        return pyodbc.connect(self.sql_connection_string)
+        """
+        Retira uma conexão do pool para uso em um bloco with
+
+        Na saída do bloco é feito commit (rollback se houve exceção) e a
+        conexão volta ao pool.
+        """
+        return self.db_pool.connection()
 
     def _generate_unique_filename(self, original_filename: str) -> str:
         """
@@ -65,6 +575,460 @@ class AzureStorageManager:
         unique_id = str(uuid.uuid4())
         return f"{unique_id}{file_ext}"
 
+    def _build_blob_path(self, original_filename: str, folder: Optional[str] = None):
+        """
+        Gera o nome único e o caminho do blob para um novo arquivo
+
+        Args:
+            original_filename: Nome original do arquivo
+            folder: Pasta dentro do container (opcional)
+
+        Returns:
+            Tupla (nome único, caminho do blob)
+        """
+        unique_filename = self._generate_unique_filename(original_filename)
+        folder = self._normalize_folder(folder)
+        if folder:
+            return unique_filename, f"{folder}/{unique_filename}"
+        return unique_filename, unique_filename
+
+    @staticmethod
+    def _block_id(index: int) -> str:
+        """
+        Gera o ID de um bloco a partir da sua posição no blob
+
+        O Azure exige que todos os IDs de bloco de um blob tenham o mesmo
+        tamanho; o SDK se encarrega da codificação em base64.
+        """
+        return f"{index:06d}"
+
+    @staticmethod
+    def _stage_block(blob_client, block_id: str, data: bytes, in_flight: threading.Semaphore):
+        """Envia um bloco e libera a vaga do upload no pool"""
+        try:
+            blob_client.stage_block(block_id=block_id, data=data, length=len(data))
+        finally:
+            in_flight.release()
+
+    def _stage_blob_stream(self, blob_client, stream: BinaryIO) -> _StagedBlob:
+        """
+        Lê um stream e envia o conteúdo ao Azure em blocos de tamanho fixo,
+        sem ainda gravar o blob (ver _StagedBlob.commit)
+
+        Arquivos menores que um bloco são apenas mantidos em memória. Os
+        demais são enviados com stage_block pelo pool de upload compartilhado:
+        cada upload mantém no máximo upload_max_concurrency blocos em envio
+        (e em memória) ao mesmo tempo, para que um arquivo grande não ocupe o
+        pool inteiro.
+
+        Args:
+            blob_client: Cliente do blob de destino
+            stream: Stream binário com o conteúdo do arquivo
+
+        Returns:
+            Conteúdo preparado, pendente de commit
+        """
+        chunk = _read_chunk(stream, self.upload_chunk_size)
+        if len(chunk) < self.upload_chunk_size:
+            return _StagedBlob(blob_client, len(chunk), data=chunk)
+
+        in_flight = threading.BoundedSemaphore(self.upload_max_concurrency)
+        pending = deque()
+        block_list = []
+        total_size = 0
+        try:
+            while chunk:
+                in_flight.acquire()
+
+                # Interromper assim que algum bloco anterior falhar
+                while pending and pending[0].done():
+                    pending.popleft().result()
+
+                block_id = self._block_id(len(block_list))
+                pending.append(self._upload_executor.submit(
+                    self._stage_block, blob_client, block_id, chunk, in_flight
+                ))
+                block_list.append(BlobBlock(block_id=block_id))
+                total_size += len(chunk)
+                chunk = _read_chunk(stream, self.upload_chunk_size)
+
+            while pending:
+                pending.popleft().result()
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+        return _StagedBlob(blob_client, total_size, block_list=block_list)
+
+    @staticmethod
+    def _is_compressible(content_type: Optional[str]) -> bool:
+        """Indica se o tipo de conteúdo costuma comprimir bem (texto, JSON, XML, CSV)"""
+        media_type = (content_type or "").split(";", 1)[0].strip().lower()
+        return (
+            media_type.startswith("text/")
+            or media_type in COMPRESSIBLE_CONTENT_TYPES
+            or media_type.endswith(("+json", "+xml"))
+        )
+
+    def _compression_stream(self, stream: BinaryIO, content_type: Optional[str]) -> Tuple[BinaryIO, Optional[str]]:
+        """
+        Comprime o conteúdo durante a leitura, se a compressão estiver
+        habilitada, o tipo for compressível e o arquivo tiver ao menos
+        compression_min_size bytes (apenas esse início é lido para decidir)
+
+        Returns:
+            (stream a enviar, compressão aplicada ou None)
+        """
+        if not self.compression or not self._is_compressible(content_type):
+            return stream, None
+
+        head = _read_chunk(stream, self.compression_min_size)
+        if len(head) < self.compression_min_size:
+            # O stream terminou: o arquivo inteiro já foi lido
+            return io.BytesIO(head), None
+        chunks = chain([head], iter(partial(stream.read, _COMPRESSION_READ_SIZE), b""))
+        return _ChunkReader(self._compress_chunks(chunks, self.compression)), self.compression
+
+    @staticmethod
+    def _compress_chunks(chunks, encoding: str):
+        """Comprime as partes de um conteúdo (gzip ou zstd)"""
+        if encoding == CONTENT_ENCODING_GZIP:
+            compressor = zlib.compressobj(GZIP_COMPRESSION_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        else:
+            compressor = zstandard.ZstdCompressor(level=ZSTD_COMPRESSION_LEVEL).compressobj()
+        for chunk in chunks:
+            data = compressor.compress(chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+
+    def _decompress_chunks(self, chunks, encoding: str):
+        """
+        Descomprime as partes de um blob comprimido enquanto são lidas, em
+        partes de no máximo download_chunk_size bytes (conteúdo muito
+        compressível não vira uma parte enorme em memória)
+        """
+        source = _ChunkReader(chunks)
+        if encoding == CONTENT_ENCODING_GZIP:
+            reader = gzip.GzipFile(fileobj=source, mode="rb")
+        elif zstandard is not None:
+            reader = zstandard.ZstdDecompressor().stream_reader(source)
+        else:
+            raise ImportError("Instale o pacote zstandard para ler arquivos comprimidos com zstd: pip install zstandard")
+        with reader:
+            while True:
+                data = reader.read(self.download_chunk_size)
+                if not data:
+                    break
+                yield data
+
+    @staticmethod
+    def _stored_size(file_info: Dict[str, Any]) -> int:
+        """Tamanho do blob no storage (comprimido, se for o caso)"""
+        return file_info.get("tamanho_armazenado_bytes") or file_info["tamanho_bytes"]
+
+    def _find_duplicate(
+        self,
+        cursor,
+        file_hash: bytes,
+        file_size: int,
+        folder_prefix: str
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Procura um blob ativo com o mesmo conteúdo na mesma pasta
+
+        Só blobs da própria pasta são reaproveitados: o mesmo conteúdo em
+        pastas diferentes fica em blobs separados. Assim cada blob pertence a
+        uma única pasta, o que mantém as miniaturas (gravadas junto ao blob)
+        e a reconciliação por prefixo de pasta corretas.
+
+        Bloqueia a faixa do hash até o fim da transação, para que uma exclusão
+        permanente concorrente não remova o blob antes do novo registro ser
+        gravado (ver delete_file).
+
+        Args:
+            cursor: Cursor da transação em andamento
+            file_hash: SHA-256 do conteúdo
+            file_size: Tamanho do conteúdo em bytes
+            folder_prefix: Prefixo da pasta no caminho do blob ("pasta/" ou "")
+
+        Returns:
+            Dicionário com nome, caminho, URL, ETag, compressão e tamanho
+            armazenado do blob existente, ou None
+        """
+        cursor.execute("""
+            SELECT TOP 1 NomeArmazenado, CaminhoBlob, UrlBlob, ETagBlob,
+                   CodificacaoConteudo, TamanhoArmazenadoBytes
+            FROM ArquivosStorage WITH (UPDLOCK, HOLDLOCK)
+            WHERE HashSha256 = ? AND HashSha256 IS NOT NULL
+              AND TamanhoBytes = ? AND Ativo = 1 AND Container = ?
+              AND CaminhoBlob = CONCAT(?, NomeArmazenado)
+        """, (file_hash, file_size, self.container_name, folder_prefix))
+
+        row = cursor.fetchone()
+        if not row:
+            return None
+
+        return {
+            "nome_armazenado": row.NomeArmazenado,
+            "caminho_blob": row.CaminhoBlob,
+            "url": row.UrlBlob,
+            "etag": row.ETagBlob,
+            "codificacao": row.CodificacaoConteudo,
+            "tamanho_armazenado": row.TamanhoArmazenadoBytes
+        }
+
+    def _insert_file_records(self, cursor, records: List[Dict[str, Any]]):
+        """
+        Insere os metadados de um ou mais arquivos na tabela ArquivosStorage
+        usando o cursor informado (o commit fica a cargo de quem chama)
+
+        Vários registros são enviados em uma única chamada (fast_executemany).
+
+        Args:
+            cursor: Cursor da transação em andamento
+            records: Lista de dicionários com file_id, original_filename,
+                unique_filename, blob_path, blob_url, file_size, content_type
+                e, opcionalmente, upload_user, tags, file_hash, blob_etag,
+                content_encoding e stored_size (tamanho do blob comprimido)
+        """
+        params = [
+            (
+                record["file_id"],
+                record["original_filename"],
+                record["unique_filename"],
+                record["blob_path"],
+                record["blob_url"],
+                record["file_size"],
+                record["content_type"],
+                self.container_name,
+                self.storage_account,
+                record.get("upload_user"),
+                self._serialize_tags(record.get("tags")),
+                record.get("file_hash"),
+                record.get("blob_etag"),
+                record.get("content_encoding"),
+                record.get("stored_size") if record.get("content_encoding") else None,
+                self._folder_of(record["blob_path"])
+            )
+            for record in records
+        ]
+
+        cursor.fast_executemany = len(params) > 1
+        cursor.executemany("""
+            INSERT INTO ArquivosStorage (
+                Id, NomeOriginal, NomeArmazenado, CaminhoBlob,
+                UrlBlob, TamanhoBytes, TipoConteudo, Container,
+                StorageAccount, UploadPor, Tags, HashSha256, ETagBlob,
+                CodificacaoConteudo, TamanhoArmazenadoBytes, Pasta
+            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, params)
+
+        # Tags normalizadas (uma linha por chave) para o filtro de /listar
+        tag_params = [
+            (record["file_id"], key, self._tag_value_text(value))
+            for record in records
+            for key, value in (self._parse_tags(record.get("tags")) or {}).items()
+        ]
+        if tag_params:
+            cursor.fast_executemany = len(tag_params) > 1
+            cursor.executemany(
+                "INSERT INTO ArquivosTags (ArquivoId, Chave, Valor) VALUES (?, ?, ?)",
+                tag_params
+            )
+
+        # Trigramas do nome para a busca por parte do nome (/buscar)
+        trigram_params = [
+            (trigram, record["file_id"])
+            for record in records
+            for trigram in sorted(self._name_trigrams(record["original_filename"]))
+        ]
+        if trigram_params:
+            cursor.fast_executemany = len(trigram_params) > 1
+            cursor.executemany(
+                "INSERT INTO ArquivosNomeTrigramas (Trigrama, ArquivoId) VALUES (?, ?)",
+                trigram_params
+            )
+
+        self._update_counters(cursor, [
+            (param[-1], 1, record["file_size"])
+            for param, record in zip(params, records)
+        ])
+
+    @staticmethod
+    def _parse_tags(tags: Union[Dict[str, Any], str, None]) -> Optional[Dict[str, Any]]:
+        """
+        Valida as tags de um arquivo
+
+        Args:
+            tags: Dicionário, ou texto com um objeto JSON (formulários e
+                sessões de upload)
+
+        Returns:
+            Dicionário com as tags, ou None se não houver tags
+
+        Raises:
+            ValueError: Se as tags não forem um objeto JSON ou excederem os
+                tamanhos máximos de chave/valor
+        """
+        if not tags:
+            return None
+        if isinstance(tags, str):
+            try:
+                tags = json.loads(tags)
+            except ValueError:
+                raise ValueError("Tags devem ser um objeto JSON")
+        if not isinstance(tags, dict):
+            raise ValueError("Tags devem ser um objeto JSON")
+
+        for key, value in tags.items():
+            if not key or len(key) > MAX_TAG_KEY_LENGTH:
+                raise ValueError(f"Chave de tag inválida (1 a {MAX_TAG_KEY_LENGTH} caracteres): {key!r}")
+            if len(AzureStorageManager._tag_value_text(value)) > MAX_TAG_VALUE_LENGTH:
+                raise ValueError(f"Valor da tag '{key}' excede {MAX_TAG_VALUE_LENGTH} caracteres")
+        return tags or None
+
+    @staticmethod
+    def _tag_value_text(value: Any) -> str:
+        """Valor de uma tag como texto pesquisável (não-textos em JSON)"""
+        return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+    @staticmethod
+    def _serialize_tags(tags: Union[Dict[str, Any], str, None]) -> Optional[str]:
+        """Tags validadas, em JSON, para a coluna Tags"""
+        tags = AzureStorageManager._parse_tags(tags)
+        return json.dumps(tags, ensure_ascii=False) if tags else None
+
+    @staticmethod
+    def _parse_tag_filters(tag_filters: Optional[List[str]]) -> List[Tuple[str, str]]:
+        """
+        Converte filtros "chave:valor" em pares (chave, valor)
+
+        Raises:
+            ValueError: Se algum filtro não tiver o formato chave:valor
+        """
+        pairs = []
+        for tag_filter in tag_filters or []:
+            key, separator, value = tag_filter.partition(":")
+            if not separator or not key:
+                raise ValueError(f"Filtro de tag inválido (use chave:valor): {tag_filter}")
+            pairs.append((key, value))
+        return pairs
+
+    @staticmethod
+    def _name_trigrams(name: str) -> set:
+        """Trigramas distintos de um nome, em minúsculas (ArquivosNomeTrigramas)"""
+        name = name.lower()
+        return {
+            name[i:i + NAME_TRIGRAM_LENGTH]
+            for i in range(len(name) - NAME_TRIGRAM_LENGTH + 1)
+        }
+
+    @staticmethod
+    def _normalize_folder(folder: Optional[str]) -> str:
+        """
+        Normaliza o nome de uma pasta: barras invertidas viram "/", e barras
+        repetidas, no início ou no fim são removidas ("" para a raiz)
+
+        Raises:
+            ValueError: Se o nome exceder MAX_FOLDER_LENGTH caracteres
+        """
+        if not folder:
+            return ""
+        parts = [part.strip() for part in folder.replace("\\", "/").split("/")]
+        folder = "/".join(part for part in parts if part)
+        if len(folder) > MAX_FOLDER_LENGTH:
+            raise ValueError(f"Nome da pasta excede {MAX_FOLDER_LENGTH} caracteres")
+        return folder
+
+    @staticmethod
+    def _escape_like(value: str) -> str:
+        """Escapa os curingas do LIKE (usar com ESCAPE '\\')"""
+        return re.sub(r"([\\%_\[])", r"\\\1", value)
+
+    def _folder_condition(self, folder: str, include_subfolders: bool) -> Tuple[str, List[Any]]:
+        """Condição SQL sobre a coluna Pasta (com ou sem as subpastas) e seus parâmetros"""
+        if include_subfolders:
+            return "(Pasta = ? OR Pasta LIKE ? ESCAPE '\\')", [folder, self._escape_like(folder) + "/%"]
+        return "Pasta = ?", [folder]
+
+    @staticmethod
+    def _folder_of(blob_path: str) -> str:
+        """Pasta de um blob ("" para a raiz do container)"""
+        return blob_path.rsplit("/", 1)[0] if "/" in blob_path else ""
+
+    @classmethod
+    def _record_folder_of(cls, blob_path: str) -> Optional[str]:
+        """
+        Coluna Pasta dos registros de um blob: a pasta normalizada (blobs de
+        versões anteriores podem ter a pasta como foi recebida); None se
+        exceder o limite, caso em que nenhum registro aponta para o blob
+        """
+        try:
+            return cls._normalize_folder(cls._folder_of(blob_path))
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _counter_keys(folder: str) -> List[Tuple[str, str]]:
+        """Contadores afetados por um arquivo na pasta: a própria pasta e a árvore de cada ancestral"""
+        keys = [(COUNTER_SCOPE_FOLDER, folder), (COUNTER_SCOPE_TREE, "")]
+        parts = folder.split("/") if folder else []
+        for depth in range(1, len(parts) + 1):
+            keys.append((COUNTER_SCOPE_TREE, "/".join(parts[:depth])))
+        return keys
+
+    def _update_counters(self, cursor, changes: List[Tuple[str, int, int]]):
+        """
+        Atualiza os contadores de arquivos e bytes por pasta na transação
+        em andamento
+
+        Args:
+            cursor: Cursor da transação em andamento
+            changes: Lista de (pasta, variação de arquivos, variação de bytes)
+        """
+        totals: Dict[Tuple[str, str], Tuple[int, int]] = {}
+        for folder, files, size in changes:
+            for key in self._counter_keys(folder):
+                current_files, current_bytes = totals.get(key, (0, 0))
+                totals[key] = (current_files + files, current_bytes + size)
+        if not totals:
+            return
+
+        # Sempre na mesma ordem, para que transações concorrentes não
+        # travem umas às outras (deadlock)
+        params = [
+            (scope, folder, files, size)
+            for (scope, folder), (files, size) in sorted(totals.items())
+        ]
+        cursor.fast_executemany = len(params) > 1
+        cursor.executemany("""
+            MERGE ArquivosContadores WITH (HOLDLOCK) AS c
+            USING (SELECT ? AS Escopo, ? AS Pasta, ? AS Arquivos, ? AS Bytes) AS d
+                ON c.Escopo = d.Escopo AND c.Pasta = d.Pasta
+            WHEN MATCHED THEN
+                UPDATE SET TotalArquivos = c.TotalArquivos + d.Arquivos,
+                           TotalBytes = c.TotalBytes + d.Bytes
+            WHEN NOT MATCHED THEN
+                INSERT (Escopo, Pasta, TotalArquivos, TotalBytes)
+                VALUES (d.Escopo, d.Pasta, d.Arquivos, d.Bytes);
+        """, params)
+
+    @staticmethod
+    def _read_counters(cursor, folder: str) -> Dict[str, Tuple[int, int]]:
+        """Lê os contadores (arquivos, bytes) de uma pasta, por escopo"""
+        cursor.execute("""
+            SELECT Escopo, TotalArquivos, TotalBytes
+            FROM ArquivosContadores
+            WHERE Pasta = ?
+        """, (folder,))
+        return {row.Escopo: (row.TotalArquivos, row.TotalBytes) for row in cursor.fetchall()}
+
+    def _insert_file_record(self, cursor, **record):
+        """Insere os metadados de um arquivo na tabela ArquivosStorage (ver _insert_file_records)"""
+        self._insert_file_records(cursor, [record])
+
     def upload_file(
         self,
         file_content: bytes,
@@ -85,66 +1049,147 @@ class AzureStorageManager:
             tags: Dicionário com tags adicionais (será armazenado como JSON)
             folder: Pasta dentro do container (opcional)
 
+        Returns:
+            Dicionário com informações do arquivo salvo
+        """
+        return self.upload_file_stream(
+            file_stream=io.BytesIO(file_content),
+            original_filename=original_filename,
+            content_type=content_type,
+            upload_user=upload_user,
+            tags=tags,
+            folder=folder
+        )
+
+    def upload_file_stream(
+        self,
+        file_stream: BinaryIO,
+        original_filename: str,
+        content_type: str,
+        upload_user: Optional[str] = None,
+        tags: Optional[Dict[str, Any]] = None,
+        folder: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Faz upload de um arquivo a partir de um stream, lendo e enviando
+        um bloco por vez (a memória usada não depende do tamanho do arquivo)
+
+        O SHA-256 do conteúdo é calculado durante a leitura. Se já existir um
+        arquivo ativo idêntico na mesma pasta, o novo registro aponta para o
+        blob existente e o novo blob não é gravado.
+
+        Com a compressão habilitada, arquivos de tipos compressíveis (texto,
+        JSON, XML, CSV) são comprimidos durante o envio; a compressão fica
+        registrada no banco e no content_encoding do blob.
+
+        Args:
+            file_stream: Stream binário com o conteúdo do arquivo
+            original_filename: Nome original do arquivo
+            content_type: Tipo MIME do arquivo
+            upload_user: Usuário que fez o upload
+            tags: Dicionário com tags adicionais (será armazenado como JSON)
+            folder: Pasta dentro do container (opcional)
+
         Returns:
             Dicionário com informações do arquivo salvo
         """
         try:
-            # Gerar nome único
-            unique_filename = self._generate_unique_filename(original_filename)
+            tags = self._parse_tags(tags)
 
-            # Montar o caminho do blob
-            if folder:
-                blob_path = f"{folder}/{unique_filename}"
-            else:
-                blob_path = unique_filename
+            # Gerar nome único e montar o caminho do blob
+            unique_filename, blob_path = self._build_blob_path(original_filename, folder)
 
-            # Fazer upload do arquivo
+            # Enviar o arquivo em blocos, calculando o hash do conteúdo
+            # original durante a leitura (antes da compressão)
             blob_client = self.container_client.get_blob_client(blob_path)
-            blob_client.upload_blob(
-                file_content,
-                content_type=content_type,
-                overwrite=False
-            )
+            hashing_stream = _HashingReader(file_stream)
+            upload_stream, content_encoding = self._compression_stream(hashing_stream, content_type)
+            staged = self._stage_blob_stream(blob_client, upload_stream)
+            file_hash = hashing_stream.digest()
+            file_size = hashing_stream.size
+            folder_prefix = blob_path[:-len(unique_filename)]
 
-            # Obter URL do blob
-            blob_url = blob_client.url
+            file_id = str(uuid.uuid4())
+            derivatives = bool(self.derivative_workers) and self._is_derivative_source(content_type, file_size)
 
-            # Tamanho do arquivo
-            file_size = len(file_content)
+            def insert_record(cursor, blob: Dict[str, Any]):
+                self._insert_file_record(
+                    cursor,
+                    file_id=file_id,
+                    original_filename=original_filename,
+                    unique_filename=blob["nome_armazenado"],
+                    blob_path=blob["caminho_blob"],
+                    blob_url=blob["url"],
+                    file_size=file_size,
+                    content_type=content_type,
+                    upload_user=upload_user,
+                    tags=tags,
+                    file_hash=file_hash,
+                    blob_etag=blob["etag"],
+                    content_encoding=blob["codificacao"],
+                    stored_size=blob["tamanho_armazenado"] or file_size
+                )
+                # Imagens: miniaturas geradas em segundo plano após o commit
+                if derivatives:
+                    self._insert_pending_derivatives(cursor, [file_id])
 
-            # Registrar no banco de dados
-            file_id = str(uuid.uuid4())
+            # Reaproveitar blob idêntico já existente na mesma pasta antes de
+            # gravar o novo: os blocos enviados não são confirmados (o Azure
+            # descarta blocos não confirmados) e arquivos pequenos nem chegam
+            # a ser gravados
             with self._get_db_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT INTO ArquivosStorage (
-                        Id, NomeOriginal, NomeArmazenado, CaminhoBlob,
-                        UrlBlob, TamanhoBytes, TipoConteudo, Container,
-                        StorageAccount, UploadPor, Tags
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    file_id,
-                    original_filename,
-                    unique_filename,
-                    blob_path,
-                    blob_url,
-                    file_size,
-                    content_type,
-                    self.container_name,
-                    self.storage_account,
-                    upload_user,
-                    str(tags) if tags else None
-                ))
-                conn.commit()
+                duplicate = self._find_duplicate(cursor, file_hash, file_size, folder_prefix)
+                if duplicate:
+                    insert_record(cursor, duplicate)
+                    conn.commit()
+
+            blob = duplicate
+            if not duplicate:
+                # Gravar o blob fora da transação: o bloqueio da faixa do hash
+                # (_find_duplicate) e a conexão do pool não ficam presos
+                # durante a requisição ao Azure
+                blob = {
+                    "nome_armazenado": unique_filename,
+                    "caminho_blob": blob_path,
+                    "url": blob_client.url,
+                    "etag": staged.commit(content_type, content_encoding),
+                    "codificacao": content_encoding,
+                    "tamanho_armazenado": staged.size
+                }
+                try:
+                    with self._get_db_connection() as conn:
+                        cursor = conn.cursor()
+                        # Um upload idêntico concorrente pode ter sido
+                        # registrado enquanto o blob era gravado
+                        duplicate = self._find_duplicate(cursor, file_hash, file_size, folder_prefix)
+                        insert_record(cursor, duplicate or blob)
+                        conn.commit()
+                except Exception:
+                    # Nenhum registro gravado: remover o blob novo
+                    self._discard_blobs([blob_path])
+                    raise
+
+                if duplicate:
+                    # O registro aponta para o blob existente: o novo sobrou
+                    self._discard_blobs([blob_path])
+                    blob = duplicate
+
+            if derivatives:
+                self._schedule_derivatives(file_id)
 
             return {
                 "id": file_id,
                 "nome_original": original_filename,
-                "nome_armazenado": unique_filename,
-                "caminho_blob": blob_path,
-                "url": blob_url,
+                "nome_armazenado": blob["nome_armazenado"],
+                "caminho_blob": blob["caminho_blob"],
+                "url": blob["url"],
                 "tamanho_bytes": file_size,
+                "tamanho_armazenado_bytes": blob["tamanho_armazenado"] or file_size,
+                "codificacao_conteudo": blob["codificacao"],
                 "tipo_conteudo": content_type,
+                "hash_sha256": file_hash.hex(),
+                "deduplicado": duplicate is not None,
                 "sucesso": True,
                 "mensagem": "Arquivo enviado com sucesso"
             }
@@ -162,7 +1207,7 @@ class AzureStorageManager:
 
     def upload_file_base64(
         self,
-        file_content_base64: str,
+        file_content_base64: Union[str, BinaryIO],
         original_filename: str,
         content_type: str,
         upload_user: Optional[str] = None,
@@ -172,8 +1217,11 @@ class AzureStorageManager:
         """
         Faz upload de um arquivo a partir de uma string base64 (formato comum do Power Apps)
 
+        Também aceita um stream com o texto base64: nesse caso o conteúdo é
+        decodificado e enviado em partes, sem ser carregado inteiro na memória.
+
         Args:
-            file_content_base64: Conteúdo do arquivo em base64
+            file_content_base64: Conteúdo do arquivo em base64 (string ou stream)
             original_filename: Nome original do arquivo
             content_type: Tipo MIME do arquivo
             upload_user: Usuário que fez o upload
@@ -184,6 +1232,17 @@ class AzureStorageManager:
             Dicionário com informações do arquivo salvo
         """
         try:
+            if not isinstance(file_content_base64, str):
+                # Decodificar o base64 em partes durante o envio
+                return self.upload_file_stream(
+                    file_stream=Base64DecodingReader(file_content_base64),
+                    original_filename=original_filename,
+                    content_type=content_type,
+                    upload_user=upload_user,
+                    tags=tags,
+                    folder=folder
+                )
+
             # Decodificar base64
             file_content = base64.b64decode(file_content_base64)
 
@@ -202,260 +1261,2853 @@ class AzureStorageManager:
                 "mensagem": f"Erro ao decodificar arquivo base64: {str(e)}"
             }
 
-    def get_file_info(self, file_id: str) -> Optional[Dict[str, Any]]:
+    def _stage_batch_item(self, item: Dict[str, Any], folder: Optional[str]) -> Dict[str, Any]:
+        """Envia os blocos de um arquivo do lote e calcula o hash (sem gravar o blob)"""
+        tags = self._parse_tags(item.get("tags"))
+        unique_filename, blob_path = self._build_blob_path(item["original_filename"], folder)
+        blob_client = self.container_client.get_blob_client(blob_path)
+
+        file_stream = item.get("file_stream")
+        if file_stream is None:
+            file_stream = io.BytesIO(item["file_content"])
+
+        hashing_stream = _HashingReader(file_stream)
+        upload_stream, content_encoding = self._compression_stream(hashing_stream, item["content_type"])
+        staged = self._stage_blob_stream(blob_client, upload_stream)
+        return {
+            "staged": staged,
+            "file_hash": hashing_stream.digest(),
+            "file_size": hashing_stream.size,
+            "content_encoding": content_encoding,
+            "unique_filename": unique_filename,
+            "blob_path": blob_path,
+            "folder_prefix": blob_path[:-len(unique_filename)],
+            "blob_url": blob_client.url,
+            "content_type": item["content_type"],
+            "tags": tags
+        }
+
+    def _insert_batch_records(
+        self,
+        cursor,
+        entries: List[Tuple[int, Dict[str, Any], Dict[str, Any]]],
+        blobs: Dict[Tuple[bytes, int, str], Dict[str, Any]],
+        upload_user: Optional[str]
+    ) -> List[str]:
         """
-        Obtém informações de um arquivo do banco de dados
+        Insere os registros de arquivos do lote, cada um apontando para o
+        blob do seu conteúdo (o commit fica a cargo de quem chama)
 
         Args:
-            file_id: ID do arquivo
+            cursor: Cursor da transação em andamento
+            entries: Lista de (índice, item, info) dos arquivos preparados
+            blobs: Blob de cada conteúdo, pela chave (hash, tamanho, pasta),
+                no formato retornado por _find_duplicate
+            upload_user: Usuário que fez o upload
 
         Returns:
-            Dicionário com informações do arquivo ou None se não encontrado
+            IDs dos registros com miniaturas a gerar
         """
-        try:
-            with self._get_db_connection() as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    SELECT
-                        Id, NomeOriginal, NomeArmazenado, CaminhoBlob,
-                        UrlBlob, TamanhoBytes, TipoConteudo, Container,
-                        StorageAccount, DataUpload, UploadPor, Tags, Ativo
-                    FROM ArquivosStorage
-                    WHERE Id = ? AND Ativo = 1
-                """, (file_id,))
+        records = []
+        for _, item, info in entries:
+            blob = blobs[info["key"]]
+            info["unique_filename"] = blob["nome_armazenado"]
+            info["blob_path"] = blob["caminho_blob"]
+            info["blob_url"] = blob["url"]
+            info["blob_etag"] = blob["etag"]
+            info["content_encoding"] = blob["codificacao"]
+            info["stored_size"] = blob["tamanho_armazenado"] or info["file_size"]
+            info["file_id"] = str(uuid.uuid4())
 
-                row = cursor.fetchone()
-                if not row:
-                    return None
+            records.append({
+                "file_id": info["file_id"],
+                "original_filename": item["original_filename"],
+                "unique_filename": info["unique_filename"],
+                "blob_path": info["blob_path"],
+                "blob_url": info["blob_url"],
+                "file_size": info["file_size"],
+                "content_type": item["content_type"],
+                "upload_user": upload_user,
+                "tags": info["tags"],
+                "file_hash": info["file_hash"],
+                "blob_etag": info["blob_etag"],
+                "content_encoding": info["content_encoding"],
+                "stored_size": info["stored_size"]
+            })
 
-                return {
-                    "id": row.Id,
-                    "nome_original": row.NomeOriginal,
-                    "nome_armazenado": row.NomeArmazenado,
-                    "caminho_blob": row.CaminhoBlob,
-                    "url": row.UrlBlob,
-                    "tamanho_bytes": row.TamanhoBytes,
-                    "tipo_conteudo": row.TipoConteudo,
-                    "container": row.Container,
-                    "storage_account": row.StorageAccount,
-                    "data_upload": row.DataUpload.isoformat() if row.DataUpload else None,
-                    "upload_por": row.UploadPor,
-                    "tags": row.Tags,
-                    "ativo": row.Ativo
+        self._insert_file_records(cursor, records)
+
+        derivative_ids = []
+        if self.derivative_workers:
+            derivative_ids = [
+                record["file_id"] for record in records
+                if self._is_derivative_source(record["content_type"], record["file_size"])
+            ]
+            if derivative_ids:
+                self._insert_pending_derivatives(cursor, derivative_ids)
+        return derivative_ids
+
+    def upload_files(
+        self,
+        files: List[Dict[str, Any]],
+        upload_user: Optional[str] = None,
+        folder: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Faz upload de vários arquivos de uma vez
+
+        Os blocos são enviados em paralelo. Arquivos com conteúdo idêntico a
+        um já existente na mesma pasta são registrados antes, apontando para
+        o blob existente, sem gravar o novo; os demais blobs são gravados em
+        paralelo e registrados com um único INSERT em lote, em uma única
+        transação. A deduplicação por SHA-256 também vale entre arquivos do
+        mesmo lote. Um arquivo que falha no envio ou na gravação do blob é
+        informado no próprio resultado, sem afetar os demais.
+
+        Args:
+            files: Lista de dicionários com original_filename, content_type,
+                file_stream (ou file_content em bytes) e tags (opcional)
+            upload_user: Usuário que fez o upload
+            folder: Pasta dentro do container (opcional)
+
+        Returns:
+            Dicionário com o resultado de cada arquivo, na ordem recebida
+        """
+        results: List[Dict[str, Any]] = [None] * len(files)
+
+        # 1. Enviar os blocos de todos os arquivos em paralelo
+        futures = [
+            self._batch_executor.submit(self._stage_batch_item, item, folder)
+            for item in files
+        ]
+        prepared = []
+        for index, (item, future) in enumerate(zip(files, futures)):
+            try:
+                prepared.append((index, item, future.result()))
+            except Exception as e:
+                results[index] = {
+                    "nome_original": item.get("original_filename"),
+                    "sucesso": False,
+                    "mensagem": f"Erro ao fazer upload: {str(e)}"
                 }
+
+        def fail(entries, message: str):
+            for index, item, _ in entries:
+                results[index] = {
+                    "nome_original": item["original_filename"],
+                    "sucesso": False,
+                    "mensagem": message
+                }
+
+        # 2. Arquivos repetidos no próprio lote usam o blob do primeiro
+        first_by_key: Dict[Tuple[bytes, int, str], Dict[str, Any]] = {}
+        for _, _, info in prepared:
+            info["key"] = (info["file_hash"], info["file_size"], info["folder_prefix"])
+            first_by_key.setdefault(info["key"], info)
+
+        registered = []
+        derivative_ids = []
+
+        # 3. Reaproveitar os blobs idênticos já existentes na pasta antes de
+        #    gravar os novos: os blocos enviados desses arquivos não são
+        #    confirmados (o Azure descarta blocos não confirmados)
+        try:
+            found, found_derivatives = [], []
+            with self._get_db_connection() as conn:
+                cursor = conn.cursor()
+                existing = {}
+                for key in first_by_key:
+                    duplicate = self._find_duplicate(cursor, *key)
+                    if duplicate:
+                        existing[key] = duplicate
+                if existing:
+                    found = [entry for entry in prepared if entry[2]["key"] in existing]
+                    for _, _, info in found:
+                        info["deduplicado"] = True
+                    found_derivatives = self._insert_batch_records(cursor, found, existing, upload_user)
+                    conn.commit()
+            registered += found
+            derivative_ids += found_derivatives
+            prepared = [entry for entry in prepared if entry[2]["key"] not in existing]
+            first_by_key = {key: first for key, first in first_by_key.items() if key not in existing}
         except Exception as e:
-            print(f"Erro ao buscar arquivo: {e}")
-            return None
+            fail(prepared, f"Erro ao registrar lote: {str(e)}")
+            prepared = []
+            first_by_key = {}
 
-    def download_file(self, file_id: str) -> Optional[Dict[str, Any]]:
+        # 4. Gravar os blobs novos fora da transação
+        committed_blobs = []
+        commit_futures = [
+            (first, self._batch_executor.submit(
+                first["staged"].commit, first["content_type"], first["content_encoding"]
+            ))
+            for first in first_by_key.values()
+        ]
+        # Uma falha ao gravar um blob afeta apenas os arquivos com esse
+        # conteúdo; os demais são registrados normalmente
+        failed_keys = {}
+        for first, future in commit_futures:
+            try:
+                future.result()
+                committed_blobs.append(first["blob_path"])
+            except Exception as e:
+                failed_keys[first["key"]] = e
+        if failed_keys:
+            for index, item, info in prepared:
+                if info["key"] in failed_keys:
+                    error = failed_keys[info["key"]]
+                    results[index] = {
+                        "nome_original": item["original_filename"],
+                        "sucesso": False,
+                        "mensagem": "Arquivo já existe no storage" if isinstance(error, ResourceExistsError)
+                        else f"Erro ao fazer upload: {str(error)}"
+                    }
+            prepared = [entry for entry in prepared if entry[2]["key"] not in failed_keys]
+            first_by_key = {
+                key: first for key, first in first_by_key.items()
+                if key not in failed_keys
+            }
+
+        # 5. Registrar os demais em uma transação curta: a deduplicação
+        #    bloqueia a faixa de cada hash só até o commit, sem requisições ao
+        #    Azure no meio. Um upload idêntico concorrente pode ter sido
+        #    registrado enquanto os blobs eram gravados
+        if prepared:
+            raced = set()
+            try:
+                with self._get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    blobs = {}
+                    for key, first in first_by_key.items():
+                        blobs[key] = self._find_duplicate(cursor, *key)
+                        if blobs[key]:
+                            raced.add(key)
+                        else:
+                            blobs[key] = {
+                                "nome_armazenado": first["unique_filename"],
+                                "caminho_blob": first["blob_path"],
+                                "url": first["blob_url"],
+                                "etag": first["staged"].etag,
+                                "codificacao": first["content_encoding"],
+                                "tamanho_armazenado": first["staged"].size
+                            }
+                    for _, _, info in prepared:
+                        info["deduplicado"] = info["key"] in raced or first_by_key[info["key"]] is not info
+                    new_derivatives = self._insert_batch_records(cursor, prepared, blobs, upload_user)
+                    conn.commit()
+            except Exception as e:
+                # Nenhum registro desses arquivos foi gravado: remover os blobs novos
+                self._discard_blobs(committed_blobs)
+                fail(prepared, f"Erro ao registrar lote: {str(e)}")
+            else:
+                registered += prepared
+                derivative_ids += new_derivatives
+                # Blobs novos com conteúdo que já existia na pasta
+                self._discard_blobs([first_by_key[key]["blob_path"] for key in raced])
+
+        for file_id in derivative_ids:
+            self._schedule_derivatives(file_id)
+        for index, item, info in registered:
+            results[index] = {
+                "id": info["file_id"],
+                "nome_original": item["original_filename"],
+                "nome_armazenado": info["unique_filename"],
+                "caminho_blob": info["blob_path"],
+                "url": info["blob_url"],
+                "tamanho_bytes": info["file_size"],
+                "tamanho_armazenado_bytes": info["stored_size"],
+                "codificacao_conteudo": info["content_encoding"],
+                "tipo_conteudo": item["content_type"],
+                "hash_sha256": info["file_hash"].hex(),
+                "deduplicado": info["deduplicado"],
+                "sucesso": True,
+                "mensagem": "Arquivo enviado com sucesso"
+            }
+
+        succeeded = sum(1 for r in results if r["sucesso"])
+        return {
+            "sucesso": succeeded > 0,
+            "total": len(files),
+            "enviados": succeeded,
+            "falhas": len(files) - succeeded,
+            "arquivos": results,
+            "mensagem": f"{succeeded} de {len(files)} arquivos enviados"
+        }
+
+    def create_upload_session(
+        self,
+        original_filename: str,
+        content_type: str,
+        file_size: int,
+        upload_user: Optional[str] = None,
+        tags: Optional[Dict[str, Any]] = None,
+        folder: Optional[str] = None,
+        expiry_hours: int = DEFAULT_UPLOAD_SESSION_EXPIRY_HOURS
+    ) -> Dict[str, Any]:
         """
-        Baixa um arquivo do Azure Blob Storage
+        Inicia uma sessão de upload em partes (retomável)
+
+        O arquivo é enviado em chunks de tamanho fixo, cada um gravado como um
+        bloco ainda não confirmado do blob. Se a conexão cair, o cliente
+        consulta a sessão e reenvia apenas os chunks que faltam.
 
         Args:
-            file_id: ID do arquivo no banco de dados
+            original_filename: Nome original do arquivo
+            content_type: Tipo MIME do arquivo
+            file_size: Tamanho total do arquivo em bytes
+            upload_user: Usuário que fez o upload
+            tags: Dicionário com tags adicionais
+            folder: Pasta dentro do container (opcional)
+            expiry_hours: Validade da sessão em horas
 
         Returns:
-            Dicionário com conteúdo do arquivo e metadados
+            Dicionário com o ID da sessão, tamanho do chunk e total de chunks
         """
         try:
-            # Obter informações do arquivo
-            file_info = self.get_file_info(file_id)
-            if not file_info:
+            if file_size < 0:
                 return {
                     "sucesso": False,
-                    "mensagem": "Arquivo não encontrado"
+                    "mensagem": "Tamanho do arquivo inválido"
                 }
 
-            # Baixar o blob
-            blob_client = self.container_client.get_blob_client(file_info["caminho_blob"])
-            blob_data = blob_client.download_blob()
-            file_content = blob_data.readall()
+            session = self._insert_upload_session(
+                session_type=UPLOAD_SESSION_CHUNKS,
+                original_filename=original_filename,
+                content_type=content_type,
+                file_size=file_size,
+                upload_user=upload_user,
+                tags=tags,
+                folder=folder,
+                expiry_minutes=expiry_hours * 60
+            )
 
             return {
                 "sucesso": True,
-                "conteudo": file_content,
-                "nome_original": file_info["nome_original"],
-                "tipo_conteudo": file_info["tipo_conteudo"],
-                "tamanho_bytes": file_info["tamanho_bytes"]
+                "sessao_id": session["id"],
+                "nome_original": original_filename,
+                "tamanho_bytes": file_size,
+                "tamanho_chunk": session["tamanho_chunk"],
+                "total_chunks": session["total_chunks"],
+                "validade_horas": expiry_hours,
+                "mensagem": "Sessão de upload criada"
             }
 
-        except ResourceNotFoundError:
+        except Exception as e:
             return {
                 "sucesso": False,
-                "mensagem": "Arquivo não encontrado no storage"
+                "mensagem": f"Erro ao criar sessão de upload: {str(e)}"
+            }
+
+    def _insert_upload_session(
+        self,
+        session_type: str,
+        original_filename: str,
+        content_type: str,
+        file_size: int,
+        upload_user: Optional[str],
+        tags: Optional[Dict[str, Any]],
+        folder: Optional[str],
+        expiry_minutes: int
+    ) -> Dict[str, Any]:
+        """Reserva o caminho do blob e grava uma nova sessão de upload"""
+        tags = self._serialize_tags(tags)
+        unique_filename, blob_path = self._build_blob_path(original_filename, folder)
+        chunk_size = self.upload_chunk_size
+        total_chunks = -(-file_size // chunk_size)
+        session_id = str(uuid.uuid4())
+
+        with self._get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO ArquivosUploadSessoes (
+                    Id, Tipo, NomeOriginal, NomeArmazenado, CaminhoBlob,
+                    TipoConteudo, TamanhoBytes, TamanhoChunk, TotalChunks,
+                    UploadPor, Tags, DataExpiracao
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, DATEADD(MINUTE, ?, GETDATE()))
+            """, (
+                session_id,
+                session_type,
+                original_filename,
+                unique_filename,
+                blob_path,
+                content_type,
+                file_size,
+                chunk_size,
+                total_chunks,
+                upload_user,
+                tags,
+                expiry_minutes
+            ))
+            conn.commit()
+
+        return {
+            "id": session_id,
+            "nome_armazenado": unique_filename,
+            "caminho_blob": blob_path,
+            "tamanho_chunk": chunk_size,
+            "total_chunks": total_chunks
+        }
+
+    def _get_upload_session(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Obtém os dados de uma sessão de upload do banco de dados"""
+        with self._get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT
+                    Id, Tipo, NomeOriginal, NomeArmazenado, CaminhoBlob,
+                    TipoConteudo, TamanhoBytes, TamanhoChunk, TotalChunks,
+                    UploadPor, Tags, Status, ArquivoId, DataExpiracao,
+                    CASE WHEN DataExpiracao <= GETDATE() THEN 1 ELSE 0 END AS Expirada
+                FROM ArquivosUploadSessoes
+                WHERE Id = ?
+            """, (session_id,))
+
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            return {
+                "id": row.Id,
+                "tipo": row.Tipo,
+                "nome_original": row.NomeOriginal,
+                "nome_armazenado": row.NomeArmazenado,
+                "caminho_blob": row.CaminhoBlob,
+                "tipo_conteudo": row.TipoConteudo,
+                "tamanho_bytes": row.TamanhoBytes,
+                "tamanho_chunk": row.TamanhoChunk,
+                "total_chunks": row.TotalChunks,
+                "upload_por": row.UploadPor,
+                "tags": row.Tags,
+                "status": row.Status,
+                "arquivo_id": row.ArquivoId,
+                "expira_em": row.DataExpiracao.isoformat() if row.DataExpiracao else None,
+                "expirada": bool(row.Expirada)
             }
+
+    @staticmethod
+    def _expected_chunk_size(session: Dict[str, Any], chunk_index: int) -> int:
+        """Tamanho esperado de um chunk (o último pode ser menor)"""
+        start = chunk_index * session["tamanho_chunk"]
+        return min(session["tamanho_chunk"], session["tamanho_bytes"] - start)
+
+    def _received_chunks(self, session: Dict[str, Any]) -> set:
+        """Índices dos chunks já recebidos (blocos não confirmados com o tamanho esperado)"""
+        blob_client = self.container_client.get_blob_client(session["caminho_blob"])
+        try:
+            _, uncommitted = blob_client.get_block_list("uncommitted")
+        except ResourceNotFoundError:
+            return set()
+
+        received = set()
+        for block in uncommitted:
+            try:
+                index = int(block.id)
+            except (TypeError, ValueError):
+                continue
+            if 0 <= index < session["total_chunks"] and block.size == self._expected_chunk_size(session, index):
+                received.add(index)
+        return received
+
+    def _session_blob_committed(self, blob_client, session: Dict[str, Any]) -> bool:
+        """
+        Verifica se os blocos da sessão já foram confirmados no blob
+        (conclusão anterior interrompida antes de registrar no banco, ou
+        outra conclusão simultânea): a lista de blocos confirmados deve ser
+        exatamente a dos chunks da sessão, na ordem e com os tamanhos
+        esperados
+        """
+        try:
+            committed, _ = blob_client.get_block_list("committed")
+        except ResourceNotFoundError:
+            return False
+        if len(committed) != session["total_chunks"]:
+            return False
+        return all(
+            block.id == self._block_id(index)
+            and block.size == self._expected_chunk_size(session, index)
+            for index, block in enumerate(committed)
+        )
+
+    def get_upload_session(self, session_id: str) -> Dict[str, Any]:
+        """
+        Retorna o andamento de uma sessão de upload
+
+        Args:
+            session_id: ID da sessão
+
+        Returns:
+            Dicionário com os chunks recebidos e os que ainda faltam
+        """
+        try:
+            session = self._get_upload_session(session_id)
+            if not session:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Sessão de upload não encontrada"
+                }
+
+            if session["status"] == UPLOAD_SESSION_COMPLETED:
+                received = set(range(session["total_chunks"]))
+            else:
+                received = self._received_chunks(session)
+
+            return {
+                "sucesso": True,
+                "sessao_id": session["id"],
+                "status": session["status"],
+                "arquivo_id": session["arquivo_id"],
+                "nome_original": session["nome_original"],
+                "tamanho_bytes": session["tamanho_bytes"],
+                "tamanho_chunk": session["tamanho_chunk"],
+                "total_chunks": session["total_chunks"],
+                "chunks_recebidos": sorted(received),
+                "chunks_pendentes": [
+                    i for i in range(session["total_chunks"]) if i not in received
+                ],
+                "expira_em": session["expira_em"],
+                "expirada": session["expirada"]
+            }
+
         except Exception as e:
             return {
                 "sucesso": False,
-                "mensagem": f"Erro ao baixar arquivo: {str(e)}"
+                "mensagem": f"Erro ao consultar sessão de upload: {str(e)}"
             }
 
-    def generate_download_url(
+    def upload_session_chunk(
         self,
-        file_id: str,
-        expiry_hours: int = 1
-    ) -> Optional[Dict[str, Any]]:
+        session_id: str,
+        chunk_index: int,
+        chunk_stream: BinaryIO,
+        length: int
+    ) -> Dict[str, Any]:
         """
-        Gera uma URL temporária (SAS) para download direto do arquivo
-        Útil para o Power Apps fazer download sem passar pela API
+        Recebe um chunk de uma sessão de upload e grava como bloco não confirmado
+
+        Reenviar um chunk já recebido apenas substitui o bloco anterior.
 
         Args:
-            file_id: ID do arquivo
-            expiry_hours: Tempo de validade da URL em horas (padrão: 1 hora)
+            session_id: ID da sessão
+            chunk_index: Posição do chunk (começando em 0)
+            chunk_stream: Stream com o conteúdo do chunk
+            length: Tamanho do chunk em bytes
 
         Returns:
-            Dicionário com a URL de download
+            Dicionário com o resultado da operação
         """
         try:
-            # Obter informações do arquivo
-            file_info = self.get_file_info(file_id)
-            if not file_info:
+            session = self._get_upload_session(session_id)
+            if not session or session["tipo"] != UPLOAD_SESSION_CHUNKS:
                 return {
                     "sucesso": False,
-                    "mensagem": "Arquivo não encontrado"
+                    "mensagem": "Sessão de upload não encontrada"
+                }
+            if session["status"] != UPLOAD_SESSION_PENDING:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Sessão de upload já concluída"
+                }
+            if session["expirada"]:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Sessão de upload expirada"
+                }
+            if not 0 <= chunk_index < session["total_chunks"]:
+                return {
+                    "sucesso": False,
+                    "mensagem": f"Índice de chunk inválido (0 a {session['total_chunks'] - 1})"
                 }
 
-            # Gerar SAS token
-            sas_token = generate_blob_sas(
-                account_name=self.storage_account,
-                container_name=self.container_name,
-                blob_name=file_info["caminho_blob"],
-                account_key=self.storage_key,
-                permission=BlobSasPermissions(read=True),
-                expiry=datetime.utcnow() + timedelta(hours=expiry_hours)
-            )
+            expected_size = self._expected_chunk_size(session, chunk_index)
+            if length != expected_size:
+                return {
+                    "sucesso": False,
+                    "mensagem": f"Tamanho do chunk inválido: esperado {expected_size} bytes"
+                }
 
-            # Montar URL completa
-            download_url = f"{file_info['url']}?{sas_token}"
+            blob_client = self.container_client.get_blob_client(session["caminho_blob"])
+            blob_client.stage_block(
+                block_id=self._block_id(chunk_index),
+                data=chunk_stream,
+                length=length
+            )
 
             return {
                 "sucesso": True,
-                "url_download": download_url,
-                "nome_original": file_info["nome_original"],
-                "validade_horas": expiry_hours,
-                "expira_em": (datetime.utcnow() + timedelta(hours=expiry_hours)).isoformat()
+                "sessao_id": session["id"],
+                "chunk": chunk_index,
+                "tamanho_bytes": length,
+                "mensagem": "Chunk recebido"
             }
 
         except Exception as e:
             return {
                 "sucesso": False,
-                "mensagem": f"Erro ao gerar URL de download: {str(e)}"
+                "mensagem": f"Erro ao receber chunk: {str(e)}"
             }
 
-    def delete_file(self, file_id: str, permanent: bool = False) -> Dict[str, Any]:
+    def commit_upload_session(self, session_id: str) -> Dict[str, Any]:
         """
-        Deleta um arquivo (soft delete por padrão)
+        Conclui uma sessão de upload: confirma os blocos no blob e registra
+        o arquivo no banco de dados
+
+        Pode ser chamado novamente após uma falha de rede: se a sessão já foi
+        concluída, retorna o arquivo registrado.
 
         Args:
-            file_id: ID do arquivo
-            permanent: Se True, deleta permanentemente do storage também
+            session_id: ID da sessão
 
         Returns:
-            Dicionário com resultado da operação
+            Dicionário com informações do arquivo salvo
         """
         try:
-            # Obter informações do arquivo
-            file_info = self.get_file_info(file_id)
-            if not file_info:
+            session = self._get_upload_session(session_id)
+            if not session or session["tipo"] != UPLOAD_SESSION_CHUNKS:
                 return {
                     "sucesso": False,
-                    "mensagem": "Arquivo não encontrado"
+                    "mensagem": "Sessão de upload não encontrada"
                 }
 
-            if permanent:
-                # Deletar do blob storage
-                blob_client = self.container_client.get_blob_client(file_info["caminho_blob"])
-                blob_client.delete_blob()
-
-                # Deletar do banco de dados
-                with self._get_db_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute("DELETE FROM ArquivosStorage WHERE Id = ?", (file_id,))
-                    conn.commit()
+            blob_client = self.container_client.get_blob_client(session["caminho_blob"])
 
+            if session["status"] == UPLOAD_SESSION_COMPLETED:
+                return self._upload_session_result(session, session["arquivo_id"], blob_client.url)
+            if session["expirada"]:
                 return {
-                    "sucesso": True,
-                    "mensagem": "Arquivo deletado permanentemente"
+                    "sucesso": False,
+                    "mensagem": "Sessão de upload expirada"
                 }
-            else:
-                # Soft delete - apenas marca como inativo
-                with self._get_db_connection() as conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "UPDATE ArquivosStorage SET Ativo = 0 WHERE Id = ?",
-                        (file_id,)
-                    )
-                    conn.commit()
 
+            received = self._received_chunks(session)
+            missing = [i for i in range(session["total_chunks"]) if i not in received]
+            if missing and not self._session_blob_committed(blob_client, session):
                 return {
-                    "sucesso": True,
-                    "mensagem": "Arquivo marcado como inativo"
+                    "sucesso": False,
+                    "mensagem": "Existem chunks pendentes",
+                    "chunks_pendentes": missing
                 }
 
+            blob_etag = None
+            if not missing:
+                # Confirmar os blocos na ordem dos chunks (falha se o blob já existir)
+                try:
+                    blob_etag = _StagedBlob(
+                        blob_client,
+                        session["tamanho_bytes"],
+                        block_list=[BlobBlock(block_id=self._block_id(i)) for i in range(session["total_chunks"])]
+                    ).commit(session["tipo_conteudo"])
+                except ResourceExistsError:
+                    # Outra conclusão simultânea confirmou os mesmos blocos:
+                    # registrar (ou retornar o registro da outra requisição)
+                    if not self._session_blob_committed(blob_client, session):
+                        raise
+
+            file_id = self._complete_upload_session(session, blob_client.url, blob_etag)
+            if not file_id:
+                # Outra requisição concluiu a sessão ao mesmo tempo
+                return self.commit_upload_session(session_id)
+
+            return self._upload_session_result(session, file_id, blob_client.url)
+
+        except ResourceExistsError:
+            return {
+                "sucesso": False,
+                "mensagem": "Arquivo já existe no storage"
+            }
         except Exception as e:
             return {
                 "sucesso": False,
-                "mensagem": f"Erro ao deletar arquivo: {str(e)}"
+                "mensagem": f"Erro ao concluir sessão de upload: {str(e)}"
             }
 
-    def list_files(
+    def _complete_upload_session(
         self,
-        limit: int = 100,
-        offset: int = 0,
-        folder: Optional[str] = None
-    ) -> Dict[str, Any]:
+        session: Dict[str, Any],
+        blob_url: str,
+        blob_etag: Optional[str]
+    ) -> Optional[str]:
         """
-        Lista arquivos do banco de dados
-
-        Args:
-            limit: Número máximo de registros
-            offset: Offset para paginação
-            folder: Filtrar por pasta específica
+        Registra o arquivo de uma sessão e marca a sessão como concluída, na
+        mesma transação
 
         Returns:
-            Lista de arquivos
+            ID do arquivo registrado, ou None se a sessão já tinha sido
+            concluída por outra requisição
         """
-        try:
-            with self._get_db_connection() as conn:
-                cursor = conn.cursor()
-
-                query = """
-                    SELECT
-                        Id, NomeOriginal, TamanhoBytes, TipoConteudo,
-                        DataUpload, UploadPor
-                    FROM ArquivosStorage
-                    WHERE Ativo = 1
-                """
-                params = []
+        file_id = str(uuid.uuid4())
+        with self._get_db_connection() as conn:
+            cursor = conn.cursor()
+            self._insert_file_record(
+                cursor,
+                file_id=file_id,
+                original_filename=session["nome_original"],
+                unique_filename=session["nome_armazenado"],
+                blob_path=session["caminho_blob"],
+                blob_url=blob_url,
+                file_size=session["tamanho_bytes"],
+                content_type=session["tipo_conteudo"],
+                upload_user=session["upload_por"],
+                tags=session["tags"],
+                blob_etag=blob_etag
+            )
+            cursor.execute("""
+                UPDATE ArquivosUploadSessoes
+                SET Status = ?, ArquivoId = ?
+                WHERE Id = ? AND Status = ?
+            """, (UPLOAD_SESSION_COMPLETED, file_id, session["id"], UPLOAD_SESSION_PENDING))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                return None
+            conn.commit()
+        return file_id
 
-                if folder:
-                    query += " AND CaminhoBlob LIKE ?"
-                    params.append(f"{folder}/%")
+    @staticmethod
+    def _upload_session_result(session: Dict[str, Any], file_id: str, blob_url: str) -> Dict[str, Any]:
+        """Resposta de uma sessão concluída (mesmo formato do upload simples)"""
+        return {
+            "id": file_id,
+            "nome_original": session["nome_original"],
+            "nome_armazenado": session["nome_armazenado"],
+            "caminho_blob": session["caminho_blob"],
+            "url": blob_url,
+            "tamanho_bytes": session["tamanho_bytes"],
+            "tipo_conteudo": session["tipo_conteudo"],
+            "sucesso": True,
+            "mensagem": "Arquivo enviado com sucesso"
+        }
 
-                query += " ORDER BY DataUpload DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
-                params.extend([offset, limit])
+    def create_direct_upload(
+        self,
+        original_filename: str,
+        content_type: str,
+        file_size: int,
+        upload_user: Optional[str] = None,
+        tags: Optional[Dict[str, Any]] = None,
+        folder: Optional[str] = None,
+        expiry_minutes: int = DEFAULT_DIRECT_UPLOAD_EXPIRY_MINUTES
+    ) -> Dict[str, Any]:
+        """
+        Reserva um caminho de blob e gera uma URL SAS temporária para o
+        cliente enviar o arquivo direto ao Azure Storage, sem passar pela API
 
-                cursor.execute(query, params)
+        A URL só permite criar o blob (não sobrescrevê-lo). Depois do envio,
+        o cliente deve chamar confirm_direct_upload.
 
-                files = []
-                for row in cursor.fetchall():
-                    files.append({
-                        "id": row.Id,
-                        "nome_original": row.NomeOriginal,
-                        "tamanho_bytes": row.TamanhoBytes,
-                        "tipo_conteudo": row.TipoConteudo,
-                        "data_upload": row.DataUpload.isoformat() if row.DataUpload else None,
-                        "upload_por": row.UploadPor
-                    })
+        Args:
+            original_filename: Nome original do arquivo
+            content_type: Tipo MIME do arquivo
+            file_size: Tamanho do arquivo em bytes (conferido na confirmação)
+            upload_user: Usuário que fez o upload
+            tags: Dicionário com tags adicionais
+            folder: Pasta dentro do container (opcional)
+            expiry_minutes: Validade da URL de upload em minutos
 
+        Returns:
+            Dicionário com o ID da sessão e a URL de upload
+        """
+        try:
+            if file_size < 0:
                 return {
-                    "sucesso": True,
-                    "arquivos": files,
-                    "total": len(files)
+                    "sucesso": False,
+                    "mensagem": "Tamanho do arquivo inválido"
                 }
 
+            session = self._insert_upload_session(
+                session_type=UPLOAD_SESSION_SAS,
+                original_filename=original_filename,
+                content_type=content_type,
+                file_size=file_size,
+                upload_user=upload_user,
+                tags=tags,
+                folder=folder,
+                expiry_minutes=expiry_minutes + DIRECT_UPLOAD_CONFIRM_GRACE_MINUTES
+            )
+
+            # Apenas criação: o Azure recusa sobrescrever o blob depois de
+            # enviado, e o tamanho e o ETag conferidos na confirmação valem
+            # enquanto o registro existir
+            expiry = datetime.utcnow() + timedelta(minutes=expiry_minutes)
+            sas_token = generate_blob_sas(
+                account_name=self.storage_account,
+                container_name=self.container_name,
+                blob_name=session["caminho_blob"],
+                account_key=self.storage_key,
+                permission=BlobSasPermissions(create=True),
+                expiry=expiry
+            )
+            blob_client = self.container_client.get_blob_client(session["caminho_blob"])
+
+            return {
+                "sucesso": True,
+                "sessao_id": session["id"],
+                "url_upload": f"{blob_client.url}?{sas_token}",
+                "metodo": "PUT",
+                "cabecalhos": {
+                    "x-ms-blob-type": "BlockBlob",
+                    "Content-Type": content_type
+                },
+                "nome_original": original_filename,
+                "tamanho_bytes": file_size,
+                "validade_minutos": expiry_minutes,
+                "expira_em": expiry.isoformat(),
+                "mensagem": "Envie o arquivo para url_upload e depois confirme o upload"
+            }
+
         except Exception as e:
             return {
                 "sucesso": False,
-                "mensagem": f"Erro ao listar arquivos: {str(e)}"
+                "mensagem": f"Erro ao reservar upload direto: {str(e)}"
+            }
+
+    def confirm_direct_upload(self, session_id: str) -> Dict[str, Any]:
+        """
+        Confirma um upload feito direto no Azure Storage
+
+        Consulta as propriedades do blob (HEAD), confere tamanho e tipo com o
+        que foi declarado na reserva e registra o arquivo. Um blob que não
+        confere é removido. Pode ser chamado novamente com segurança.
+
+        Args:
+            session_id: ID da sessão retornado por create_direct_upload
+
+        Returns:
+            Dicionário com informações do arquivo salvo
+        """
+        try:
+            session = self._get_upload_session(session_id)
+            if not session or session["tipo"] != UPLOAD_SESSION_SAS:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Sessão de upload não encontrada"
+                }
+
+            blob_client = self.container_client.get_blob_client(session["caminho_blob"])
+
+            if session["status"] == UPLOAD_SESSION_COMPLETED:
+                return self._upload_session_result(session, session["arquivo_id"], blob_client.url)
+            if session["expirada"]:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Sessão de upload expirada"
+                }
+
+            try:
+                properties = blob_client.get_blob_properties()
+            except ResourceNotFoundError:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Arquivo ainda não foi enviado ao storage"
+                }
+
+            actual_type = properties.content_settings.content_type
+            if properties.size != session["tamanho_bytes"] or actual_type != session["tipo_conteudo"]:
+                self._delete_blob_if_exists(session["caminho_blob"])
+                return {
+                    "sucesso": False,
+                    "mensagem": (
+                        f"Arquivo enviado não confere com a reserva: "
+                        f"{properties.size} bytes ({actual_type}), esperado "
+                        f"{session['tamanho_bytes']} bytes ({session['tipo_conteudo']})"
+                    )
+                }
+
+            file_id = self._complete_upload_session(session, blob_client.url, properties.etag)
+            if not file_id:
+                return self.confirm_direct_upload(session_id)
+
+            return self._upload_session_result(session, file_id, blob_client.url)
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao confirmar upload direto: {str(e)}"
+            }
+
+    def get_file_info(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtém informações de um arquivo do banco de dados (ou do cache de
+        metadados, se configurado)
+
+        Args:
+            file_id: ID do arquivo
+
+        Returns:
+            Dicionário com informações do arquivo ou None se não encontrado
+        """
+        try:
+            # Uma só chave de cache para qualquer grafia do UUID
+            file_id = str(uuid.UUID(str(file_id)))
+        except ValueError:
+            return None
+
+        try:
+            if self.metadata_cache:
+                found, file_info = self.metadata_cache.get(file_id)
+                if found:
+                    return file_info
+
+            file_info = self._query_file_info(file_id)
+            if self.metadata_cache:
+                self.metadata_cache.set(file_id, file_info)
+            return file_info
+        except Exception as e:
+            print(f"Erro ao buscar arquivo: {e}")
+            return None
+
+    def _invalidate_file_info(self, file_id: str):
+        """
+        Remove os metadados de um arquivo do cache (após alterar o registro)
+
+        Chamado depois do commit: uma falha do cache (ex.: Redis
+        indisponível) é registrada e não interrompe a operação, que já foi
+        gravada; a entrada antiga expira pela validade do cache.
+        """
+        self._invalidate_files_info([file_id])
+
+    def _invalidate_files_info(self, file_ids: List[str]):
+        """Remove os metadados de vários arquivos do cache (ver _invalidate_file_info)"""
+        if self.metadata_cache and file_ids:
+            try:
+                self.metadata_cache.invalidate_many(file_ids)
+            except Exception as e:
+                logger.warning("Erro ao invalidar o cache de metadados: %s", e)
+
+    @staticmethod
+    def _file_info_from_row(row) -> Dict[str, Any]:
+        """Metadados de um arquivo (formato de get_file_info) a partir de _FILE_INFO_COLUMNS"""
+        return {
+            "id": row.Id,
+            "nome_original": row.NomeOriginal,
+            "nome_armazenado": row.NomeArmazenado,
+            "caminho_blob": row.CaminhoBlob,
+            "url": row.UrlBlob,
+            "tamanho_bytes": row.TamanhoBytes,
+            "tipo_conteudo": row.TipoConteudo,
+            "container": row.Container,
+            "storage_account": row.StorageAccount,
+            "data_upload": row.DataUpload.isoformat() if row.DataUpload else None,
+            "upload_por": row.UploadPor,
+            "tags": row.Tags,
+            "ativo": row.Ativo,
+            "hash_sha256": row.HashSha256.hex() if row.HashSha256 else None,
+            "etag_blob": row.ETagBlob,
+            "versao_registro": row.VersaoRegistro.hex(),
+            "codificacao_conteudo": row.CodificacaoConteudo,
+            "tamanho_armazenado_bytes": row.TamanhoArmazenadoBytes or row.TamanhoBytes
+        }
+
+    def _query_file_info(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """Consulta os metadados de um arquivo ativo no banco (ver get_file_info)"""
+        with self._get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT {_FILE_INFO_COLUMNS}
+                FROM ArquivosStorage
+                WHERE Id = ? AND Ativo = 1
+            """, (file_id,))
+
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            return self._file_info_from_row(row)
+
+    def get_files_info(self, file_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        """
+        Obtém as informações de vários arquivos: os que não estão no cache de
+        metadados são consultados em uma única consulta (WHERE Id IN)
+
+        Args:
+            file_ids: IDs dos arquivos (UUIDs válidos)
+
+        Returns:
+            Dicionário de ID (como informado) para as informações do arquivo,
+            ou None se não encontrado
+        """
+        # O cache e a consulta usam o UUID normalizado
+        normalized = {file_id: str(uuid.UUID(str(file_id))) for file_id in file_ids}
+        result: Dict[str, Optional[Dict[str, Any]]] = {}
+        missing = []
+        for file_id in file_ids:
+            if self.metadata_cache:
+                found, file_info = self.metadata_cache.get(normalized[file_id])
+                if found:
+                    result[file_id] = file_info
+                    continue
+            missing.append(file_id)
+
+        if missing:
+            with self._get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(f"""
+                    SELECT {_FILE_INFO_COLUMNS}
+                    FROM ArquivosStorage
+                    WHERE Ativo = 1
+                      AND Id IN (SELECT CAST(value AS UNIQUEIDENTIFIER) FROM OPENJSON(?))
+                """, (json.dumps([normalized[file_id] for file_id in missing]),))
+                found_rows = {
+                    str(uuid.UUID(str(row.Id))): self._file_info_from_row(row)
+                    for row in cursor.fetchall()
+                }
+
+            for file_id in missing:
+                file_info = found_rows.get(normalized[file_id])
+                result[file_id] = file_info
+                if self.metadata_cache:
+                    self.metadata_cache.set(normalized[file_id], file_info)
+
+        return result
+
+    def download_file(self, file_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Baixa um arquivo do Azure Blob Storage
+
+        Args:
+            file_id: ID do arquivo no banco de dados
+
+        Returns:
+            Dicionário com conteúdo do arquivo e metadados
+        """
+        try:
+            # Obter informações do arquivo
+            file_info = self.get_file_info(file_id)
+            if not file_info:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Arquivo não encontrado"
+                }
+
+            # Usar a cópia do cache em disco, se houver
+            cached_path = None
+            if self.disk_cache:
+                etag = self.get_blob_etag(file_info)
+                cached_path = etag and self.disk_cache.get(
+                    file_info["caminho_blob"], etag, self._stored_size(file_info)
+                )
+
+            file_content = None
+            if cached_path:
+                try:
+                    with open(cached_path, "rb") as cached_file:
+                        file_content = cached_file.read()
+                except OSError:
+                    # Removido do cache por outro processo
+                    file_content = None
+
+            if file_content is None:
+                # Baixar o blob
+                blob_client = self.container_client.get_blob_client(file_info["caminho_blob"])
+                blob_data = blob_client.download_blob()
+                file_content = blob_data.readall()
+
+            encoding = file_info.get("codificacao_conteudo")
+            if encoding:
+                file_content = b"".join(self._decompress_chunks([file_content], encoding))
+
+            return {
+                "sucesso": True,
+                "conteudo": file_content,
+                "nome_original": file_info["nome_original"],
+                "tipo_conteudo": file_info["tipo_conteudo"],
+                "tamanho_bytes": file_info["tamanho_bytes"]
+            }
+
+        except ResourceNotFoundError:
+            return {
+                "sucesso": False,
+                "mensagem": "Arquivo não encontrado no storage"
+            }
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao baixar arquivo: {str(e)}"
+            }
+
+    def get_blob_etag(self, file_info: Dict[str, Any]) -> Optional[str]:
+        """
+        Retorna o ETag do blob de um arquivo sem baixar o conteúdo
+
+        O ETag é gravado no registro durante o upload; para registros
+        anteriores a isso, consulta as propriedades do blob no storage.
+
+        Args:
+            file_info: Informações obtidas com get_file_info
+
+        Returns:
+            ETag do blob, ou None se o blob não existir
+        """
+        if file_info.get("etag_blob"):
+            return file_info["etag_blob"]
+        try:
+            blob_client = self.container_client.get_blob_client(file_info["caminho_blob"])
+            return blob_client.get_blob_properties().etag
+        except ResourceNotFoundError:
+            return None
+
+    def download_file_stream(
+        self,
+        file_id: str,
+        byte_range: Optional[Tuple[int, int]] = None,
+        if_range: Optional[Union[str, datetime]] = None,
+        file_info: Optional[Dict[str, Any]] = None,
+        accept_encodings: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Abre o download de um arquivo sem carregá-lo inteiro em memória
+
+        O conteúdo é lido do Azure em partes de download_chunk_size bytes,
+        conforme o iterador em "chunks" é consumido.
+
+        Arquivos gravados comprimidos são repassados comprimidos se a
+        compressão estiver em accept_encodings, e descomprimidos durante a
+        leitura caso contrário. Nesses arquivos byte_range é ignorado (o
+        intervalo se refere ao conteúdo original).
+
+        Args:
+            file_id: ID do arquivo no banco de dados
+            byte_range: Intervalo (inicio, fim) a baixar, com fim exclusivo;
+                None baixa o arquivo inteiro
+            if_range: ETag ou data de modificação que o blob precisa ter para
+                que apenas o intervalo seja baixado; se o blob mudou, o
+                arquivo inteiro é retornado (semântica do If-Range do HTTP)
+            file_info: Informações já obtidas com get_file_info (evita
+                consultar o banco novamente)
+            accept_encodings: Compressões aceitas pelo cliente (ex.: ["gzip"])
+
+        Returns:
+            Dicionário com o iterador do conteúdo ("chunks") e metadados.
+            "parcial" indica se apenas o intervalo pedido foi retornado e
+            "codificacao", a compressão do conteúdo retornado (None se
+            descomprimido). Com o cache em disco habilitado, um arquivo não
+            comprimido em cache é retornado em "arquivo_cache" (caminho
+            local, arquivo inteiro) sem "chunks".
+        """
+        try:
+            file_info = file_info or self.get_file_info(file_id)
+            if not file_info:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Arquivo não encontrado"
+                }
+
+            encoding = file_info.get("codificacao_conteudo")
+            if encoding:
+                byte_range = None
+
+            cache_etag = None
+            cached_file = None
+            if self.disk_cache:
+                cache_etag = self.get_blob_etag(file_info)
+                cached_path = cache_etag and self.disk_cache.get(
+                    file_info["caminho_blob"], cache_etag, self._stored_size(file_info)
+                )
+                if cached_path and not encoding:
+                    return {
+                        "sucesso": True,
+                        "arquivo_cache": cached_path,
+                        "nome_original": file_info["nome_original"],
+                        "tipo_conteudo": file_info["tipo_conteudo"],
+                        "tamanho_bytes": file_info["tamanho_bytes"],
+                        "tamanho_total": file_info["tamanho_bytes"],
+                        "parcial": False,
+                        "intervalo": None,
+                        "etag": cache_etag,
+                        "ultima_modificacao": None,
+                        "codificacao": None
+                    }
+                if cached_path:
+                    try:
+                        cached_file = open(cached_path, "rb")
+                    except OSError:
+                        # Removido do cache por outro processo
+                        cached_file = None
+
+            if cached_file:
+                # Blob comprimido em cache: passa pela descompressão abaixo
+                chunks = self._read_file_chunks(cached_file, self.download_chunk_size)
+                size = self._stored_size(file_info)
+                etag = cache_etag
+                last_modified = None
+            else:
+                blob_client = self.container_client.get_blob_client(file_info["caminho_blob"])
+
+                downloader = None
+                if byte_range:
+                    start, stop = byte_range
+                    conditions = {}
+                    if isinstance(if_range, datetime):
+                        conditions["if_unmodified_since"] = if_range
+                    elif if_range:
+                        conditions["etag"] = '"' + if_range.strip('"') + '"'
+                        conditions["match_condition"] = MatchConditions.IfNotModified
+                    try:
+                        downloader = blob_client.download_blob(
+                            offset=start,
+                            length=stop - start,
+                            **conditions
+                        )
+                    except ResourceModifiedError:
+                        byte_range = None
+
+                if downloader is None:
+                    downloader = blob_client.download_blob()
+
+                chunks = downloader.chunks()
+                size = downloader.size
+                etag = downloader.properties.etag
+                last_modified = downloader.properties.last_modified
+                if self.disk_cache and byte_range is None:
+                    # Gravar no cache (como está no storage) enquanto o
+                    # conteúdo é enviado ao cliente
+                    entry = self.disk_cache.writer(file_info["caminho_blob"], etag, size)
+                    if entry:
+                        chunks = self._tee_to_cache(chunks, entry)
+
+            if encoding and encoding not in (accept_encodings or ()):
+                chunks = self._decompress_chunks(chunks, encoding)
+                size = file_info["tamanho_bytes"]
+                encoding = None
+
+            return {
+                "sucesso": True,
+                "chunks": chunks,
+                "nome_original": file_info["nome_original"],
+                "tipo_conteudo": file_info["tipo_conteudo"],
+                "tamanho_bytes": size,
+                "tamanho_total": file_info["tamanho_bytes"],
+                "parcial": byte_range is not None,
+                "intervalo": byte_range,
+                "etag": etag,
+                "ultima_modificacao": last_modified,
+                "codificacao": encoding
+            }
+
+        except ResourceNotFoundError:
+            return {
+                "sucesso": False,
+                "mensagem": "Arquivo não encontrado no storage"
+            }
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao baixar arquivo: {str(e)}"
+            }
+
+    @staticmethod
+    def _tee_to_cache(chunks, entry):
+        """Repassa as partes do download gravando uma cópia no cache em disco"""
+        try:
+            for chunk in chunks:
+                entry.write(chunk)
+                yield chunk
+            entry.commit()
+        finally:
+            # Download interrompido (ou já publicado): nada a fazer no commit
+            entry.discard()
+
+    def _sas_expiry(self, expiry_hours: float) -> datetime:
+        """
+        Expiração de uma URL SAS de download: agora + expiry_hours,
+        arredondado para cima até o fim do intervalo sas_expiry_bucket
+        """
+        bucket_seconds = self.sas_expiry_bucket.total_seconds()
+        expiry = datetime.utcnow() + timedelta(hours=expiry_hours)
+        timestamp = (expiry - datetime(1970, 1, 1)).total_seconds()
+        buckets = -(-timestamp // bucket_seconds)
+        return datetime(1970, 1, 1) + timedelta(seconds=buckets * bucket_seconds)
+
+    def _download_sas_url(self, blob_path: str, blob_url: str, expiry: datetime) -> str:
+        """URL do blob com um token SAS de leitura (reaproveitado do cache, se houver)"""
+        key = (blob_path, expiry)
+        sas_token = self._sas_tokens.get(key)
+        if sas_token is None:
+            sas_token = generate_blob_sas(
+                account_name=self.storage_account,
+                container_name=self.container_name,
+                blob_name=blob_path,
+                account_key=self.storage_key,
+                permission=BlobSasPermissions(read=True),
+                expiry=expiry
+            )
+            self._sas_tokens.set(key, sas_token)
+        return f"{blob_url}?{sas_token}"
+
+    def generate_download_url(
+        self,
+        file_id: str,
+        expiry_hours: int = 1,
+        variant: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Gera uma URL temporária (SAS) para download direto do arquivo
+        Útil para o Power Apps fazer download sem passar pela API
+
+        A expiração é arredondada para cima até o fim do intervalo
+        sas_expiry_bucket: dentro do intervalo, a URL de um arquivo é a mesma.
+
+        Args:
+            file_id: ID do arquivo
+            expiry_hours: Tempo mínimo de validade da URL em horas (padrão: 1 hora)
+            variant: Variante pedida (ex.: "thumb"); sem ela pronta, a URL é
+                a do original (ver get_derivative_info)
+
+        Returns:
+            Dicionário com a URL de download e a variante servida (None =
+            original)
+        """
+        try:
+            # Obter informações do arquivo
+            file_info = self.get_file_info(file_id)
+            if not file_info:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Arquivo não encontrado"
+                }
+
+            if variant:
+                file_info = self.get_derivative_info(file_info, variant) or file_info
+
+            expiry = self._sas_expiry(expiry_hours)
+            download_url = self._download_sas_url(file_info["caminho_blob"], file_info["url"], expiry)
+
+            return {
+                "sucesso": True,
+                "url_download": download_url,
+                "nome_original": file_info["nome_original"],
+                "variante": file_info.get("variante"),
+                "validade_horas": expiry_hours,
+                "expira_em": expiry.isoformat()
+            }
+
+        except ValueError as e:
+            return {
+                "sucesso": False,
+                "mensagem": str(e)
+            }
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao gerar URL de download: {str(e)}"
+            }
+
+    def generate_download_urls(
+        self,
+        file_ids: List[str],
+        expiry_hours: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Gera as URLs temporárias (SAS) de vários arquivos com uma única
+        consulta ao banco (ver generate_download_url)
+
+        Args:
+            file_ids: IDs dos arquivos
+            expiry_hours: Tempo mínimo de validade das URLs em horas
+
+        Returns:
+            Dicionário com as URLs, na ordem dos IDs, e os IDs não encontrados
+        """
+        try:
+            try:
+                ids = list(dict.fromkeys(str(uuid.UUID(str(file_id))) for file_id in file_ids))
+            except ValueError:
+                raise ValueError("IDs de arquivo inválidos")
+
+            files_info = self.get_files_info(ids)
+            expiry = self._sas_expiry(expiry_hours)
+
+            urls = []
+            not_found = []
+            for file_id in ids:
+                file_info = files_info.get(file_id)
+                if not file_info:
+                    not_found.append(file_id)
+                    continue
+                urls.append({
+                    "id": file_id,
+                    "url_download": self._download_sas_url(
+                        file_info["caminho_blob"], file_info["url"], expiry
+                    ),
+                    "nome_original": file_info["nome_original"]
+                })
+
+            return {
+                "sucesso": True,
+                "urls": urls,
+                "nao_encontrados": not_found,
+                "validade_horas": expiry_hours,
+                "expira_em": expiry.isoformat()
+            }
+
+        except ValueError as e:
+            return {
+                "sucesso": False,
+                "mensagem": str(e)
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao gerar URLs de download: {str(e)}"
+            }
+
+    @staticmethod
+    def _zip_entry_name(name: Optional[str]) -> str:
+        """Nome de um arquivo dentro do ZIP: sem caminho (evita entradas fora da pasta extraída)"""
+        name = (name or "").replace("\\", "/").split("/")[-1].strip()
+        return name if name not in ("", ".", "..") else "arquivo"
+
+    @staticmethod
+    def _zip_date_time(value: Union[str, datetime, None]) -> Tuple[int, int, int, int, int, int]:
+        """Data de uma entrada do ZIP (o formato não aceita datas anteriores a 1980)"""
+        if isinstance(value, str):
+            value = datetime.fromisoformat(value)
+        value = value or datetime.now()
+        if value.year < 1980:
+            return (1980, 1, 1, 0, 0, 0)
+        return value.timetuple()[:6]
+
+    def _zip_entries_by_ids(self, file_ids: List[str]) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """Entradas do ZIP para os IDs informados (na ordem dos IDs) e os IDs não encontrados"""
+        try:
+            ids = list(dict.fromkeys(str(uuid.UUID(str(file_id))) for file_id in file_ids))
+        except ValueError:
+            raise ValueError("IDs de arquivo inválidos")
+
+        files_info = self.get_files_info(ids)
+        entries = []
+        not_found = []
+        for file_id in ids:
+            file_info = files_info.get(file_id)
+            if not file_info:
+                not_found.append(file_id)
+                continue
+            entries.append({
+                "id": file_id,
+                "nome": self._zip_entry_name(file_info["nome_original"]),
+                "caminho_blob": file_info["caminho_blob"],
+                "tamanho_bytes": file_info["tamanho_bytes"],
+                "tamanho_armazenado_bytes": self._stored_size(file_info),
+                "codificacao": file_info.get("codificacao_conteudo"),
+                "etag_blob": file_info["etag_blob"],
+                "data_upload": file_info["data_upload"]
+            })
+        return entries, not_found
+
+    def _zip_entries_by_folder(
+        self,
+        folder: str,
+        include_subfolders: bool,
+        max_files: int
+    ) -> List[Dict[str, Any]]:
+        """
+        Entradas do ZIP para os arquivos ativos de uma pasta; com as
+        subpastas, cada arquivo fica no caminho relativo à pasta
+
+        Raises:
+            ValueError: Se a pasta tiver mais de max_files arquivos
+        """
+        condition, params = self._folder_condition(folder, include_subfolders)
+        with self._get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"""
+                SELECT TOP (?) Id, NomeOriginal, CaminhoBlob, TamanhoBytes,
+                       TamanhoArmazenadoBytes, CodificacaoConteudo, ETagBlob,
+                       DataUpload, Pasta
+                FROM ArquivosStorage
+                WHERE Ativo = 1 AND {condition}
+                ORDER BY Pasta, NomeOriginal, Id
+            """, [max_files + 1] + params)
+            rows = cursor.fetchall()
+
+        if len(rows) > max_files:
+            raise ValueError(f"A pasta tem mais de {max_files} arquivos; exporte as subpastas separadamente")
+
+        entries = []
+        for row in rows:
+            name = self._zip_entry_name(row.NomeOriginal)
+            relative = row.Pasta[len(folder):].lstrip("/") if folder else row.Pasta
+            entries.append({
+                "id": str(row.Id),
+                "nome": f"{relative}/{name}" if relative else name,
+                "caminho_blob": row.CaminhoBlob,
+                "tamanho_bytes": row.TamanhoBytes,
+                "tamanho_armazenado_bytes": row.TamanhoArmazenadoBytes or row.TamanhoBytes,
+                "codificacao": row.CodificacaoConteudo,
+                "etag_blob": row.ETagBlob,
+                "data_upload": row.DataUpload
+            })
+        return entries
+
+    def _open_zip_entry(self, entry: Dict[str, Any]) -> Tuple[int, Any]:
+        """
+        Abre a leitura do conteúdo de uma entrada do ZIP (no pool de
+        exportação, antes de a entrada ser gravada)
+
+        Returns:
+            (tamanho em bytes, iterador das partes do conteúdo); blobs
+            comprimidos são descomprimidos durante a leitura
+
+        Raises:
+            ResourceNotFoundError: Se o blob não existir
+        """
+        chunks = None
+        if self.disk_cache and entry["etag_blob"]:
+            cached_path = self.disk_cache.get(
+                entry["caminho_blob"], entry["etag_blob"], entry["tamanho_armazenado_bytes"]
+            )
+            if cached_path:
+                try:
+                    chunks = self._read_file_chunks(open(cached_path, "rb"), self.download_chunk_size)
+                    size = entry["tamanho_armazenado_bytes"]
+                except OSError:
+                    # Removido do cache por outro processo
+                    chunks = None
+
+        if chunks is None:
+            # download_blob já busca a primeira parte; as demais são lidas
+            # conforme o iterador é consumido
+            blob_client = self.container_client.get_blob_client(entry["caminho_blob"])
+            downloader = blob_client.download_blob()
+            chunks, size = downloader.chunks(), downloader.size
+
+        if entry["codificacao"]:
+            return entry["tamanho_bytes"], self._decompress_chunks(chunks, entry["codificacao"])
+        return size, chunks
+
+    @staticmethod
+    def _read_file_chunks(file_obj: BinaryIO, chunk_size: int):
+        """Lê um arquivo local em partes, fechando-o ao terminar"""
+        with file_obj:
+            while True:
+                chunk = file_obj.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def _zip_stream(self, entries: List[Dict[str, Any]], failures: List[str]):
+        """
+        Monta o ZIP enquanto ele é enviado: cada entrada é gravada conforme o
+        blob é lido, e os downloads das próximas zip_prefetch entradas são
+        abertos em paralelo para não haver espera entre um arquivo e outro
+
+        Os arquivos são armazenados sem compressão (ZIP_STORED): a maioria já
+        é comprimida (PDF, imagens) e a vazão fica limitada só pela rede.
+        Blobs ausentes ou que não puderam ser abertos são pulados e listados,
+        com as falhas recebidas em failures, na entrada ZIP_ERRORS_ENTRY ao
+        final.
+        """
+        sink = _ZipStreamSink()
+        pending = iter(entries)
+        window = deque()
+        used_names = set()
+
+        def unique_name(name: str) -> str:
+            # Nomes repetidos recebem um sufixo: "laudo (2).pdf"
+            base, extension = os.path.splitext(name)
+            copy = 1
+            while name.lower() in used_names:
+                copy += 1
+                name = f"{base} ({copy}){extension}"
+            used_names.add(name.lower())
+            return name
+
+        def schedule():
+            entry = next(pending, None)
+            if entry is not None:
+                window.append((entry, self._zip_executor.submit(self._open_zip_entry, entry)))
+
+        try:
+            for _ in range(self.zip_prefetch):
+                schedule()
+
+            with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+                while True:
+                    schedule()
+                    if not window:
+                        break
+                    entry, opening = window.popleft()
+                    try:
+                        size, chunks = opening.result()
+                    except ResourceNotFoundError:
+                        failures.append(f"{entry['nome']} ({entry['id']}): arquivo não encontrado no storage")
+                        continue
+                    except AzureError as e:
+                        # Falha ao abrir o download (ex.: tempo esgotado): o
+                        # restante do ZIP continua
+                        failures.append(f"{entry['nome']} ({entry['id']}): erro ao ler do storage: {e}")
+                        continue
+
+                    info = zipfile.ZipInfo(unique_name(entry["nome"]), date_time=self._zip_date_time(entry["data_upload"]))
+                    info.compress_type = zipfile.ZIP_STORED
+                    info.external_attr = 0o644 << 16
+                    # Com o tamanho informado, o ZipFile decide se a entrada
+                    # precisa do formato ZIP64 (acima de 4 GB)
+                    info.file_size = size
+                    with archive.open(info, "w") as entry_file:
+                        for chunk in chunks:
+                            entry_file.write(chunk)
+                            data = sink.drain()
+                            if data:
+                                yield data
+
+                if failures:
+                    # Um arquivo exportado também pode se chamar ERROS.txt
+                    archive.writestr(unique_name(ZIP_ERRORS_ENTRY), "\r\n".join(failures) + "\r\n")
+
+            data = sink.drain()
+            if data:
+                yield data
+
+        finally:
+            # Cliente desconectou: descarta os downloads ainda não usados
+            for _, opening in window:
+                opening.cancel()
+
+    def export_zip(
+        self,
+        file_ids: Optional[List[str]] = None,
+        folder: Optional[str] = None,
+        include_subfolders: bool = False,
+        max_files: int = DEFAULT_ZIP_MAX_FILES
+    ) -> Dict[str, Any]:
+        """
+        Prepara a exportação de vários arquivos em um único ZIP, montado em
+        streaming: nem o arquivo inteiro nem os blobs ficam em memória ou em
+        disco (no máximo uma parte por download aberto)
+
+        Args:
+            file_ids: IDs dos arquivos (arquivos na raiz do ZIP)
+            folder: Pasta exportada, alternativa aos IDs ("" para a raiz)
+            include_subfolders: Com folder, incluir as subpastas (mantendo a
+                estrutura de pastas dentro do ZIP)
+            max_files: Limite de arquivos exportados
+
+        Returns:
+            Dicionário com o iterador do conteúdo do ZIP ("chunks"), o nome
+            sugerido para o arquivo e os IDs não encontrados
+        """
+        try:
+            if bool(file_ids) == (folder is not None):
+                raise ValueError("Informe 'ids' ou 'pasta' (apenas um)")
+
+            not_found = []
+            if file_ids:
+                if len(file_ids) > max_files:
+                    raise ValueError(f"Máximo de {max_files} arquivos por exportação")
+                entries, not_found = self._zip_entries_by_ids(file_ids)
+                zip_name = "arquivos.zip"
+            else:
+                folder = self._normalize_folder(folder)
+                entries = self._zip_entries_by_folder(folder, include_subfolders, max_files)
+                zip_name = (folder.rsplit("/", 1)[-1] if folder else "arquivos") + ".zip"
+
+            if not entries:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Nenhum arquivo encontrado"
+                }
+
+            failures = [f"{file_id}: arquivo não encontrado" for file_id in not_found]
+            return {
+                "sucesso": True,
+                "chunks": self._zip_stream(entries, failures),
+                "nome_arquivo": zip_name,
+                "quantidade": len(entries),
+                "tamanho_bytes": sum(entry["tamanho_bytes"] or 0 for entry in entries),
+                "nao_encontrados": not_found
+            }
+
+        except ValueError as e:
+            return {
+                "sucesso": False,
+                "mensagem": str(e)
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao exportar arquivos: {str(e)}"
+            }
+
+    @staticmethod
+    def _is_derivative_source(content_type: Optional[str], size: int = 0) -> bool:
+        """Indica se um arquivo gera variantes (imagem de tipo suportado, dentro do limite de tamanho)"""
+        media_type = (content_type or "").split(";", 1)[0].strip().lower()
+        return media_type in DERIVATIVE_SOURCE_CONTENT_TYPES and size <= DERIVATIVE_MAX_SOURCE_SIZE
+
+    @staticmethod
+    def _derivative_blob_paths(folder: str, file_id: str) -> Dict[str, str]:
+        """Caminhos dos blobs das variantes de um arquivo, na mesma pasta do original"""
+        prefix = folder + "/" if folder else ""
+        file_id = str(uuid.UUID(str(file_id)))
+        return {variant: f"{prefix}{file_id}.{variant}.jpg" for variant in DERIVATIVE_VARIANTS}
+
+    @staticmethod
+    def _insert_pending_derivatives(cursor, file_ids: List[str]):
+        """Registra as variantes pendentes de arquivos novos (o commit fica a cargo de quem chama)"""
+        params = [(file_id, variant) for file_id in file_ids for variant in DERIVATIVE_VARIANTS]
+        cursor.fast_executemany = len(params) > 1
+        cursor.executemany("INSERT INTO ArquivosDerivados (ArquivoId, Variante) VALUES (?, ?)", params)
+
+    def _schedule_derivatives(self, file_id: str) -> bool:
+        """
+        Enfileira a geração das variantes de uma imagem; com a fila cheia,
+        elas continuam pendentes (ver get_derivative_info)
+
+        Returns:
+            True se foi enfileirada
+        """
+        if not self.derivative_workers or not self._derivative_slots.acquire(blocking=False):
+            return False
+        future = self._derivative_executor.submit(self._generate_derivatives, file_id)
+        future.add_done_callback(lambda _: self._derivative_slots.release())
+        return True
+
+    @staticmethod
+    def _render_derivatives(source_file: BinaryIO) -> List[Tuple[str, bytes, int, int]]:
+        """
+        Gera as variantes de uma imagem em JPEG, da maior para a menor: cada
+        uma é reduzida a partir da anterior, e um JPEG já é decodificado em
+        escala reduzida (draft), sem expandir a foto inteira em memória
+
+        Args:
+            source_file: Arquivo posicionável com a imagem original
+
+        Returns:
+            Lista de (variante, conteúdo, largura, altura)
+        """
+        sizes = sorted(DERIVATIVE_VARIANTS.items(), key=lambda item: item[1], reverse=True)
+        with Image.open(source_file) as source:
+            source.draft("RGB", (sizes[0][1], sizes[0][1]))
+            # Fotos de celular: aplicar a orientação gravada no EXIF
+            image = ImageOps.exif_transpose(source)
+            if image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info):
+                # Transparência sobre fundo branco (o JPEG não tem canal alfa)
+                rgba = image.convert("RGBA")
+                image = Image.new("RGB", rgba.size, (255, 255, 255))
+                image.paste(rgba, mask=rgba.getchannel("A"))
+            else:
+                image = image.convert("RGB")
+
+        rendered = []
+        for variant, max_side in sizes:
+            image.thumbnail((max_side, max_side))
+            output = io.BytesIO()
+            image.save(output, format="JPEG", quality=DERIVATIVE_JPEG_QUALITY)
+            rendered.append((variant, output.getvalue(), image.width, image.height))
+        return rendered
+
+    def _download_derivative_source(self, file_id: str, file_info: Dict[str, Any], target: BinaryIO):
+        """
+        Copia o conteúdo (descomprimido) de uma imagem para target, em partes,
+        sem passar de DERIVATIVE_MAX_SOURCE_SIZE bytes
+
+        Raises:
+            ValueError: Se a imagem passar do limite
+        """
+        downloaded = self.download_file_stream(file_id, file_info=file_info)
+        if not downloaded.get("sucesso"):
+            raise RuntimeError(downloaded.get("mensagem"))
+
+        chunks = downloaded.get("chunks")
+        if chunks is None:
+            chunks = self._read_file_chunks(open(downloaded["arquivo_cache"], "rb"), self.download_chunk_size)
+        for chunk in chunks:
+            if target.tell() + len(chunk) > DERIVATIVE_MAX_SOURCE_SIZE:
+                raise ValueError("Imagem maior que o limite para gerar variantes")
+            target.write(chunk)
+        target.seek(0)
+
+    def _generate_derivatives(self, file_id: str):
+        """
+        Gera e grava as variantes de uma imagem (no pool de variantes)
+
+        A imagem é lida em um arquivo temporário (em memória até
+        DERIVATIVE_SOURCE_MEMORY_SIZE). Uma falha deixa as variantes
+        pendentes, para nova tentativa após DERIVATIVE_RETRY_MINUTES (ver
+        get_derivative_info), até DERIVATIVE_MAX_ATTEMPTS tentativas.
+        """
+        try:
+            file_info = self.get_file_info(file_id)
+            if not file_info:
+                # Excluído antes de ser processado
+                return
+
+            with tempfile.SpooledTemporaryFile(max_size=DERIVATIVE_SOURCE_MEMORY_SIZE) as source_file:
+                self._download_derivative_source(file_id, file_info, source_file)
+                rendered = self._render_derivatives(source_file)
+
+            paths = self._derivative_blob_paths(self._folder_of(file_info["caminho_blob"]), file_id)
+            for variant, data, width, height in rendered:
+                blob_client = self.container_client.get_blob_client(paths[variant])
+                response = blob_client.upload_blob(
+                    data,
+                    overwrite=True,
+                    content_settings=ContentSettings(content_type=DERIVATIVE_CONTENT_TYPE)
+                )
+                with self._get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        UPDATE ArquivosDerivados
+                        SET Status = ?, CaminhoBlob = ?, TamanhoBytes = ?, Largura = ?,
+                            Altura = ?, ETagBlob = ?, DataConclusao = GETDATE(), Erro = NULL
+                        WHERE ArquivoId = ? AND Variante = ?
+                    """, (
+                        DERIVATIVE_COMPLETED, paths[variant], len(data), width,
+                        height, response["etag"], file_id, variant
+                    ))
+                    updated = cursor.rowcount
+                if not updated:
+                    # Arquivo excluído durante a geração: os registros das
+                    # variantes saíram em cascata
+                    self._delete_blobs(list(paths.values()))
+                    return
+
+        except Exception as e:
+            logger.exception("Erro ao gerar variantes do arquivo %s: %s", file_id, e)
+            try:
+                # DataCriacao reinicia o intervalo até a próxima tentativa
+                with self._get_db_connection() as conn:
+                    conn.cursor().execute("""
+                        UPDATE ArquivosDerivados
+                        SET Tentativas = Tentativas + 1,
+                            Status = CASE WHEN Tentativas + 1 >= ? THEN ? ELSE Status END,
+                            DataCriacao = GETDATE(), Erro = ?
+                        WHERE ArquivoId = ? AND Status = ?
+                    """, (DERIVATIVE_MAX_ATTEMPTS, DERIVATIVE_FAILED, str(e)[:500], file_id, DERIVATIVE_PENDING))
+            except Exception:
+                pass
+
+    def get_derivative_info(self, file_info: Dict[str, Any], variant: str) -> Optional[Dict[str, Any]]:
+        """
+        Informações de uma variante já gerada (miniatura, pré-visualização),
+        no formato de get_file_info
+
+        Sem a variante pronta (pendente, com falha ou arquivo que não é
+        imagem), retorna None e quem chama usa o original. Imagens ainda sem
+        registro das variantes (enviadas antes da geração existir, ou por
+        sessão de upload ou URL SAS) e variantes pendentes há mais de
+        DERIVATIVE_RETRY_MINUTES minutos (inclusive após uma tentativa com
+        falha) são enfileiradas para geração.
+
+        Args:
+            file_info: Informações do arquivo original (get_file_info)
+            variant: Nome da variante (chave de DERIVATIVE_VARIANTS)
+
+        Raises:
+            ValueError: Se a variante não existir
+        """
+        if variant not in DERIVATIVE_VARIANTS:
+            raise ValueError(f"Variante inválida; use uma de: {', '.join(DERIVATIVE_VARIANTS)}")
+        if not self._is_derivative_source(file_info["tipo_conteudo"], file_info["tamanho_bytes"]):
+            return None
+
+        file_id = str(uuid.UUID(str(file_info["id"])))
+        cache_key = f"{file_id}:{variant}"
+        if self.metadata_cache:
+            found, derivative_info = self.metadata_cache.get(cache_key)
+            if found and derivative_info:
+                return derivative_info
+
+        derivative_info = None
+        schedule = False
+        with self._get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT Status, CaminhoBlob, TamanhoBytes, ETagBlob, DataConclusao,
+                       CASE WHEN DataCriacao < DATEADD(MINUTE, -?, GETDATE()) THEN 1 ELSE 0 END AS Expirada
+                FROM ArquivosDerivados
+                WHERE ArquivoId = ? AND Variante = ?
+            """, (DERIVATIVE_RETRY_MINUTES, file_id, variant))
+            row = cursor.fetchone()
+
+            if row is None and self.derivative_workers:
+                cursor.execute("""
+                    INSERT INTO ArquivosDerivados (ArquivoId, Variante)
+                    SELECT ?, v.value
+                    FROM OPENJSON(?) v
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM ArquivosDerivados d WITH (UPDLOCK, HOLDLOCK)
+                        WHERE d.ArquivoId = ? AND d.Variante = v.value
+                    )
+                """, (file_id, json.dumps(list(DERIVATIVE_VARIANTS)), file_id))
+                schedule = cursor.rowcount > 0
+            elif row is not None and row.Status == DERIVATIVE_PENDING and row.Expirada and self.derivative_workers:
+                # Só uma requisição (ou instância) reenfileira
+                cursor.execute("""
+                    UPDATE ArquivosDerivados SET DataCriacao = GETDATE()
+                    WHERE ArquivoId = ? AND Status = ?
+                      AND DataCriacao < DATEADD(MINUTE, -?, GETDATE())
+                """, (file_id, DERIVATIVE_PENDING, DERIVATIVE_RETRY_MINUTES))
+                schedule = cursor.rowcount > 0
+            elif row is not None and row.Status == DERIVATIVE_COMPLETED:
+                base_name = os.path.splitext(file_info["nome_original"] or "arquivo")[0]
+                derivative_info = {
+                    "id": file_id,
+                    "nome_original": f"{base_name}_{variant}.jpg",
+                    "caminho_blob": row.CaminhoBlob,
+                    "url": self.container_client.get_blob_client(row.CaminhoBlob).url,
+                    "tamanho_bytes": row.TamanhoBytes,
+                    "tamanho_armazenado_bytes": row.TamanhoBytes,
+                    "tipo_conteudo": DERIVATIVE_CONTENT_TYPE,
+                    "data_upload": row.DataConclusao.isoformat() if row.DataConclusao else None,
+                    "etag_blob": row.ETagBlob,
+                    "codificacao_conteudo": None,
+                    "variante": variant
+                }
+
+        if schedule:
+            self._schedule_derivatives(file_id)
+        if derivative_info and self.metadata_cache:
+            self.metadata_cache.set(cache_key, derivative_info)
+        return derivative_info
+
+    def reset_derivatives(self, derivatives: List[Tuple[str, str]]) -> Dict[str, Any]:
+        """
+        Remove os registros de variantes (ex.: blob da variante perdido);
+        elas voltam a ser geradas no próximo pedido
+
+        Args:
+            derivatives: Lista de (ID do arquivo, variante)
+
+        Returns:
+            Dicionário com a quantidade de registros removidos
+        """
+        try:
+            with self._get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    DELETE d
+                    FROM ArquivosDerivados d
+                    INNER JOIN OPENJSON(?) WITH (ArquivoId UNIQUEIDENTIFIER '$.a', Variante VARCHAR(20) '$.v') r
+                        ON d.ArquivoId = r.ArquivoId AND d.Variante = r.Variante
+                """, (json.dumps([{"a": file_id, "v": variant} for file_id, variant in derivatives]),))
+                removed = cursor.rowcount
+                conn.commit()
+
+            self._invalidate_files_info([
+                f"{str(uuid.UUID(str(file_id)))}:{variant}" for file_id, variant in derivatives
+            ])
+            return {
+                "sucesso": True,
+                "variantes_removidas": removed
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao remover variantes: {str(e)}"
+            }
+
+    @staticmethod
+    def _count_blob_references(cursor, blob_path: str, file_hash_hex: Optional[str]) -> int:
+        """
+        Conta os registros (ativos ou não) que apontam para um blob
+
+        Só uploads deduplicados compartilham blob, e eles sempre têm hash;
+        sem hash, o blob pertence a um único registro. A consulta bloqueia a
+        faixa do hash até o fim da transação (ver _find_duplicate).
+        """
+        if not file_hash_hex:
+            return 0
+        cursor.execute("""
+            SELECT COUNT(*)
+            FROM ArquivosStorage WITH (UPDLOCK, HOLDLOCK)
+            WHERE HashSha256 = ? AND HashSha256 IS NOT NULL AND CaminhoBlob = ?
+        """, (bytes.fromhex(file_hash_hex), blob_path))
+        return cursor.fetchone()[0]
+
+    def _delete_blob_if_exists(self, blob_path: str):
+        """Remove um blob do storage, ignorando se ele já não existir"""
+        try:
+            self.container_client.get_blob_client(blob_path).delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    def _discard_blobs(self, blob_paths: List[str]):
+        """
+        Remove blobs gravados por um upload que não ficaram referenciados
+        (duplicados ou registro não gravado); uma falha aqui não altera o
+        resultado do upload e o blob é removido depois pela reconciliação
+        """
+        for blob_path in blob_paths:
+            try:
+                self._delete_blob_if_exists(blob_path)
+            except Exception as e:
+                logger.warning("Erro ao remover o blob não referenciado %s: %s", blob_path, e)
+
+    def _delete_blobs(self, blob_paths: List[str]) -> List[str]:
+        """
+        Remove blobs em requisições Blob Batch de até BLOB_BATCH_DELETE_SIZE
+        blobs, ignorando os que já não existem
+
+        Returns:
+            Caminhos dos blobs que não puderam ser removidos
+        """
+        failed = []
+        for start in range(0, len(blob_paths), BLOB_BATCH_DELETE_SIZE):
+            batch = blob_paths[start:start + BLOB_BATCH_DELETE_SIZE]
+            try:
+                responses = self.container_client.delete_blobs(*batch, raise_on_any_failure=False)
+                for blob_path, response in zip(batch, responses):
+                    if response.status_code not in (202, 404):
+                        failed.append(blob_path)
+            except Exception as e:
+                logger.warning("Erro ao remover lote de blobs: %s", e)
+                failed.extend(batch)
+        return failed
+
+    @staticmethod
+    def _blobs_in_use(cursor, deleted_rows) -> set:
+        """
+        Caminhos, entre os blobs dos registros excluídos, que ainda são usados
+        por outros registros (uploads deduplicados; ver _count_blob_references)
+        """
+        candidates = [
+            {"h": row.HashSha256.hex(), "c": row.CaminhoBlob}
+            for row in deleted_rows
+            if row.HashSha256
+        ]
+        if not candidates:
+            return set()
+        cursor.execute("""
+            SELECT DISTINCT a.CaminhoBlob
+            FROM OPENJSON(?) WITH (Hash CHAR(64) '$.h', Caminho NVARCHAR(1000) '$.c') r
+            INNER JOIN ArquivosStorage a WITH (UPDLOCK, HOLDLOCK)
+                ON a.HashSha256 = CONVERT(BINARY(32), r.Hash, 2)
+               AND a.CaminhoBlob = r.Caminho
+        """, (json.dumps(candidates),))
+        return {row.CaminhoBlob for row in cursor.fetchall()}
+
+    def delete_file(self, file_id: str, permanent: bool = False) -> Dict[str, Any]:
+        """
+        Deleta um arquivo (soft delete por padrão)
+
+        Args:
+            file_id: ID do arquivo
+            permanent: Se True, deleta permanentemente do storage também
+
+        Returns:
+            Dicionário com resultado da operação
+        """
+        try:
+            # Obter informações do arquivo
+            file_info = self.get_file_info(file_id)
+            if not file_info:
+                return {
+                    "sucesso": False,
+                    "mensagem": "Arquivo não encontrado"
+                }
+            # Mesma grafia das chaves do cache de metadados
+            file_id = str(uuid.UUID(str(file_id)))
+
+            if permanent:
+                # Deletar do banco de dados e contar os registros que ainda
+                # apontam para o mesmo blob (uploads deduplicados)
+                with self._get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        DELETE FROM ArquivosStorage
+                        OUTPUT deleted.Ativo, deleted.Pasta, deleted.TamanhoBytes
+                        WHERE Id = ?
+                    """, (file_id,))
+                    deleted = cursor.fetchone()
+                    if deleted and deleted.Ativo:
+                        self._update_counters(cursor, [
+                            (deleted.Pasta, -1, -deleted.TamanhoBytes)
+                        ])
+                    remaining_refs = self._count_blob_references(
+                        cursor, file_info["caminho_blob"], file_info["hash_sha256"]
+                    )
+                    conn.commit()
+                self._invalidate_file_info(file_id)
+
+                # Variantes (miniaturas) são do registro, não do blob: saem
+                # sempre; os registros delas saíram em cascata
+                if deleted and self._is_derivative_source(file_info["tipo_conteudo"]):
+                    self._delete_blobs(list(self._derivative_blob_paths(
+                        self._folder_of(file_info["caminho_blob"]), file_id
+                    ).values()))
+
+                # Deletar do blob storage apenas se nenhum registro usa o blob
+                if remaining_refs == 0:
+                    self._delete_blob_if_exists(file_info["caminho_blob"])
+
+                return {
+                    "sucesso": True,
+                    "mensagem": "Arquivo deletado permanentemente",
+                    "blob_removido": remaining_refs == 0
+                }
+            else:
+                # Soft delete - apenas marca como inativo
+                with self._get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        UPDATE ArquivosStorage SET Ativo = 0, DataExclusao = GETDATE()
+                        OUTPUT deleted.Pasta, deleted.TamanhoBytes
+                        WHERE Id = ? AND Ativo = 1
+                    """, (file_id,))
+                    deleted = cursor.fetchone()
+                    if deleted:
+                        self._update_counters(cursor, [
+                            (deleted.Pasta, -1, -deleted.TamanhoBytes)
+                        ])
+                    conn.commit()
+                self._invalidate_file_info(file_id)
+
+                return {
+                    "sucesso": True,
+                    "mensagem": "Arquivo marcado como inativo"
+                }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao deletar arquivo: {str(e)}"
+            }
+
+    def delete_files(
+        self,
+        file_ids: Optional[List[str]] = None,
+        folder: Optional[str] = None,
+        include_subfolders: bool = False,
+        permanent: bool = False,
+        chunk_size: int = DEFAULT_BULK_DELETE_CHUNK_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Deleta vários arquivos por IDs e/ou pasta (soft delete por padrão)
+
+        Cada parte de até chunk_size registros é um único UPDATE/DELETE com os
+        IDs em JSON (OPENJSON), em uma transação curta. Na exclusão permanente,
+        os blobs que nenhum outro registro usa são removidos em requisições
+        Blob Batch depois do commit de cada parte.
+
+        Args:
+            file_ids: IDs dos arquivos (com folder, apenas os que estão na pasta)
+            folder: Pasta cujos arquivos serão deletados
+            include_subfolders: Com folder, incluir os arquivos das subpastas
+            permanent: Se True, deleta permanentemente do storage também
+                (inclusive registros já marcados como inativos)
+            chunk_size: Registros alterados por instrução
+
+        Returns:
+            Dicionário com a quantidade de arquivos deletados e, na exclusão
+            permanente, de blobs removidos e os que falharam
+        """
+        try:
+            folder = self._normalize_folder(folder)
+            if not file_ids and not folder:
+                raise ValueError("Informe os IDs dos arquivos ou a pasta")
+
+            conditions = []
+            params: List[Any] = []
+            if file_ids:
+                try:
+                    ids = [str(uuid.UUID(str(file_id))) for file_id in file_ids]
+                except ValueError:
+                    raise ValueError("IDs de arquivo inválidos")
+                conditions.append("Id IN (SELECT CAST(value AS UNIQUEIDENTIFIER) FROM OPENJSON(?))")
+                params.append(json.dumps(ids))
+            if folder:
+                condition, folder_params = self._folder_condition(folder, include_subfolders)
+                conditions.append(condition)
+                params.extend(folder_params)
+            where = " AND ".join(conditions)
+
+            deleted_files = 0
+            removed_blobs = 0
+            failed_blobs: List[str] = []
+            while True:
+                with self._get_db_connection() as conn:
+                    cursor = conn.cursor()
+                    if permanent:
+                        cursor.execute(f"""
+                            DELETE TOP (?) FROM ArquivosStorage
+                            OUTPUT deleted.Id, deleted.Ativo, deleted.Pasta, deleted.TamanhoBytes,
+                                   deleted.CaminhoBlob, deleted.HashSha256, deleted.TipoConteudo
+                            WHERE {where}
+                        """, [chunk_size] + params)
+                    else:
+                        cursor.execute(f"""
+                            UPDATE TOP (?) ArquivosStorage SET Ativo = 0, DataExclusao = GETDATE()
+                            OUTPUT deleted.Id, deleted.Ativo, deleted.Pasta, deleted.TamanhoBytes
+                            WHERE Ativo = 1 AND {where}
+                        """, [chunk_size] + params)
+                    rows = cursor.fetchall()
+
+                    self._update_counters(cursor, [
+                        (row.Pasta, -1, -row.TamanhoBytes)
+                        for row in rows
+                        if row.Ativo
+                    ])
+                    blob_paths = []
+                    if permanent and rows:
+                        in_use = self._blobs_in_use(cursor, rows)
+                        blob_paths = sorted({row.CaminhoBlob for row in rows} - in_use)
+                    conn.commit()
+
+                self._invalidate_files_info([str(uuid.UUID(str(row.Id))) for row in rows])
+                deleted_files += len(rows)
+
+                if blob_paths:
+                    failed = self._delete_blobs(blob_paths)
+                    failed_blobs.extend(failed)
+                    removed_blobs += len(blob_paths) - len(failed)
+
+                # Variantes (miniaturas) dos registros excluídos; não entram
+                # na contagem de blobs removidos
+                derivative_paths = [
+                    path
+                    for row in (rows if permanent else [])
+                    if self._is_derivative_source(row.TipoConteudo)
+                    for path in self._derivative_blob_paths(self._folder_of(row.CaminhoBlob), str(row.Id)).values()
+                ]
+                if derivative_paths:
+                    failed_blobs.extend(self._delete_blobs(derivative_paths))
+
+                if len(rows) < chunk_size:
+                    break
+
+            result = {
+                "sucesso": True,
+                "mensagem": (
+                    f"{deleted_files} arquivo(s) deletado(s) permanentemente" if permanent
+                    else f"{deleted_files} arquivo(s) marcado(s) como inativo(s)"
+                ),
+                "arquivos_deletados": deleted_files
+            }
+            if permanent:
+                result["blobs_removidos"] = removed_blobs
+                result["blobs_com_falha"] = failed_blobs
+            return result
+
+        except ValueError as e:
+            return {
+                "sucesso": False,
+                "mensagem": str(e)
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao deletar arquivos: {str(e)}"
+            }
+
+    def find_inactive_files(
+        self,
+        retention_days: int,
+        limit: int,
+        after: Optional[Tuple[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Lista os arquivos marcados como inativos há mais de retention_days
+        dias, na ordem (DataExclusao, Id) do índice dos inativos
+
+        Args:
+            retention_days: Dias desde o soft delete
+            limit: Número máximo de registros
+            after: Posição (DataExclusao em ISO 8601, Id) do último registro
+                já processado; a lista continua a partir dela
+
+        Returns:
+            Dicionário com os arquivos ("id" e "data_exclusao", texto com a
+            precisão completa do DATETIME2)
+        """
+        try:
+            query = """
+                SELECT TOP (?) Id, CONVERT(VARCHAR(27), DataExclusao, 126) AS DataExclusaoCursor
+                FROM ArquivosStorage
+                WHERE Ativo = 0 AND DataExclusao < DATEADD(DAY, -?, GETDATE())
+            """
+            params: List[Any] = [limit, retention_days]
+            if after:
+                query += """
+                    AND (DataExclusao > CONVERT(DATETIME2, ?, 126)
+                         OR (DataExclusao = CONVERT(DATETIME2, ?, 126) AND Id > ?))
+                """
+                params.extend([after[0], after[0], after[1]])
+            query += " ORDER BY DataExclusao, Id"
+
+            with self._get_db_connection() as conn:
+                cursor = conn.cursor()
+                cursor.execute(query, params)
+                rows = cursor.fetchall()
+
+            return {
+                "sucesso": True,
+                "arquivos": [
+                    {"id": str(row.Id), "data_exclusao": row.DataExclusaoCursor}
+                    for row in rows
+                ]
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao listar arquivos inativos: {str(e)}"
+            }
+
+    def list_blob_partitions(self, depth: int = 1) -> List[Tuple[str, bool]]:
+        """
+        Divide o container em partições de pastas que, juntas, cobrem todos
+        os blobs uma única vez (varredura em paralelo da reconciliação)
+
+        Args:
+            depth: Níveis de subpastas separados em partições próprias; 0
+                retorna o container inteiro como uma partição
+
+        Returns:
+            Lista de (pasta, recursiva): recursiva inclui as subpastas; as não
+            recursivas têm apenas os blobs diretamente na pasta
+        """
+        def partitions(folder: str, level: int) -> List[Tuple[str, bool]]:
+            if level == 0:
+                return [(folder, True)]
+            result = [(folder, False)]
+            prefix = folder + "/" if folder else ""
+            for item in self.container_client.walk_blobs(name_starts_with=prefix, delimiter="/"):
+                if isinstance(item, BlobPrefix):
+                    result.extend(partitions(item.name.rstrip("/"), level - 1))
+            return result
+
+        return partitions("", depth)
+
+    def iter_blobs(self, folder: str, recursive: bool):
+        """
+        Percorre os blobs de uma partição (ver list_blob_partitions) em ordem
+        de nome, uma página da listagem do Azure por vez
+        """
+        prefix = folder + "/" if folder else ""
+        if recursive:
+            yield from self.container_client.list_blobs(name_starts_with=prefix)
+        else:
+            for item in self.container_client.walk_blobs(name_starts_with=prefix, delimiter="/"):
+                if not isinstance(item, BlobPrefix):
+                    yield item
+
+    def iter_file_records(
+        self,
+        folder: str,
+        recursive: bool,
+        min_age_minutes: int,
+        fetch_size: int = 5000
+    ):
+        """
+        Percorre os registros (ativos ou não) de uma partição em ordem binária
+        de CaminhoBlob, a mesma da listagem de blobs do Azure
+
+        A ordem binária não corresponde à de nenhum índice (a coluna usa a
+        collation do banco), então cada partição é uma única consulta
+        ordenada, lida em partes de fetch_size registros.
+
+        As variantes já geradas (miniaturas, na mesma pasta do original)
+        entram no mesmo fluxo, com Derivado = 1 e o nome da Variante.
+
+        Yields:
+            Registros com CaminhoBlob, Id, Ativo, Derivado, Variante e Antigo
+            (1 se o upload, ou a geração da variante, tem mais de
+            min_age_minutes minutos)
+        """
+        folder_filter = ""
+        folder_params: List[Any] = []
+        if folder or not recursive:
+            condition, folder_params = self._folder_condition(folder, recursive)
+            folder_filter = " AND " + condition
+        query = f"""
+            SELECT CaminhoBlob, Id, Ativo, Derivado, Variante, Antigo
+            FROM (
+                SELECT CaminhoBlob, Id, Ativo, 0 AS Derivado, NULL AS Variante,
+                       CASE WHEN DataUpload < DATEADD(MINUTE, -?, GETDATE()) THEN 1 ELSE 0 END AS Antigo
+                FROM ArquivosStorage
+                WHERE Container = ?{folder_filter}
+                UNION ALL
+                SELECT d.CaminhoBlob, d.ArquivoId, a.Ativo, 1, d.Variante,
+                       CASE WHEN d.DataConclusao < DATEADD(MINUTE, -?, GETDATE()) THEN 1 ELSE 0 END
+                FROM ArquivosDerivados d
+                INNER JOIN ArquivosStorage a ON a.Id = d.ArquivoId
+                WHERE d.Status = ? AND a.Container = ?{folder_filter}
+            ) r
+            ORDER BY CaminhoBlob COLLATE Latin1_General_BIN2
+        """
+        params: List[Any] = (
+            [min_age_minutes, self.container_name] + folder_params
+            + [min_age_minutes, DERIVATIVE_COMPLETED, self.container_name] + folder_params
+        )
+
+        prefix = folder + "/" if folder else ""
+        with self._get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(fetch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    # Pasta é comparada pela collation do banco (sem
+                    # diferenciar maiúsculas); os blobs, exatamente
+                    if recursive:
+                        if not row.CaminhoBlob.startswith(prefix):
+                            continue
+                    elif self._folder_of(row.CaminhoBlob) != folder:
+                        continue
+                    yield row
+
+    def _unreferenced_blob_paths(self, cursor, blob_paths: List[str], lock: bool = False) -> List[str]:
+        """
+        Filtra os blobs sem registro em ArquivosStorage (nem em
+        ArquivosDerivados, para as miniaturas) e sem sessão de upload
+        pendente (ou ainda confirmável) que os reserve
+        """
+        candidates = [{"c": path, "p": self._record_folder_of(path)} for path in blob_paths]
+        hints = "WITH (UPDLOCK, HOLDLOCK)" if lock else ""
+        cursor.execute(f"""
+            SELECT r.Caminho
+            FROM OPENJSON(?) WITH (Caminho NVARCHAR(1000) '$.c', Pasta NVARCHAR(400) '$.p') r
+            WHERE NOT EXISTS (
+                SELECT 1 FROM ArquivosStorage a {hints}
+                WHERE a.Pasta = r.Pasta AND a.CaminhoBlob = r.Caminho AND a.Container = ?
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM ArquivosDerivados d {hints}
+                WHERE d.CaminhoBlob = r.Caminho
+            )
+            AND NOT EXISTS (
+                SELECT 1 FROM ArquivosUploadSessoes s
+                WHERE s.CaminhoBlob = r.Caminho AND s.Status = ?
+                  AND s.DataExpiracao > DATEADD(MINUTE, -?, GETDATE())
+            )
+        """, (
+            json.dumps(candidates),
+            self.container_name,
+            UPLOAD_SESSION_PENDING,
+            DIRECT_UPLOAD_CONFIRM_GRACE_MINUTES
+        ))
+        return [row.Caminho for row in cursor.fetchall()]
+
+    def find_orphan_blobs(self, blob_paths: List[str]) -> Dict[str, Any]:
+        """
+        Confirma, entre os blobs informados, os que são órfãos: nenhum
+        registro aponta para eles e nenhuma sessão de upload os reserva
+
+        Returns:
+            Dicionário com os caminhos dos blobs órfãos
+        """
+        try:
+            with self._get_db_connection() as conn:
+                orphans = self._unreferenced_blob_paths(conn.cursor(), blob_paths)
+            return {
+                "sucesso": True,
+                "blobs_orfaos": orphans
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao verificar blobs órfãos: {str(e)}"
+            }
+
+    def delete_orphan_blobs(self, blob_paths: List[str]) -> Dict[str, Any]:
+        """
+        Remove os blobs informados que continuam órfãos (conferidos de novo,
+        com bloqueio, no momento da remoção)
+
+        Returns:
+            Dicionário com a quantidade de blobs removidos, os ignorados (não
+            eram mais órfãos) e os que falharam
+        """
+        try:
+            with self._get_db_connection() as conn:
+                orphans = self._unreferenced_blob_paths(conn.cursor(), blob_paths, lock=True)
+                conn.commit()
+
+            failed = self._delete_blobs(orphans)
+            return {
+                "sucesso": True,
+                "blobs_removidos": len(orphans) - len(failed),
+                "blobs_ignorados": len(blob_paths) - len(orphans),
+                "blobs_com_falha": failed
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao remover blobs órfãos: {str(e)}"
+            }
+
+    @staticmethod
+    def _encode_list_cursor(data_upload: str, file_id: str) -> str:
+        """Gera o cursor opaco da próxima página a partir do último registro"""
+        raw = json.dumps([data_upload, str(file_id)]).encode("utf-8")
+        return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+    @staticmethod
+    def _decode_list_cursor(cursor: str) -> Tuple[str, str]:
+        """Lê um cursor gerado por _encode_list_cursor (ValueError se inválido)"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+            data_upload, file_id = json.loads(raw)
+            if not _CURSOR_DATETIME.match(data_upload):
+                raise ValueError(data_upload)
+            return data_upload, str(uuid.UUID(file_id))
+        except (TypeError, ValueError, binascii.Error):
+            raise ValueError("Cursor de paginação inválido")
+
+    def _fetch_keyset_page(
+        self,
+        db_cursor,
+        query: str,
+        params: List[Any],
+        limit: int,
+        after: Optional[Tuple[str, str]]
+    ) -> Tuple[List[Any], Optional[str]]:
+        """
+        Executa uma consulta de arquivos (SELECT _LIST_COLUMNS ... WHERE ...)
+        paginada por cursor, do mais recente para o mais antigo
+
+        Returns:
+            Tupla (linhas da página, cursor da próxima página ou None)
+        """
+        if after:
+            query += """
+                AND (DataUpload < CONVERT(DATETIME2, ?, 126)
+                     OR (DataUpload = CONVERT(DATETIME2, ?, 126) AND Id < ?))
+            """
+            params = params + [after[0], after[0], after[1]]
+        # Um registro a mais indica se existe próxima página
+        query += " ORDER BY DataUpload DESC, Id DESC OFFSET 0 ROWS FETCH NEXT ? ROWS ONLY"
+        db_cursor.execute(query, params + [limit + 1])
+        rows = db_cursor.fetchall()
+
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, self._encode_list_cursor(rows[-1].DataUploadCursor, rows[-1].Id)
+        return rows, None
+
+    def _build_list_query(
+        self,
+        folder: str,
+        include_subfolders: bool,
+        tag_filters: List[Tuple[str, str]],
+        include_blob_url: bool = False
+    ) -> Tuple[str, List[Any]]:
+        """
+        Monta o SELECT das listagens de arquivos ativos com os filtros de
+        pasta e de tag; termina na cláusula WHERE, para que quem chama
+        acrescente outras condições com AND
+
+        Args:
+            include_blob_url: Incluir CaminhoBlob e UrlBlob (URLs SAS nas
+                listagens; fora dos índices das listagens)
+
+        Returns:
+            Tupla (consulta, parâmetros)
+        """
+        columns = _LIST_COLUMNS + (", CaminhoBlob, UrlBlob" if include_blob_url else "")
+        query = f"SELECT {columns} FROM ArquivosStorage"
+        params: List[Any] = []
+
+        # Uma junção com o índice de ArquivosTags por filtro de tag
+        for index, (key, value) in enumerate(tag_filters):
+            query += f"""
+                INNER JOIN ArquivosTags t{index}
+                    ON t{index}.ArquivoId = ArquivosStorage.Id
+                   AND t{index}.Chave = ? AND t{index}.Valor = ?
+            """
+            params.extend([key, value])
+
+        query += " WHERE Ativo = 1"
+
+        if folder:
+            condition, folder_params = self._folder_condition(folder, include_subfolders)
+            query += " AND " + condition
+            params.extend(folder_params)
+
+        return query, params
+
+    @staticmethod
+    def _file_summary(row) -> Dict[str, Any]:
+        """Resumo de um arquivo nas listagens"""
+        return {
+            "id": row.Id,
+            "nome_original": row.NomeOriginal,
+            "tamanho_bytes": row.TamanhoBytes,
+            "tipo_conteudo": row.TipoConteudo,
+            "data_upload": row.DataUpload.isoformat() if row.DataUpload else None,
+            "upload_por": row.UploadPor
+        }
+
+    def list_files(
+        self,
+        limit: int = 100,
+        offset: int = 0,
+        folder: Optional[str] = None,
+        cursor: Optional[str] = None,
+        include_subfolders: bool = True,
+        tags: Optional[List[str]] = None,
+        include_urls: bool = False,
+        url_expiry_hours: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Lista arquivos do banco de dados, do mais recente para o mais antigo
+
+        Há dois modos de paginação:
+        - offset: pula os primeiros registros (o custo cresce com o offset)
+        - cursor: continua a partir do último registro da página anterior
+          (custo constante). Passe cursor="" na primeira página e depois o
+          "proximo_cursor" retornado, até ele vir como None.
+
+        Args:
+            limit: Número máximo de registros
+            offset: Offset para paginação (ignorado no modo cursor)
+            folder: Filtrar por pasta específica
+            cursor: Cursor de continuação (ativa o modo cursor)
+            include_subfolders: Com folder, incluir os arquivos das subpastas
+                (padrão, como o filtro por prefixo do caminho das versões
+                anteriores); False lista apenas os arquivos da própria pasta
+            tags: Filtros "chave:valor"; com mais de um, o arquivo precisa ter
+                todas as tags
+            include_urls: Incluir em cada arquivo a URL temporária (SAS) de
+                download ("url_download"; ver generate_download_url)
+            url_expiry_hours: Tempo mínimo de validade das URLs em horas
+
+        Returns:
+            Lista de arquivos
+        """
+        try:
+            keyset = cursor is not None
+            after = self._decode_list_cursor(cursor) if cursor else None
+            folder = self._normalize_folder(folder)
+            tag_filters = self._parse_tag_filters(tags)
+
+            with self._get_db_connection() as conn:
+                db_cursor = conn.cursor()
+
+                query, params = self._build_list_query(
+                    folder, include_subfolders, tag_filters, include_blob_url=include_urls
+                )
+
+                next_cursor = None
+                if keyset:
+                    rows, next_cursor = self._fetch_keyset_page(db_cursor, query, params, limit, after)
+                else:
+                    query += " ORDER BY DataUpload DESC OFFSET ? ROWS FETCH NEXT ? ROWS ONLY"
+                    params.extend([offset, limit])
+                    db_cursor.execute(query, params)
+                    rows = db_cursor.fetchall()
+
+                files = [self._file_summary(row) for row in rows]
+                if include_urls:
+                    expiry = self._sas_expiry(url_expiry_hours)
+                    for file_summary, row in zip(files, rows):
+                        file_summary["url_download"] = self._download_sas_url(
+                            row.CaminhoBlob, row.UrlBlob, expiry
+                        )
+
+                # Total da pasta ou geral, pelos contadores (não há
+                # contadores por tag: com filtro de tag o total fica nulo)
+                total_files = total_bytes = None
+                if not tag_filters:
+                    counters = self._read_counters(db_cursor, folder)
+                    scope = COUNTER_SCOPE_FOLDER if folder and not include_subfolders else COUNTER_SCOPE_TREE
+                    total_files, total_bytes = counters.get(scope, (0, 0))
+
+                result = {
+                    "sucesso": True,
+                    "arquivos": files,
+                    "quantidade": len(files),
+                    "total": total_files,
+                    "total_bytes": total_bytes
+                }
+                if keyset:
+                    result["proximo_cursor"] = next_cursor
+                if include_urls:
+                    result["urls_expiram_em"] = expiry.isoformat()
+                return result
+
+        except ValueError as e:
+            return {
+                "sucesso": False,
+                "mensagem": str(e)
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao listar arquivos: {str(e)}"
+            }
+
+    @staticmethod
+    def _parse_search_date(value: Union[str, datetime, None], end: bool = False) -> Optional[datetime]:
+        """
+        Converte um limite de data da busca (datetime ou texto ISO 8601)
+
+        Com end=True, uma data sem horário ("2025-01-31") inclui o dia inteiro:
+        retorna o início do dia seguinte, usado como limite exclusivo.
+
+        Raises:
+            ValueError: Se o texto não for uma data ISO 8601
+        """
+        if not value:
+            return None
+        if isinstance(value, datetime):
+            return value
+        try:
+            parsed = datetime.fromisoformat(value)
+        except ValueError:
+            raise ValueError(f"Data inválida (use o formato ISO 8601): {value}")
+        if end and "T" not in value and " " not in value:
+            parsed += timedelta(days=1)
+        return parsed
+
+    def search_files(
+        self,
+        name: Optional[str] = None,
+        upload_user: Optional[str] = None,
+        content_type: Optional[str] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        date_from: Union[str, datetime, None] = None,
+        date_to: Union[str, datetime, None] = None,
+        folder: Optional[str] = None,
+        include_subfolders: bool = True,
+        tags: Optional[List[str]] = None,
+        limit: int = 100,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Busca arquivos ativos combinando critérios sobre os metadados, do
+        mais recente para o mais antigo, com paginação por cursor
+
+        A parte do nome é resolvida pelos trigramas de ArquivosNomeTrigramas:
+        só os arquivos que têm todos os trigramas do termo são conferidos com
+        LIKE '%termo%'. Os demais filtros usam os índices de ArquivosStorage.
+
+        Args:
+            name: Parte do nome original (mínimo NAME_TRIGRAM_LENGTH
+                caracteres; sem diferenciar maiúsculas)
+            upload_user: Usuário que fez o upload (exato)
+            content_type: Tipo MIME exato, ou "tipo/*" para todos os subtipos
+            min_size: Tamanho mínimo em bytes
+            max_size: Tamanho máximo em bytes
+            date_from: Data de upload inicial (inclusiva)
+            date_to: Data de upload final (uma data sem horário inclui o dia)
+            folder: Filtrar por pasta
+            include_subfolders: Com folder, incluir os arquivos das subpastas
+                (padrão, como em list_files)
+            tags: Filtros "chave:valor" (o arquivo precisa ter todas as tags)
+            limit: Número máximo de registros
+            cursor: "proximo_cursor" da página anterior (None na primeira)
+
+        Returns:
+            Lista de arquivos e o cursor da próxima página
+        """
+        try:
+            after = self._decode_list_cursor(cursor) if cursor else None
+            folder = self._normalize_folder(folder)
+            tag_filters = self._parse_tag_filters(tags)
+            date_from = self._parse_search_date(date_from)
+            date_to = self._parse_search_date(date_to, end=True)
+
+            query, params = self._build_list_query(folder, include_subfolders, tag_filters)
+
+            if name:
+                trigrams = sorted(self._name_trigrams(name))
+                if not trigrams:
+                    raise ValueError(
+                        f"O termo de busca do nome precisa ter ao menos {NAME_TRIGRAM_LENGTH} caracteres"
+                    )
+                query += f"""
+                    AND Id IN (
+                        SELECT ArquivoId FROM ArquivosNomeTrigramas
+                        WHERE Trigrama IN ({", ".join("?" * len(trigrams))})
+                        GROUP BY ArquivoId
+                        HAVING COUNT(*) = ?
+                    )
+                    AND NomeOriginal LIKE ? ESCAPE '\\'
+                """
+                params.extend(trigrams)
+                params.append(len(trigrams))
+                params.append("%" + self._escape_like(name) + "%")
+
+            if upload_user:
+                query += " AND UploadPor = ?"
+                params.append(upload_user)
+
+            if content_type and content_type.endswith("/*"):
+                query += " AND TipoConteudo LIKE ? ESCAPE '\\'"
+                params.append(self._escape_like(content_type[:-1]) + "%")
+            elif content_type:
+                query += " AND TipoConteudo = ?"
+                params.append(content_type)
+
+            if min_size is not None:
+                query += " AND TamanhoBytes >= ?"
+                params.append(min_size)
+            if max_size is not None:
+                query += " AND TamanhoBytes <= ?"
+                params.append(max_size)
+
+            if date_from:
+                query += " AND DataUpload >= ?"
+                params.append(date_from)
+            if date_to:
+                query += " AND DataUpload < ?"
+                params.append(date_to)
+
+            with self._get_db_connection() as conn:
+                rows, next_cursor = self._fetch_keyset_page(
+                    conn.cursor(), query, params, limit, after
+                )
+
+            files = [self._file_summary(row) for row in rows]
+            return {
+                "sucesso": True,
+                "arquivos": files,
+                "quantidade": len(files),
+                "proximo_cursor": next_cursor
+            }
+
+        except ValueError as e:
+            return {
+                "sucesso": False,
+                "mensagem": str(e)
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao buscar arquivos: {str(e)}"
+            }
+
+    def get_statistics(self, folder: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Retorna a quantidade de arquivos ativos e o total de bytes, gerais ou
+        de uma pasta, a partir dos contadores mantidos a cada upload/exclusão
+
+        Args:
+            folder: Pasta (opcional; sem pasta, retorna os totais gerais)
+
+        Returns:
+            Dicionário com os totais da pasta com subpastas e apenas da pasta
+        """
+        try:
+            folder = self._normalize_folder(folder)
+            with self._get_db_connection() as conn:
+                counters = self._read_counters(conn.cursor(), folder)
+
+            tree_files, tree_bytes = counters.get(COUNTER_SCOPE_TREE, (0, 0))
+            folder_files, folder_bytes = counters.get(COUNTER_SCOPE_FOLDER, (0, 0))
+            return {
+                "sucesso": True,
+                "pasta": folder or None,
+                "total_arquivos": tree_files,
+                "total_bytes": tree_bytes,
+                "arquivos_na_pasta": folder_files,
+                "bytes_na_pasta": folder_bytes
+            }
+
+        except Exception as e:
+            return {
+                "sucesso": False,
+                "mensagem": f"Erro ao obter estatísticas: {str(e)}"
             }
@@ -0,0 +1,268 @@
+"""
+Cache em disco local para blobs baixados com frequência
+
+Os arquivos ficam em um diretório local, identificados pelo caminho do blob
+e pelo ETag: quando o blob muda, o ETag muda e a entrada antiga deixa de ser
+encontrada (e acaba removida pela política LRU).
+
+O diretório pode ser compartilhado pelos workers de um servidor: o
+orçamento em bytes vale para o diretório inteiro, e a remoção das entradas
+menos usadas (pela data de modificação, atualizada a cada acerto) é feita
+com um lock entre processos (fcntl.flock; em sistemas sem fcntl, o lock vale
+apenas dentro do processo).
+"""
+
+import os
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# Orçamento padrão do cache (1 GB)
+DEFAULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+
+# Arquivos temporários mais antigos que isso são de gravações interrompidas
+# (as em andamento, de qualquer worker, são mais recentes)
+STALE_TEMP_SECONDS = 3600
+
+_ENTRY_SUFFIX = ".blob"
+_TEMP_SUFFIX = ".tmp"
+_LOCK_FILE = ".lock"
+
+
+class _CacheEntryWriter:
+    """
+    Grava uma entrada do cache em um arquivo temporário, que só passa a ser
+    visível (os.replace atômico) quando o conteúdo completo foi recebido
+    """
+
+    def __init__(self, cache: "BlobDiskCache", key: str, expected_size: int):
+        self._cache = cache
+        self._key = key
+        self._expected_size = expected_size
+        self._size = 0
+        self._failed = False
+        self._temp_path = os.path.join(cache.directory, f"{uuid.uuid4().hex}{_TEMP_SUFFIX}")
+        self._file = open(self._temp_path, "wb")
+
+    def write(self, data: bytes):
+        # Uma falha no disco não pode interromper o download em andamento
+        if self._failed:
+            return
+        try:
+            self._file.write(data)
+            self._size += len(data)
+        except OSError:
+            self._failed = True
+
+    def commit(self):
+        """Publica a entrada; descarta se o tamanho não conferir"""
+        try:
+            self._file.close()
+            if self._failed or self._size != self._expected_size:
+                self.discard()
+                return
+            self._cache._publish(self._key, self._temp_path, self._size)
+        except OSError:
+            self.discard()
+
+    def discard(self):
+        """Descarta a gravação (ex.: cliente desconectou no meio do download)"""
+        if not self._file.closed:
+            self._file.close()
+        try:
+            os.remove(self._temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class BlobDiskCache:
+    """
+    Cache LRU de blobs em disco, limitado por tamanho total
+
+    Thread-safe, e pode ser compartilhado por vários processos: o índice é o
+    próprio diretório, então uma entrada gravada por um worker é encontrada
+    pelos demais.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = DEFAULT_CACHE_MAX_BYTES,
+        max_entry_bytes: Optional[int] = None
+    ):
+        """
+        Args:
+            directory: Diretório local do cache (criado se não existir)
+            max_bytes: Tamanho máximo do cache em bytes (somando todos os
+                processos que usam o diretório)
+            max_entry_bytes: Tamanho máximo de um arquivo no cache (padrão:
+                1/8 do orçamento, para que um arquivo grande não esvazie o
+                cache inteiro)
+        """
+        if max_bytes <= 0:
+            raise ValueError("max_bytes deve ser maior que zero")
+
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes or max_bytes // 8
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        os.makedirs(directory, exist_ok=True)
+        self._lock_path = os.path.join(directory, _LOCK_FILE)
+        with self._locked():
+            self._remove_stale_temp_files()
+            self._evict()
+
+    @staticmethod
+    def _key(blob_path: str, etag: str) -> str:
+        etag = etag.strip('"')
+        return hashlib.sha256(f"{blob_path}\n{etag}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key + _ENTRY_SUFFIX)
+
+    @contextmanager
+    def _locked(self):
+        """Lock das threads do processo e, com fcntl, dos demais processos"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self._lock_path, "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _remove_stale_temp_files(self):
+        """Remove gravações interrompidas por um reinício (com o lock)"""
+        limit = time.time() - STALE_TEMP_SECONDS
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_TEMP_SUFFIX):
+                try:
+                    if entry.stat().st_mtime < limit:
+                        os.remove(entry.path)
+                except OSError:
+                    pass
+
+    def _scan(self) -> List[Tuple[float, str, int]]:
+        """Entradas do diretório: (data de modificação, caminho, tamanho)"""
+        found = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(_ENTRY_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                found.append((stat.st_mtime, entry.path, stat.st_size))
+        return found
+
+    def get(self, blob_path: str, etag: str, size: int) -> Optional[str]:
+        """
+        Procura um blob no cache
+
+        Args:
+            blob_path: Caminho do blob no container
+            etag: ETag atual do blob
+            size: Tamanho esperado do conteúdo em bytes
+
+        Returns:
+            Caminho do arquivo local, ou None se não estiver no cache
+        """
+        path = self._path(self._key(blob_path, etag))
+        try:
+            cached_size = os.path.getsize(path)
+        except OSError:
+            cached_size = None
+
+        with self._lock:
+            if cached_size == size:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if cached_size == size:
+            try:
+                # A data de modificação é a ordem LRU, entre processos e
+                # reinícios
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+        if cached_size is not None:
+            self._remove(path)
+        return None
+
+    def writer(self, blob_path: str, etag: str, size: int) -> Optional[_CacheEntryWriter]:
+        """
+        Abre a gravação de um blob no cache
+
+        Returns:
+            Gravador (write/commit/discard), ou None se o arquivo for grande
+            demais para o cache
+        """
+        if size > self.max_entry_bytes:
+            return None
+        try:
+            return _CacheEntryWriter(self, self._key(blob_path, etag), size)
+        except OSError:
+            return None
+
+    def _publish(self, key: str, temp_path: str, size: int):
+        with self._locked():
+            path = self._path(key)
+            os.replace(temp_path, path)
+            self._evict(keep=path)
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self, keep: Optional[str] = None):
+        """
+        Remove as entradas menos usadas até caber no orçamento (com o lock)
+
+        Percorre o diretório a cada gravação: o custo é pequeno perto do
+        download do blob que a precede.
+
+        Args:
+            keep: Entrada recém-gravada, removida por último
+        """
+        entries = self._scan()
+        total = sum(size for _, _, size in entries)
+        for _, path, size in sorted(entries, key=lambda entry: (entry[1] == keep, entry[0], entry[1])):
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Contadores do cache (arquivos e bytes de todo o diretório)"""
+        entries = self._scan()
+        with self._lock:
+            requests = self.hits + self.misses
+            return {
+                "arquivos": len(entries),
+                "bytes": sum(size for _, _, size in entries),
+                "max_bytes": self.max_bytes,
+                "acertos": self.hits,
+                "falhas": self.misses,
+                "remocoes": self.evictions,
+                "taxa_acerto": round(self.hits / requests, 4) if requests else None
+            }
@@ -0,0 +1,420 @@
+"""
+Leitura incremental de uploads JSON com arquivo em base64 (formato do Power Apps)
+
+Evita manter em memória, ao mesmo tempo, o corpo JSON, a string base64 e os
+bytes decodificados: o corpo é lido em partes e o campo do arquivo é
+decodificado direto para um destino binário.
+"""
+
+import re
+import json
+import base64
+import codecs
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+
+# Quantidade de bytes lidos do stream de origem por vez
+READ_SIZE = 64 * 1024
+
+# Tamanho máximo dos demais campos do JSON (nome, usuário, tags, ...)
+MAX_FIELD_SIZE = 1024 * 1024
+
+# Tamanho máximo do prefixo "data:<mime>;base64," aceito antes do conteúdo
+MAX_DATA_URI_PREFIX = 256
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_SPECIAL = re.compile(r'["\\]')
+_JSON_ESCAPES = {
+    '"': '"', '\\': '\\', '/': '/',
+    'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'
+}
+
+
+class Base64StreamDecoder:
+    """
+    Decodifica base64 em partes
+
+    Guarda entre as chamadas os caracteres que ainda não completam um grupo
+    de 4, ignora espaços/quebras de linha e remove o prefixo de data URI
+    (data:<mime>;base64,) gerado pelo Power Apps.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._prefix = ""
+        self._started = False
+
+    def decode(self, text: str) -> bytes:
+        """Decodifica o próximo trecho de texto base64"""
+        text = _WHITESPACE.sub("", text)
+
+        if not self._started:
+            text = self._prefix + text
+            if len(text) < 5 and "data:".startswith(text):
+                self._prefix = text
+                return b""
+            if text.startswith("data:"):
+                comma = text.find(",")
+                if comma < 0:
+                    if len(text) > MAX_DATA_URI_PREFIX:
+                        raise ValueError("Prefixo data URI inválido")
+                    self._prefix = text
+                    return b""
+                text = text[comma + 1:]
+            self._prefix = ""
+            self._started = True
+
+        data = self._pending + text
+        usable = len(data) - len(data) % 4
+        self._pending = data[usable:]
+        if not usable:
+            return b""
+        return base64.b64decode(data[:usable], validate=True)
+
+    def finish(self) -> bytes:
+        """Finaliza a decodificação, validando o que restou"""
+        remaining = self._prefix + self._pending
+        self._prefix = ""
+        self._pending = ""
+        self._started = True
+        if not remaining:
+            return b""
+        if len(remaining) % 4:
+            raise ValueError("Conteúdo base64 incompleto")
+        return base64.b64decode(remaining, validate=True)
+
+
+class Base64DecodingReader:
+    """
+    Stream binário de leitura que decodifica, sob demanda, o base64 lido de
+    outro stream (texto ou bytes)
+
+    Permite enviar ao storage um arquivo em base64 sem decodificá-lo inteiro.
+    """
+
+    def __init__(self, source, read_size: int = READ_SIZE):
+        self._source = source
+        self._read_size = read_size
+        self._decoder = Base64StreamDecoder()
+        self._buffer = bytearray()
+        self._eof = False
+
+    def read(self, size: int = -1) -> bytes:
+        while (size < 0 or len(self._buffer) < size) and not self._eof:
+            text = self._source.read(self._read_size)
+            if not text:
+                self._buffer += self._decoder.finish()
+                self._eof = True
+            else:
+                if isinstance(text, bytes):
+                    text = text.decode("ascii")
+                self._buffer += self._decoder.decode(text)
+
+        if size < 0 or size >= len(self._buffer):
+            data = bytes(self._buffer)
+            self._buffer.clear()
+        else:
+            data = bytes(self._buffer[:size])
+            del self._buffer[:size]
+        return data
+
+
+class JsonUploadParser:
+    """
+    Lê um objeto JSON de upload a partir de um stream
+
+    Os campos comuns são retornados como dicionário; o campo do arquivo
+    (base64) é decodificado em partes direto para o destino informado,
+    qualquer que seja a posição dele no objeto. parse_list lê uploads em
+    lote: uma lista de objetos, cada um com o próprio arquivo.
+    """
+
+    def __init__(
+        self,
+        stream: BinaryIO,
+        file_field: str = "arquivo",
+        read_size: int = READ_SIZE,
+        max_field_size: int = MAX_FIELD_SIZE
+    ):
+        """
+        Args:
+            stream: Stream binário com o corpo JSON
+            file_field: Nome do campo que contém o arquivo em base64
+            read_size: Bytes lidos do stream por vez
+            max_field_size: Tamanho máximo dos demais campos
+        """
+        self._stream = stream
+        self._file_field = file_field
+        self._read_size = read_size
+        self._max_field_size = max_field_size
+        self._text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self._buf = ""
+        self._pos = 0
+        self._eof = False
+        self.file_found = False
+        self.file_size = 0
+
+    def parse(self, file_sink: BinaryIO) -> Dict[str, Any]:
+        """
+        Lê o objeto inteiro, escrevendo o arquivo decodificado em file_sink
+
+        Args:
+            file_sink: Destino binário (com write) dos bytes do arquivo
+
+        Returns:
+            Dicionário com os demais campos do JSON
+
+        Raises:
+            ValueError: Se o JSON ou o base64 forem inválidos
+        """
+        def read_file(key: str) -> bool:
+            if key != self._file_field or self._peek() != '"':
+                return False
+            if self.file_found:
+                raise ValueError(f"Campo '{key}' duplicado")
+            self._next()
+            self._decode_file(file_sink)
+            self.file_found = True
+            return True
+
+        fields = self._parse_object(read_file)
+        self._expect_end()
+        return fields
+
+    def parse_list(
+        self,
+        list_field: str,
+        new_sink: Callable[[], BinaryIO],
+        max_items: Optional[int] = None
+    ) -> Tuple[Dict[str, Any], List[Tuple[Dict[str, Any], Optional[BinaryIO]]]]:
+        """
+        Lê um upload em lote, ex.: {"arquivos": [{"arquivo": "...", ...}], ...}
+
+        O arquivo de cada item da lista é decodificado em partes para um
+        destino novo, obtido de new_sink() quando o campo é encontrado.
+
+        Args:
+            list_field: Nome do campo com a lista de itens
+            new_sink: Função que cria o destino binário de um arquivo
+            max_items: Quantidade máxima de itens na lista
+
+        Returns:
+            (demais campos do objeto, lista de (campos do item, destino do
+            arquivo ou None se o item não tiver arquivo))
+
+        Raises:
+            ValueError: Se o JSON ou o base64 forem inválidos, ou se a lista
+                exceder max_items
+        """
+        items: List[Tuple[Dict[str, Any], Optional[BinaryIO]]] = []
+        found = False
+
+        def read_item(sink_holder: List[BinaryIO]):
+            def read_file(key: str) -> bool:
+                if key != self._file_field or self._peek() != '"':
+                    return False
+                if sink_holder:
+                    raise ValueError(f"Campo '{key}' duplicado")
+                sink_holder.append(new_sink())
+                self._next()
+                self._decode_file(sink_holder[0])
+                return True
+            return read_file
+
+        def read_list(key: str) -> bool:
+            nonlocal found
+            if key != list_field or self._peek() != "[":
+                return False
+            if found:
+                raise ValueError(f"Campo '{key}' duplicado")
+            found = True
+            self._next()
+            self._skip_whitespace()
+            if self._peek() == "]":
+                self._next()
+                return True
+            while True:
+                if max_items is not None and len(items) >= max_items:
+                    raise ValueError(f"Máximo de {max_items} itens em '{key}'")
+                sink_holder: List[BinaryIO] = []
+                item_fields = self._parse_object(read_item(sink_holder))
+                items.append((item_fields, sink_holder[0] if sink_holder else None))
+                self._skip_whitespace()
+                separator = self._next()
+                if separator == "]":
+                    return True
+                if separator != ",":
+                    raise ValueError("JSON inválido: esperado ',' ou ']'")
+
+        fields = self._parse_object(read_list)
+        self._expect_end()
+        return fields, items
+
+    def _parse_object(self, read_special: Callable[[str], bool]) -> Dict[str, Any]:
+        """
+        Lê um objeto JSON; read_special(chave) lê os valores tratados à parte
+        (arquivos) e retorna False para os demais, lidos como JSON comum
+        """
+        fields: Dict[str, Any] = {}
+
+        self._expect("{")
+        self._skip_whitespace()
+        if self._peek() == "}":
+            self._next()
+            return fields
+
+        while True:
+            self._skip_whitespace()
+            key = json.loads(self._read_string_raw())
+            self._skip_whitespace()
+            self._expect(":")
+            self._skip_whitespace()
+
+            if not read_special(key):
+                fields[key] = json.loads(self._read_raw_value())
+
+            self._skip_whitespace()
+            separator = self._next()
+            if separator == "}":
+                return fields
+            if separator != ",":
+                raise ValueError("JSON inválido: esperado ',' ou '}'")
+
+    def _expect_end(self):
+        self._skip_whitespace()
+        if self._peek() is not None:
+            raise ValueError("JSON inválido: conteúdo após o objeto")
+
+    def _fill(self) -> bool:
+        """Lê mais dados do stream; retorna False no fim do stream"""
+        if self._eof:
+            return False
+        chunk = self._stream.read(self._read_size)
+        if not chunk:
+            self._eof = True
+            text = self._text_decoder.decode(b"", final=True)
+        else:
+            text = self._text_decoder.decode(chunk)
+        self._buf = self._buf[self._pos:] + text
+        self._pos = 0
+        return bool(text) or not self._eof
+
+    def _peek(self) -> Optional[str]:
+        while self._pos >= len(self._buf):
+            if not self._fill():
+                return None
+        return self._buf[self._pos]
+
+    def _next(self) -> str:
+        char = self._peek()
+        if char is None:
+            raise ValueError("JSON incompleto")
+        self._pos += 1
+        return char
+
+    def _expect(self, char: str):
+        self._skip_whitespace()
+        if self._next() != char:
+            raise ValueError(f"JSON inválido: esperado '{char}'")
+
+    def _skip_whitespace(self):
+        while True:
+            char = self._peek()
+            if char is None or char not in " \t\r\n":
+                return
+            self._pos += 1
+
+    def _check_size(self, size: int) -> None:
+        if size > self._max_field_size:
+            raise ValueError("Campo do JSON excede o tamanho máximo")
+
+    def _read_string_raw(self) -> str:
+        """Lê uma string JSON e retorna o texto bruto (com aspas e escapes)"""
+        if self._next() != '"':
+            raise ValueError("JSON inválido: esperada string")
+        parts = ['"']
+        size = 1
+        while True:
+            if self._pos >= len(self._buf) and self._peek() is None:
+                raise ValueError("JSON incompleto")
+            match = _STRING_SPECIAL.search(self._buf, self._pos)
+            end = match.start() if match else len(self._buf)
+            parts.append(self._buf[self._pos:end])
+            size += end - self._pos
+            self._pos = end
+            self._check_size(size)
+            if not match:
+                continue
+            char = self._next()
+            parts.append(char)
+            if char == '"':
+                return "".join(parts)
+            parts.append(self._next())
+
+    def _read_raw_value(self) -> str:
+        """Lê um valor JSON qualquer e retorna o texto bruto"""
+        char = self._peek()
+        if char == '"':
+            return self._read_string_raw()
+
+        parts = []
+        size = 0
+        if char in ("{", "["):
+            depth = 0
+            while True:
+                char = self._peek()
+                if char == '"':
+                    parts.append(self._read_string_raw())
+                else:
+                    self._next()
+                    parts.append(char)
+                    if char in ("{", "["):
+                        depth += 1
+                    elif char in ("}", "]"):
+                        depth -= 1
+                        if depth == 0:
+                            return "".join(parts)
+                size += len(parts[-1])
+                self._check_size(size)
+
+        # Número, true, false ou null
+        while True:
+            char = self._peek()
+            if char is None or char in ",}] \t\r\n":
+                return "".join(parts)
+            parts.append(self._next())
+            size += 1
+            self._check_size(size)
+
+    def _decode_file(self, file_sink: BinaryIO):
+        """Decodifica a string base64 do arquivo (já após a aspa inicial)"""
+        decoder = Base64StreamDecoder()
+        while True:
+            if self._pos >= len(self._buf) and self._peek() is None:
+                raise ValueError("JSON incompleto")
+            match = _STRING_SPECIAL.search(self._buf, self._pos)
+            end = match.start() if match else len(self._buf)
+            self._write(file_sink, decoder.decode(self._buf[self._pos:end]))
+            self._pos = end
+            if not match:
+                continue
+
+            if self._next() == '"':
+                self._write(file_sink, decoder.finish())
+                return
+
+            # Escapes possíveis em base64 serializado: \/, \n, \r, \uXXXX
+            escape = self._next()
+            if escape == "u":
+                code = "".join(self._next() for _ in range(4))
+                text = chr(int(code, 16))
+            elif escape in _JSON_ESCAPES:
+                text = _JSON_ESCAPES[escape]
+            else:
+                raise ValueError("JSON inválido: escape desconhecido")
+            self._write(file_sink, decoder.decode(text))
+
+    def _write(self, file_sink: BinaryIO, data: bytes):
+        if data:
+            file_sink.write(data)
+            self.file_size += len(data)
@@ -0,0 +1,185 @@
+"""
+Cache dos metadados de arquivos (resultado de get_file_info)
+
+Por padrão os metadados ficam na memória do processo (LRU com validade).
+Com várias instâncias/workers, um Redis compartilhado mantém todos coerentes:
+a invalidação feita por um worker vale para os demais.
+"""
+
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import redis
+except ImportError:  # Redis é opcional
+    redis = None
+
+
+# Padrões do cache
+DEFAULT_METADATA_CACHE_TTL = 60
+DEFAULT_METADATA_CACHE_NEGATIVE_TTL = 10
+DEFAULT_METADATA_CACHE_MAX_ENTRIES = 10000
+
+# Valor guardado para IDs que não existem no banco (cache negativo)
+_MISSING = None
+
+
+class LocalMetadataStore:
+    """Armazenamento em memória do processo: LRU limitado com validade por entrada"""
+
+    def __init__(self, max_entries: int = DEFAULT_METADATA_CACHE_MAX_ENTRIES):
+        if max_entries <= 0:
+            raise ValueError("max_entries deve ser maior que zero")
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False, None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return False, None
+            self._entries.move_to_end(key)
+            return True, value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def delete_many(self, keys: List[str]):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+
+class RedisMetadataStore:
+    """Armazenamento compartilhado em Redis (requer o pacote redis)"""
+
+    def __init__(self, url: str, prefix: str = "arquivos:metadados:"):
+        if redis is None:
+            raise ImportError("Instale o pacote redis para usar o cache compartilhado: pip install redis")
+        self._client = redis.Redis.from_url(url)
+        self._prefix = prefix
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        try:
+            raw = self._client.get(self._prefix + key)
+        except redis.RedisError:
+            # Redis indisponível: consultar o banco
+            return False, None
+        if raw is None:
+            return False, None
+        return True, json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: float):
+        try:
+            self._client.set(self._prefix + key, json.dumps(value), ex=max(1, int(ttl)))
+        except redis.RedisError:
+            pass
+
+    def delete(self, key: str):
+        # Uma falha aqui deixa os outros workers com dados antigos até a
+        # validade expirar; o erro é propagado para que o chamador o registre
+        self._client.delete(self._prefix + key)
+
+    def delete_many(self, keys: List[str]):
+        # Um único comando DEL por lote de chaves
+        for start in range(0, len(keys), 1000):
+            self._client.delete(*(self._prefix + key for key in keys[start:start + 1000]))
+
+    def size(self) -> Optional[int]:
+        # Compartilhado com outras aplicações: não contar as chaves
+        return None
+
+
+class MetadataCache:
+    """
+    Cache read-through dos metadados de arquivos, por ID
+
+    IDs inexistentes também são guardados (por menos tempo), para que
+    consultas repetidas a um ID inválido não cheguem ao banco.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_METADATA_CACHE_TTL,
+        negative_ttl: float = DEFAULT_METADATA_CACHE_NEGATIVE_TTL,
+        store=None
+    ):
+        """
+        Args:
+            ttl: Validade em segundos de uma entrada
+            negative_ttl: Validade em segundos de um ID não encontrado
+            store: LocalMetadataStore (padrão) ou RedisMetadataStore
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.store = store or LocalMetadataStore()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(file_id: str) -> str:
+        return str(file_id).lower()
+
+    def get(self, file_id: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Returns:
+            (encontrado, metadados): metadados é None para um ID que não existe
+        """
+        found, value = self.store.get(self._key(file_id))
+        with self._lock:
+            if not found:
+                self.misses += 1
+            elif value is _MISSING:
+                self.negative_hits += 1
+            else:
+                self.hits += 1
+        # Cópia: quem chama pode alterar o dicionário
+        return found, dict(value) if value is not None else None
+
+    def set(self, file_id: str, file_info: Optional[Dict[str, Any]]):
+        """Guarda os metadados de um arquivo (None para um ID não encontrado)"""
+        if file_info is None:
+            if self.negative_ttl > 0:
+                self.store.set(self._key(file_id), _MISSING, self.negative_ttl)
+        else:
+            self.store.set(self._key(file_id), dict(file_info), self.ttl)
+
+    def invalidate(self, file_id: str):
+        """Remove um arquivo do cache (chamar após alterar o registro)"""
+        self.store.delete(self._key(file_id))
+
+    def invalidate_many(self, file_ids: List[str]):
+        """Remove vários arquivos do cache (exclusões em lote)"""
+        self.store.delete_many([self._key(file_id) for file_id in file_ids])
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            requests = self.hits + self.negative_hits + self.misses
+            return {
+                "entradas": self.store.size(),
+                "acertos": self.hits,
+                "acertos_negativos": self.negative_hits,
+                "falhas": self.misses,
+                "taxa_acerto": round((self.hits + self.negative_hits) / requests, 4) if requests else None
+            }
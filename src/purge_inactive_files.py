@@ -0,0 +1,203 @@
+"""
+Expurgo dos arquivos marcados como inativos (soft delete)
+
+Remove definitivamente, blobs e registros, os arquivos inativos há mais de
+N dias. Os registros são percorridos em lotes na ordem (DataExclusao, Id),
+com a posição do último lote gravada em um arquivo de checkpoint e um limite
+de arquivos por segundo, para não disputar o banco e o storage com o
+tráfego da API.
+
+Uso (linha de comando ou tarefa agendada):
+    python purge_inactive_files.py --dias 30 --lote 500 --max-por-segundo 200 \\
+        --checkpoint /home/expurgo.json
+"""
+
+import os
+import json
+import time
+import argparse
+from typing import Any, Dict, Optional, Tuple
+from dotenv import load_dotenv
+from azure_storage_manager import AzureStorageManager
+
+
+# Padrões do expurgo
+DEFAULT_PURGE_RETENTION_DAYS = 30
+DEFAULT_PURGE_CHUNK_SIZE = 500
+DEFAULT_PURGE_MAX_FILES_PER_SECOND = 200
+
+
+class InactiveFilePurger:
+    """Expurga em lotes os arquivos inativos há mais de retention_days dias"""
+
+    def __init__(
+        self,
+        storage_manager: AzureStorageManager,
+        retention_days: int = DEFAULT_PURGE_RETENTION_DAYS,
+        chunk_size: int = DEFAULT_PURGE_CHUNK_SIZE,
+        max_files_per_second: Optional[float] = DEFAULT_PURGE_MAX_FILES_PER_SECOND,
+        checkpoint_path: Optional[str] = None
+    ):
+        """
+        Args:
+            storage_manager: Gerenciador de storage
+            retention_days: Dias que um arquivo inativo é mantido
+            chunk_size: Arquivos expurgados por lote
+            max_files_per_second: Limite de arquivos expurgados por segundo
+                (None ou 0 = sem limite)
+            checkpoint_path: Arquivo com a posição do último lote expurgado;
+                uma execução interrompida continua a partir dele
+        """
+        if retention_days < 0:
+            raise ValueError("retention_days não pode ser negativo")
+        if chunk_size <= 0:
+            raise ValueError("chunk_size deve ser maior que zero")
+
+        self.storage_manager = storage_manager
+        self.retention_days = retention_days
+        self.chunk_size = chunk_size
+        self.max_files_per_second = max_files_per_second
+        self.checkpoint_path = checkpoint_path
+
+    def _load_checkpoint(self) -> Optional[Tuple[str, str]]:
+        if not self.checkpoint_path or not os.path.exists(self.checkpoint_path):
+            return None
+        with open(self.checkpoint_path, "r", encoding="utf-8") as checkpoint_file:
+            data = json.load(checkpoint_file)
+        return data["data_exclusao"], data["id"]
+
+    def _save_checkpoint(self, position: Tuple[str, str]):
+        if not self.checkpoint_path:
+            return
+        # Grava em um arquivo temporário e substitui: uma interrupção no meio
+        # da gravação não corrompe o checkpoint anterior
+        temp_path = self.checkpoint_path + ".tmp"
+        with open(temp_path, "w", encoding="utf-8") as checkpoint_file:
+            json.dump({"data_exclusao": position[0], "id": position[1]}, checkpoint_file)
+        os.replace(temp_path, self.checkpoint_path)
+
+    def _clear_checkpoint(self):
+        if self.checkpoint_path and os.path.exists(self.checkpoint_path):
+            os.remove(self.checkpoint_path)
+
+    def run(self, max_files: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Expurga os arquivos inativos até não restar nenhum (ou até max_files)
+
+        Ao terminar todos os lotes, o checkpoint é removido e a próxima
+        execução recomeça do início.
+
+        Returns:
+            Dicionário com os totais da execução
+        """
+        position = self._load_checkpoint()
+        started_at = time.monotonic()
+        purged_files = 0
+        removed_blobs = 0
+        failed_blobs = []
+        finished = False
+
+        while max_files is None or purged_files < max_files:
+            limit = self.chunk_size
+            if max_files is not None:
+                limit = min(limit, max_files - purged_files)
+
+            found = self.storage_manager.find_inactive_files(
+                retention_days=self.retention_days,
+                limit=limit,
+                after=position
+            )
+            if not found.get("sucesso"):
+                raise RuntimeError(found.get("mensagem"))
+            files = found["arquivos"]
+            if not files:
+                finished = True
+                break
+
+            result = self.storage_manager.delete_files(
+                file_ids=[f["id"] for f in files],
+                permanent=True
+            )
+            if not result.get("sucesso"):
+                raise RuntimeError(result.get("mensagem"))
+
+            purged_files += result["arquivos_deletados"]
+            removed_blobs += result["blobs_removidos"]
+            failed_blobs.extend(result["blobs_com_falha"])
+            position = (files[-1]["data_exclusao"], files[-1]["id"])
+            self._save_checkpoint(position)
+            print(f"Expurgo: {purged_files} arquivo(s), {removed_blobs} blob(s) removido(s)")
+
+            if len(files) < limit:
+                finished = True
+                break
+
+            # Limite de vazão: espera até a média ficar dentro do permitido
+            if self.max_files_per_second:
+                wait = purged_files / self.max_files_per_second - (time.monotonic() - started_at)
+                if wait > 0:
+                    time.sleep(wait)
+
+        if finished:
+            self._clear_checkpoint()
+
+        return {
+            "sucesso": True,
+            "arquivos_expurgados": purged_files,
+            "blobs_removidos": removed_blobs,
+            "blobs_com_falha": failed_blobs,
+            "concluido": finished,
+            "duracao_segundos": round(time.monotonic() - started_at, 1)
+        }
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Expurga os arquivos inativos (soft delete) antigos")
+    parser.add_argument(
+        "--dias", type=int,
+        default=int(os.getenv("PURGE_RETENTION_DAYS", DEFAULT_PURGE_RETENTION_DAYS)),
+        help="Dias que um arquivo inativo é mantido"
+    )
+    parser.add_argument(
+        "--lote", type=int,
+        default=int(os.getenv("PURGE_CHUNK_SIZE", DEFAULT_PURGE_CHUNK_SIZE)),
+        help="Arquivos expurgados por lote"
+    )
+    parser.add_argument(
+        "--max-por-segundo", type=float,
+        default=float(os.getenv("PURGE_MAX_FILES_PER_SECOND", DEFAULT_PURGE_MAX_FILES_PER_SECOND)),
+        help="Limite de arquivos expurgados por segundo (0 = sem limite)"
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=os.getenv("PURGE_CHECKPOINT_FILE"),
+        help="Arquivo com a posição do último lote (permite retomar)"
+    )
+    parser.add_argument(
+        "--max-arquivos", type=int, default=None,
+        help="Encerra após expurgar esta quantidade de arquivos"
+    )
+    args = parser.parse_args()
+
+    storage_manager = AzureStorageManager(
+        storage_account=os.getenv("AZURE_STORAGE_ACCOUNT", "staudicoreapiprod"),
+        storage_key=os.getenv("AZURE_STORAGE_KEY"),
+        container_name=os.getenv("AZURE_STORAGE_CONTAINER", "arquivos"),
+        sql_connection_string=os.getenv("SQL_CONNECTION_STRING"),
+        db_pool_max_size=1
+    )
+
+    purger = InactiveFilePurger(
+        storage_manager,
+        retention_days=args.dias,
+        chunk_size=args.lote,
+        max_files_per_second=args.max_por_segundo,
+        checkpoint_path=args.checkpoint
+    )
+    print(json.dumps(purger.run(max_files=args.max_arquivos), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Reconciliação entre os blobs do container e a tabela ArquivosStorage
+
+Encontra (e, opcionalmente, corrige) três inconsistências:
+- blobs órfãos: gravados no storage sem registro (ex.: falha entre o upload
+  do blob e o INSERT), inclusive miniaturas sem registro em ArquivosDerivados
+- registros pendentes: apontam para um blob que não existe mais
+- variantes pendentes: miniaturas concluídas cujo blob não existe mais
+
+A listagem de blobs e os registros ordenados por CaminhoBlob são lidos como
+dois fluxos ordenados e comparados por merge join, sem carregar nenhum dos
+lados em memória. O container é dividido em partições de pastas, varridas em
+paralelo.
+
+Uso (linha de comando ou tarefa agendada):
+    python reconcile_blobs.py --paralelismo 8 --relatorio reconciliacao.jsonl
+    python reconcile_blobs.py --reparar
+"""
+
+import os
+import json
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from dotenv import load_dotenv
+from azure_storage_manager import AzureStorageManager, BLOB_BATCH_DELETE_SIZE
+
+
+# Padrões da reconciliação
+DEFAULT_RECONCILE_CONCURRENCY = 4
+DEFAULT_RECONCILE_PARTITION_DEPTH = 1
+
+# Blobs e registros mais novos que isso são ignorados: podem ser de um upload
+# em andamento (blob gravado, registro ainda não)
+DEFAULT_RECONCILE_MIN_AGE_MINUTES = 60
+
+# Registros pendentes corrigidos por vez
+_DANGLING_BATCH_SIZE = 1000
+
+
+def _ensure_sorted(items: Iterable[Any], key, source: str) -> Iterator[Any]:
+    """
+    Repassa os itens conferindo a ordem crescente: o merge join só é correto
+    se os dois fluxos estiverem na mesma ordem
+    """
+    previous = None
+    for item in items:
+        current = key(item)
+        if previous is not None and current < previous:
+            raise RuntimeError(f"Ordem inesperada na listagem de {source}: {current!r} após {previous!r}")
+        previous = current
+        yield item
+
+
+def merge_blobs_and_records(blobs: Iterable[Any], records: Iterable[Any]) -> Iterator[Tuple[str, Any, List[Any]]]:
+    """
+    Percorre juntos os blobs (ordenados por name) e os registros (ordenados
+    por CaminhoBlob)
+
+    Yields:
+        (caminho, blob ou None, registros com esse caminho); vários registros
+        podem apontar para o mesmo blob (uploads deduplicados)
+    """
+    blobs = _ensure_sorted(blobs, lambda blob: blob.name, "blobs")
+    records = _ensure_sorted(records, lambda row: row.CaminhoBlob, "registros")
+    blob = next(blobs, None)
+    row = next(records, None)
+
+    while blob is not None or row is not None:
+        if row is None or (blob is not None and blob.name < row.CaminhoBlob):
+            yield blob.name, blob, []
+            blob = next(blobs, None)
+            continue
+
+        path = row.CaminhoBlob
+        group = []
+        while row is not None and row.CaminhoBlob == path:
+            group.append(row)
+            row = next(records, None)
+
+        matched = None
+        if blob is not None and blob.name == path:
+            matched = blob
+            blob = next(blobs, None)
+        yield path, matched, group
+
+
+class BlobReconciler:
+    """Compara o container com ArquivosStorage, partição por partição"""
+
+    def __init__(
+        self,
+        storage_manager: AzureStorageManager,
+        repair: bool = False,
+        concurrency: int = DEFAULT_RECONCILE_CONCURRENCY,
+        partition_depth: int = DEFAULT_RECONCILE_PARTITION_DEPTH,
+        min_age_minutes: int = DEFAULT_RECONCILE_MIN_AGE_MINUTES,
+        report_path: Optional[str] = None
+    ):
+        """
+        Args:
+            storage_manager: Gerenciador de storage
+            repair: Se True, remove os blobs órfãos, marca como inativos os
+                registros ativos pendentes, exclui os inativos pendentes e
+                remove os registros das variantes pendentes (geradas de novo
+                no próximo pedido)
+            concurrency: Partições varridas em paralelo
+            partition_depth: Níveis de pastas separados em partições
+            min_age_minutes: Idade mínima de blobs e registros considerados
+            report_path: Arquivo JSON Lines com cada inconsistência encontrada
+        """
+        if concurrency <= 0:
+            raise ValueError("concurrency deve ser maior que zero")
+
+        self.storage_manager = storage_manager
+        self.repair = repair
+        self.concurrency = concurrency
+        self.partition_depth = partition_depth
+        self.min_age_minutes = min_age_minutes
+        self.report_path = report_path
+        self._report_file = None
+        self._report_lock = threading.Lock()
+
+    def _report(self, kind: str, path: str, **extra):
+        if self._report_file is None:
+            return
+        line = json.dumps({"tipo": kind, "caminho_blob": path, **extra}, ensure_ascii=False)
+        with self._report_lock:
+            self._report_file.write(line + "\n")
+
+    def _flush_orphans(self, candidates: List[str], stats: Dict[str, Any]):
+        """Confirma os blobs órfãos candidatos (sessões de upload) e os corrige"""
+        found = self.storage_manager.find_orphan_blobs(candidates)
+        if not found.get("sucesso"):
+            raise RuntimeError(found.get("mensagem"))
+        orphans = found["blobs_orfaos"]
+        stats["blobs_orfaos"] += len(orphans)
+        for path in orphans:
+            self._report("blob_orfao", path)
+
+        if self.repair and orphans:
+            result = self.storage_manager.delete_orphan_blobs(orphans)
+            if not result.get("sucesso"):
+                raise RuntimeError(result.get("mensagem"))
+            stats["blobs_removidos"] += result["blobs_removidos"]
+            stats["blobs_com_falha"] += len(result["blobs_com_falha"])
+
+    def _flush_dangling(
+        self,
+        active_ids: List[str],
+        inactive_ids: List[str],
+        derivatives: List[Tuple[str, str]],
+        stats: Dict[str, Any]
+    ):
+        """
+        Marca como inativos os registros ativos pendentes, exclui os inativos
+        e remove os registros das variantes pendentes
+        """
+        for file_ids, permanent in ((active_ids, False), (inactive_ids, True)):
+            if not file_ids:
+                continue
+            result = self.storage_manager.delete_files(file_ids=file_ids, permanent=permanent)
+            if not result.get("sucesso"):
+                raise RuntimeError(result.get("mensagem"))
+            stats["registros_corrigidos"] += result["arquivos_deletados"]
+
+        if derivatives:
+            result = self.storage_manager.reset_derivatives(derivatives)
+            if not result.get("sucesso"):
+                raise RuntimeError(result.get("mensagem"))
+            stats["variantes_corrigidas"] += result["variantes_removidas"]
+
+    def reconcile_partition(self, folder: str, recursive: bool) -> Dict[str, Any]:
+        """
+        Compara uma partição (ver AzureStorageManager.list_blob_partitions)
+
+        Os candidatos são acumulados em lotes pequenos; a memória usada não
+        depende do tamanho da partição.
+        """
+        stats = {
+            "blobs": 0,
+            "registros": 0,
+            "blobs_orfaos": 0,
+            "registros_pendentes": 0,
+            "variantes_pendentes": 0,
+            "blobs_removidos": 0,
+            "blobs_com_falha": 0,
+            "registros_corrigidos": 0,
+            "variantes_corrigidas": 0
+        }
+        blob_cutoff = datetime.now(timezone.utc) - timedelta(minutes=self.min_age_minutes)
+        orphan_candidates: List[str] = []
+        dangling_active: List[str] = []
+        dangling_inactive: List[str] = []
+        dangling_derivatives: List[Tuple[str, str]] = []
+
+        # A consulta dos registros fica aberta durante toda a varredura e o
+        # pool entrega a mesma conexão a toda a thread; as verificações e
+        # correções rodam em outra thread (outra conexão), um lote por vez
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="reconciliacao-lote") as flusher:
+            pending = None
+
+            def submit(fn, *args):
+                nonlocal pending
+                if pending is not None:
+                    pending.result()
+                pending = flusher.submit(fn, *args, stats)
+
+            merged = merge_blobs_and_records(
+                self.storage_manager.iter_blobs(folder, recursive),
+                self.storage_manager.iter_file_records(folder, recursive, self.min_age_minutes)
+            )
+            for path, blob, rows in merged:
+                stats["blobs"] += blob is not None
+                stats["registros"] += len(rows)
+
+                if blob is not None and not rows:
+                    if blob.last_modified and blob.last_modified < blob_cutoff:
+                        orphan_candidates.append(path)
+                        if len(orphan_candidates) >= BLOB_BATCH_DELETE_SIZE:
+                            submit(self._flush_orphans, orphan_candidates)
+                            orphan_candidates = []
+
+                elif blob is None:
+                    for row in rows:
+                        if not row.Antigo:
+                            continue
+                        if row.Derivado:
+                            stats["variantes_pendentes"] += 1
+                            self._report("variante_pendente", path, id=str(row.Id), variante=row.Variante)
+                            if self.repair:
+                                dangling_derivatives.append((str(row.Id), row.Variante))
+                            continue
+                        stats["registros_pendentes"] += 1
+                        self._report("registro_pendente", path, id=str(row.Id), ativo=bool(row.Ativo))
+                        if self.repair:
+                            (dangling_active if row.Ativo else dangling_inactive).append(str(row.Id))
+                    pending_count = len(dangling_active) + len(dangling_inactive) + len(dangling_derivatives)
+                    if pending_count >= _DANGLING_BATCH_SIZE:
+                        submit(self._flush_dangling, dangling_active, dangling_inactive, dangling_derivatives)
+                        dangling_active, dangling_inactive, dangling_derivatives = [], [], []
+
+            if orphan_candidates:
+                submit(self._flush_orphans, orphan_candidates)
+            if dangling_active or dangling_inactive or dangling_derivatives:
+                submit(self._flush_dangling, dangling_active, dangling_inactive, dangling_derivatives)
+            if pending is not None:
+                pending.result()
+
+        return stats
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Varre todas as partições do container, em paralelo
+
+        Returns:
+            Dicionário com os totais e as partições que falharam
+        """
+        partitions = self.storage_manager.list_blob_partitions(self.partition_depth)
+        totals: Dict[str, Any] = {}
+        failures = []
+
+        if self.report_path:
+            self._report_file = open(self.report_path, "w", encoding="utf-8")
+        try:
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="reconciliacao") as executor:
+                futures = {
+                    executor.submit(self.reconcile_partition, folder, recursive): (folder, recursive)
+                    for folder, recursive in partitions
+                }
+                for future, (folder, recursive) in futures.items():
+                    try:
+                        stats = future.result()
+                    except Exception as e:
+                        failures.append({"pasta": folder, "recursiva": recursive, "erro": str(e)})
+                        continue
+                    for key, value in stats.items():
+                        totals[key] = totals.get(key, 0) + value
+                    print(f"Reconciliação: pasta '{folder}' concluída ({stats['blobs']} blob(s))")
+        finally:
+            if self._report_file is not None:
+                self._report_file.close()
+                self._report_file = None
+
+        return {
+            "sucesso": not failures,
+            "particoes": len(partitions),
+            "particoes_com_falha": failures,
+            "reparado": self.repair,
+            **totals
+        }
+
+
+def main():
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Reconcilia os blobs do container com a tabela ArquivosStorage")
+    parser.add_argument(
+        "--reparar", action="store_true",
+        help="Corrige as inconsistências (sem esta opção, apenas relata)"
+    )
+    parser.add_argument(
+        "--paralelismo", type=int,
+        default=int(os.getenv("RECONCILE_CONCURRENCY", DEFAULT_RECONCILE_CONCURRENCY)),
+        help="Partições varridas em paralelo"
+    )
+    parser.add_argument(
+        "--profundidade", type=int,
+        default=int(os.getenv("RECONCILE_PARTITION_DEPTH", DEFAULT_RECONCILE_PARTITION_DEPTH)),
+        help="Níveis de pastas separados em partições (0 = container inteiro)"
+    )
+    parser.add_argument(
+        "--idade-minima-minutos", type=int,
+        default=int(os.getenv("RECONCILE_MIN_AGE_MINUTES", DEFAULT_RECONCILE_MIN_AGE_MINUTES)),
+        help="Ignora blobs e registros mais novos que isso"
+    )
+    parser.add_argument(
+        "--relatorio",
+        help="Arquivo JSON Lines com cada inconsistência encontrada"
+    )
+    args = parser.parse_args()
+
+    storage_manager = AzureStorageManager(
+        storage_account=os.getenv("AZURE_STORAGE_ACCOUNT", "staudicoreapiprod"),
+        storage_key=os.getenv("AZURE_STORAGE_KEY"),
+        container_name=os.getenv("AZURE_STORAGE_CONTAINER", "arquivos"),
+        sql_connection_string=os.getenv("SQL_CONNECTION_STRING"),
+        # Uma conexão para a varredura e outra para as correções, por partição
+        db_pool_max_size=args.paralelismo * 2
+    )
+
+    reconciler = BlobReconciler(
+        storage_manager,
+        repair=args.reparar,
+        concurrency=args.paralelismo,
+        partition_depth=args.profundidade,
+        min_age_minutes=args.idade_minima_minutos,
+        report_path=args.relatorio
+    )
+    print(json.dumps(reconciler.run(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""
+Pool de conexões pyodbc com o SQL Server
+
+Abrir uma conexão com o Azure SQL (TLS + autenticação) custa dezenas a
+centenas de milissegundos; o pool mantém conexões abertas e as reaproveita
+entre as operações.
+"""
+
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional
+import pyodbc
+
+
+# Padrões do pool
+DEFAULT_POOL_MIN_SIZE = 1
+DEFAULT_POOL_MAX_SIZE = 10
+DEFAULT_POOL_TIMEOUT = 30
+DEFAULT_POOL_MAX_AGE = 30 * 60
+DEFAULT_POOL_MAX_IDLE = 5 * 60
+
+# Conexões usadas há menos tempo que isso não são testadas na retirada
+DEFAULT_POOL_PING_INTERVAL = 30
+
+
+class PoolTimeoutError(Exception):
+    """Nenhuma conexão ficou livre dentro do tempo limite"""
+
+
+class _PooledConnection:
+    """Conexão aberta pelo pool, com os instantes de criação e último uso"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+
+
+class _ConnectionLease:
+    """
+    Context manager retornado por SqlConnectionPool.connection()
+
+    Na saída do bloco mais externo faz commit, como o context manager da
+    própria conexão pyodbc, e devolve a conexão ao pool. Blocos aninhados
+    fazem parte da mesma transação: não fazem commit, e uma exceção que sai
+    de qualquer um deles faz rollback da transação inteira.
+    """
+
+    def __init__(self, pool: "SqlConnectionPool"):
+        self._pool = pool
+
+    def __enter__(self):
+        return self._pool._checkout()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._pool._checkin(exc_value)
+        return False
+
+
+class SqlConnectionPool:
+    """
+    Pool de conexões thread-safe
+
+    Cada thread usa no máximo uma conexão por vez: blocos connection()
+    aninhados na mesma thread recebem a mesma conexão (e a mesma transação,
+    confirmada na saída do bloco mais externo). A conexão volta ao pool ao
+    fim de cada bloco externo, para não ficar presa durante a leitura de um
+    upload ou um download do Azure; entre begin_request() e end_request(),
+    os blocos seguintes da thread recebem a mesma conexão se ela ainda
+    estiver livre no pool.
+    """
+
+    def __init__(
+        self,
+        connection_string: str,
+        min_size: int = DEFAULT_POOL_MIN_SIZE,
+        max_size: int = DEFAULT_POOL_MAX_SIZE,
+        timeout: float = DEFAULT_POOL_TIMEOUT,
+        max_age: float = DEFAULT_POOL_MAX_AGE,
+        max_idle: float = DEFAULT_POOL_MAX_IDLE,
+        ping_interval: float = DEFAULT_POOL_PING_INTERVAL,
+        connect: Callable[[str], Any] = pyodbc.connect
+    ):
+        """
+        Args:
+            connection_string: String de conexão do SQL Server
+            min_size: Conexões ociosas mantidas abertas mesmo sem uso
+            max_size: Máximo de conexões abertas ao mesmo tempo
+            timeout: Segundos de espera por uma conexão livre
+            max_age: Segundos até uma conexão ser fechada e substituída
+            max_idle: Segundos até uma conexão ociosa acima de min_size ser
+                fechada
+            ping_interval: Conexões sem uso há mais tempo que isso são
+                testadas (SELECT 1) antes de serem entregues
+            connect: Função que abre uma conexão
+        """
+        if max_size <= 0 or min_size < 0 or min_size > max_size:
+            raise ValueError("Tamanhos do pool inválidos (0 <= min_size <= max_size, max_size > 0)")
+
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.ping_interval = ping_interval
+        self._connect = connect
+
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._local = threading.local()
+
+        self.waits = 0
+        self.timeouts = 0
+        self.created = 0
+        self.discarded = 0
+
+    def connection(self) -> _ConnectionLease:
+        """
+        Retira uma conexão do pool para uso em um bloco with
+
+        Usage:
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                ...
+        """
+        return _ConnectionLease(self)
+
+    def begin_request(self):
+        """Passa a reaproveitar, até end_request(), a última conexão da thread"""
+        self._local.in_request = True
+        self._local.preferred = None
+
+    def end_request(self):
+        """Encerra a preferência iniciada em begin_request()"""
+        self._local.in_request = False
+        self._local.preferred = None
+
+    def _checkout(self):
+        local = self._local
+        if getattr(local, "pooled", None) is not None:
+            local.depth += 1
+            return local.pooled.connection
+
+        local.pooled = self._acquire(getattr(local, "preferred", None))
+        local.depth = 1
+        return local.pooled.connection
+
+    def _checkin(self, error: Optional[BaseException]):
+        local = self._local
+        pooled = getattr(local, "pooled", None)
+        if pooled is None:
+            # Já descartada por um bloco aninhado que encontrou a conexão quebrada
+            return
+        local.depth -= 1
+
+        broken = False
+        try:
+            if error is not None:
+                pooled.connection.rollback()
+            elif local.depth == 0:
+                pooled.connection.commit()
+        except pyodbc.Error:
+            broken = True
+        # Falhas de comunicação deixam a conexão inutilizável
+        broken = broken or isinstance(error, (pyodbc.OperationalError, pyodbc.InterfaceError))
+
+        if broken or local.depth == 0:
+            local.pooled = None
+            local.depth = 0
+            local.preferred = None if broken or not getattr(local, "in_request", False) else pooled
+            self._release(pooled, broken)
+
+    def _acquire(self, preferred: Optional[_PooledConnection] = None) -> _PooledConnection:
+        """
+        Retira uma conexão ociosa (preferred, se ainda estiver livre) ou abre
+        uma nova, esperando até timeout se o pool estiver cheio
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            pooled = None
+            with self._condition:
+                while True:
+                    if preferred is not None and preferred in self._idle:
+                        self._idle.remove(preferred)
+                        pooled = preferred
+                        break
+                    if self._idle:
+                        pooled = self._idle.pop()
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self.timeouts += 1
+                        raise PoolTimeoutError(
+                            f"Nenhuma conexão com o banco livre em {self.timeout} segundos"
+                        )
+                    self.waits += 1
+                    self._condition.wait(remaining)
+
+            if pooled is None:
+                return self._open()
+
+            now = time.monotonic()
+            if now - pooled.created_at > self.max_age:
+                self._discard(pooled)
+                continue
+            if now - pooled.last_used > self.ping_interval and not self._is_alive(pooled):
+                self._discard(pooled)
+                continue
+            return pooled
+
+    def _open(self) -> _PooledConnection:
+        """Abre uma conexão (a vaga em _size já foi reservada)"""
+        try:
+            pooled = _PooledConnection(self._connect(self.connection_string))
+        except BaseException:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self.created += 1
+        return pooled
+
+    @staticmethod
+    def _is_alive(pooled: _PooledConnection) -> bool:
+        try:
+            cursor = pooled.connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            cursor.close()
+            return True
+        except pyodbc.Error:
+            return False
+
+    def _release(self, pooled: _PooledConnection, broken: bool):
+        now = time.monotonic()
+        if broken or now - pooled.created_at > self.max_age:
+            self._discard(pooled)
+            return
+
+        pooled.last_used = now
+        expired = []
+        with self._condition:
+            self._idle.append(pooled)
+            # As mais antigas ficam no início: fechar as ociosas demais
+            while len(self._idle) > self.min_size and now - self._idle[0].last_used > self.max_idle:
+                expired.append(self._idle.popleft())
+            self._condition.notify()
+        for old in expired:
+            self._discard(old)
+
+    def _discard(self, pooled: _PooledConnection):
+        try:
+            pooled.connection.close()
+        except pyodbc.Error:
+            pass
+        with self._condition:
+            self._size -= 1
+            self.discarded += 1
+            self._condition.notify()
+
+    def stats(self) -> Dict[str, Any]:
+        """Ocupação e contadores do pool"""
+        with self._condition:
+            in_use = self._size - len(self._idle)
+            return {
+                "abertas": self._size,
+                "em_uso": in_use,
+                "ociosas": len(self._idle),
+                "min": self.min_size,
+                "max": self.max_size,
+                "utilizacao": round(in_use / self.max_size, 4),
+                "esperas": self.waits,
+                "tempo_esgotado": self.timeouts,
+                "criadas": self.created,
+                "descartadas": self.discarded
+            }
+
+    def close(self):
+        """Fecha as conexões ociosas"""
+        with self._condition:
+            idle = list(self._idle)
+            self._idle.clear()
+        for pooled in idle:
+            self._discard(pooled)
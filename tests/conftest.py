@@ -0,0 +1,11 @@
+"""
+Configuração dos testes automatizados (pytest)
+
+Os módulos de src/ importam uns aos outros pelo nome (ex.: from
+metadata_cache import ...), como ao executar a API a partir de src/.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
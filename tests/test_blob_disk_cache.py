@@ -0,0 +1,158 @@
+"""Testes do cache em disco dos blobs baixados"""
+
+import os
+import time
+
+import pytest
+
+from blob_disk_cache import STALE_TEMP_SECONDS, BlobDiskCache
+
+
+def _store(cache: BlobDiskCache, blob_path: str, etag: str, content: bytes):
+    writer = cache.writer(blob_path, etag, len(content))
+    for start in range(0, len(content), 3):
+        writer.write(content[start:start + 3])
+    writer.commit()
+
+
+def _files(directory) -> list:
+    # Sem o arquivo do lock entre processos
+    return sorted(name for name in os.listdir(directory) if not name.startswith("."))
+
+
+def _set_mtime(path: str, seconds_ago: float):
+    moment = time.time() - seconds_ago
+    os.utime(path, (moment, moment))
+
+
+def test_store_and_get(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=1000)
+    assert cache.get("a/b.pdf", '"e1"', 5) is None
+    _store(cache, "a/b.pdf", '"e1"', b"12345")
+
+    path = cache.get("a/b.pdf", "e1", 5)
+    with open(path, "rb") as cached:
+        assert cached.read() == b"12345"
+    stats = cache.stats()
+    assert (stats["arquivos"], stats["bytes"], stats["acertos"], stats["falhas"]) == (1, 5, 1, 1)
+
+
+def test_etag_change_misses(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=1000)
+    _store(cache, "a", '"e1"', b"12345")
+    assert cache.get("a", '"e2"', 5) is None
+
+
+def test_size_mismatch_removes_entry(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=1000)
+    _store(cache, "a", "e", b"12345")
+    assert cache.get("a", "e", 6) is None
+    assert cache.stats()["arquivos"] == 0
+    assert cache.get("a", "e", 5) is None
+
+
+def test_incomplete_write_is_discarded(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=1000)
+    writer = cache.writer("a", "e", 10)
+    writer.write(b"123")
+    writer.commit()
+    assert cache.get("a", "e", 10) is None
+    assert _files(cache.directory) == []
+
+
+def test_discard(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=1000)
+    writer = cache.writer("a", "e", 3)
+    writer.write(b"123")
+    writer.discard()
+    writer.discard()
+    assert _files(cache.directory) == []
+
+
+def test_entry_larger_than_limit(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=800)
+    assert cache.max_entry_bytes == 100
+    assert cache.writer("a", "e", 101) is None
+    assert cache.writer("a", "e", 100) is not None
+
+
+def test_lru_eviction(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=10, max_entry_bytes=10)
+    _store(cache, "a", "e", b"1234")
+    _set_mtime(cache.get("a", "e", 4), 20)
+    _store(cache, "b", "e", b"1234")
+    _set_mtime(cache.get("b", "e", 4), 10)
+    # O acerto atualiza a data de modificação: "a" passa a ser a mais recente
+    assert cache.get("a", "e", 4)
+    _store(cache, "c", "e", b"1234")
+
+    assert cache.get("b", "e", 4) is None
+    assert cache.get("a", "e", 4) and cache.get("c", "e", 4)
+    stats = cache.stats()
+    assert stats["remocoes"] == 1 and stats["bytes"] == 8
+
+
+def test_new_entry_evicted_last(tmp_path):
+    """Com datas iguais, a entrada recém-gravada não é a removida"""
+    cache = BlobDiskCache(str(tmp_path), max_bytes=10, max_entry_bytes=10)
+    for name in "abc":
+        _store(cache, name, "e", b"1234")
+        _set_mtime(cache.get(name, "e", 4), 0)
+    assert cache.get("c", "e", 4)
+    assert cache.stats()["arquivos"] == 2
+
+
+def test_shared_between_instances(tmp_path):
+    """Workers no mesmo diretório: entradas visíveis e orçamento comum"""
+    first = BlobDiskCache(str(tmp_path), max_bytes=10, max_entry_bytes=10)
+    second = BlobDiskCache(str(tmp_path), max_bytes=10, max_entry_bytes=10)
+    _store(first, "a", "e", b"1234")
+    _set_mtime(first.get("a", "e", 4), 10)
+    assert second.get("a", "e", 4)
+    _set_mtime(second.get("a", "e", 4), 10)
+
+    _store(second, "b", "e", b"1234")
+    _store(second, "c", "e", b"1234")
+    assert first.get("a", "e", 4) is None
+    assert first.stats()["bytes"] == 8
+
+
+def test_index_rebuilt_on_restart(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=1000)
+    _store(cache, "a", "e", b"12345")
+
+    restarted = BlobDiskCache(str(tmp_path), max_bytes=1000)
+    assert restarted.get("a", "e", 5)
+    assert restarted.stats()["bytes"] == 5
+
+
+def test_restart_applies_budget(tmp_path):
+    cache = BlobDiskCache(str(tmp_path), max_bytes=10, max_entry_bytes=10)
+    _store(cache, "a", "e", b"1234")
+    _set_mtime(cache.get("a", "e", 4), 10)
+    _store(cache, "b", "e", b"1234")
+
+    restarted = BlobDiskCache(str(tmp_path), max_bytes=5, max_entry_bytes=5)
+    assert restarted.get("a", "e", 4) is None
+    assert restarted.get("b", "e", 4)
+
+
+def test_only_stale_temp_files_removed(tmp_path):
+    """Gravações em andamento de outros workers são preservadas"""
+    cache = BlobDiskCache(str(tmp_path), max_bytes=1000)
+    in_progress = cache.writer("a", "e", 3)
+    in_progress.write(b"1")
+    stale = tmp_path / "interrompida.tmp"
+    stale.write_bytes(b"123")
+    _set_mtime(str(stale), STALE_TEMP_SECONDS + 60)
+
+    BlobDiskCache(str(tmp_path), max_bytes=1000)
+    assert not stale.exists()
+    in_progress.write(b"23")
+    in_progress.commit()
+    assert cache.get("a", "e", 3)
+
+
+def test_invalid_budget(tmp_path):
+    with pytest.raises(ValueError):
+        BlobDiskCache(str(tmp_path), max_bytes=0)
@@ -0,0 +1,134 @@
+"""Testes da escolha da compressão no upload e da entrega no download"""
+
+import gzip
+import io
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.storage.blob")
+
+from azure_storage_manager import AzureStorageManager  # noqa: E402
+
+
+MIN_SIZE = 64
+TEXT = b"codigo;descricao;valor\n" * 20
+
+
+def _manager(compression="gzip"):
+    return AzureStorageManager(
+        storage_account="conta",
+        storage_key="Y2hhdmU=",
+        container_name="arquivos",
+        sql_connection_string=None,
+        compression=compression,
+        compression_min_size=MIN_SIZE
+    )
+
+
+@pytest.mark.parametrize("content_type, expected", [
+    ("text/plain", True),
+    ("text/csv; charset=utf-8", True),
+    ("Application/JSON", True),
+    ("application/vnd.api+json", True),
+    ("image/svg+xml", True),
+    ("application/pdf", False),
+    ("image/png", False),
+    ("application/zip", False),
+    ("", False),
+    (None, False),
+])
+def test_is_compressible(content_type, expected):
+    assert AzureStorageManager._is_compressible(content_type) is expected
+
+
+def test_compressible_file_is_gzipped():
+    stream, encoding = _manager()._compression_stream(io.BytesIO(TEXT), "text/csv")
+    assert encoding == "gzip"
+    compressed = stream.read()
+    assert len(compressed) < len(TEXT)
+    assert gzip.decompress(compressed) == TEXT
+
+
+def test_small_file_is_not_compressed():
+    content = TEXT[:MIN_SIZE - 1]
+    stream, encoding = _manager()._compression_stream(io.BytesIO(content), "text/csv")
+    assert encoding is None
+    assert stream.read() == content
+
+
+def test_exactly_min_size_is_compressed():
+    stream, encoding = _manager()._compression_stream(io.BytesIO(TEXT[:MIN_SIZE]), "text/csv")
+    assert encoding == "gzip"
+    assert gzip.decompress(stream.read()) == TEXT[:MIN_SIZE]
+
+
+def test_incompressible_type_is_untouched():
+    original = io.BytesIO(TEXT)
+    stream, encoding = _manager()._compression_stream(original, "application/pdf")
+    assert (stream, encoding) == (original, None)
+    assert original.tell() == 0
+
+
+def test_compression_disabled():
+    original = io.BytesIO(TEXT)
+    assert _manager(compression=None)._compression_stream(original, "text/csv") == (original, None)
+
+
+def test_invalid_compression():
+    with pytest.raises(ValueError):
+        _manager(compression="brotli")
+
+
+def test_zstd():
+    zstandard = pytest.importorskip("zstandard")
+    stream, encoding = _manager(compression="zstd")._compression_stream(io.BytesIO(TEXT), "application/json")
+    assert encoding == "zstd"
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(stream.read()) == TEXT
+
+
+class _FakeBlobClient:
+    def __init__(self, data):
+        self._data = data
+
+    def download_blob(self):
+        data = self._data
+        return SimpleNamespace(
+            size=len(data),
+            chunks=lambda: iter([data[:10], data[10:]]),
+            properties=SimpleNamespace(etag='"0x1"', last_modified=None)
+        )
+
+
+@pytest.mark.parametrize("accept_encodings, expected_encoding", [
+    (["gzip"], "gzip"),
+    (["zstd"], None),
+    ([], None),
+    (None, None),
+])
+def test_download_negotiates_encoding(accept_encodings, expected_encoding):
+    compressed = gzip.compress(TEXT)
+    manager = _manager()
+    manager.container_client = SimpleNamespace(get_blob_client=lambda path: _FakeBlobClient(compressed))
+    file_info = {
+        "nome_original": "dados.csv",
+        "caminho_blob": "dados.csv",
+        "tipo_conteudo": "text/csv",
+        "tamanho_bytes": len(TEXT),
+        "tamanho_armazenado_bytes": len(compressed),
+        "codificacao_conteudo": "gzip",
+        "etag_blob": '"0x1"'
+    }
+
+    result = manager.download_file_stream(
+        "id", byte_range=(0, 5), file_info=file_info, accept_encodings=accept_encodings
+    )
+    content = b"".join(result["chunks"])
+    assert result["codificacao"] == expected_encoding
+    # O intervalo é ignorado em arquivos comprimidos
+    assert result["parcial"] is False
+    if expected_encoding:
+        assert (content, result["tamanho_bytes"]) == (compressed, len(compressed))
+    else:
+        assert (content, result["tamanho_bytes"]) == (TEXT, len(TEXT))
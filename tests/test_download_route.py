@@ -0,0 +1,176 @@
+"""Testes do download direto (GET /api/arquivos/download/<id>), com o blob em memória"""
+
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.storage.blob")
+pytest.importorskip("flask")
+
+from azure.core.exceptions import ResourceModifiedError  # noqa: E402
+from flask import Flask  # noqa: E402
+
+import api_storage_routes  # noqa: E402
+
+
+FILE_ID = "123e4567-e89b-12d3-a456-426614174000"
+CONTENT = b"0123456789abcdefghij"
+ETAG = '"0x8DC0000000000A1"'
+LAST_MODIFIED = datetime(2025, 1, 8, 13, 15, tzinfo=timezone.utc)
+
+
+class _FakeDownloader:
+    def __init__(self, data):
+        self.size = len(data)
+        self.properties = SimpleNamespace(etag=ETAG, last_modified=LAST_MODIFIED)
+        self._data = data
+
+    def chunks(self):
+        return iter([self._data])
+
+
+class _FakeBlobClient:
+    """Blob em memória: registra os downloads pedidos"""
+
+    def __init__(self):
+        self.downloads = []
+
+    def download_blob(self, offset=None, length=None, etag=None, match_condition=None,
+                      if_unmodified_since=None):
+        self.downloads.append((offset, length))
+        if etag is not None and etag != ETAG:
+            raise ResourceModifiedError("O blob foi alterado")
+        if if_unmodified_since is not None and LAST_MODIFIED > if_unmodified_since:
+            raise ResourceModifiedError("O blob foi alterado")
+        if offset is None:
+            return _FakeDownloader(CONTENT)
+        return _FakeDownloader(CONTENT[offset:offset + length])
+
+    def get_blob_properties(self):
+        return SimpleNamespace(etag=ETAG)
+
+
+@pytest.fixture
+def blob_client(monkeypatch):
+    manager = api_storage_routes.storage_manager
+    client = _FakeBlobClient()
+    file_info = {
+        "id": FILE_ID,
+        "nome_original": "laudo.pdf",
+        "caminho_blob": f"{FILE_ID}.pdf",
+        "tamanho_bytes": len(CONTENT),
+        "tipo_conteudo": "application/pdf",
+        "data_upload": "2025-01-08T13:15:00",
+        "etag_blob": ETAG,
+        "codificacao_conteudo": None,
+        "tamanho_armazenado_bytes": len(CONTENT)
+    }
+    monkeypatch.setattr(manager, "get_file_info", lambda file_id: file_info if file_id == FILE_ID else None)
+    monkeypatch.setattr(manager, "container_client", SimpleNamespace(get_blob_client=lambda path: client))
+    monkeypatch.setattr(manager, "disk_cache", None)
+    return client
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    api_storage_routes.register_storage_routes(app)
+    return app.test_client()
+
+
+def _download(client, **headers):
+    return client.get(f"/api/arquivos/download/{FILE_ID}", headers=headers)
+
+
+def test_full_download(client, blob_client):
+    response = _download(client)
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert response.headers["Accept-Ranges"] == "bytes"
+    assert blob_client.downloads == [(None, None)]
+
+
+def test_range(client, blob_client):
+    response = _download(client, Range="bytes=5-9")
+    assert response.status_code == 206
+    assert response.data == CONTENT[5:10]
+    assert response.headers["Content-Range"] == f"bytes 5-9/{len(CONTENT)}"
+    assert response.content_length == 5
+    assert blob_client.downloads == [(5, 5)]
+
+
+def test_suffix_range(client, blob_client):
+    response = _download(client, Range="bytes=-4")
+    assert response.status_code == 206
+    assert response.data == CONTENT[-4:]
+
+
+def test_range_not_satisfiable(client, blob_client):
+    response = _download(client, Range=f"bytes={len(CONTENT)}-")
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == f"bytes */{len(CONTENT)}"
+    assert blob_client.downloads == []
+
+
+def test_multiple_ranges_return_whole_file(client, blob_client):
+    response = _download(client, Range="bytes=0-1,5-6")
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+
+def test_if_range_matching_etag(client, blob_client):
+    response = _download(client, Range="bytes=0-3", **{"If-Range": ETAG})
+    assert response.status_code == 206
+    assert response.data == CONTENT[:4]
+
+
+def test_if_range_changed_etag_returns_whole_file(client, blob_client):
+    response = _download(client, Range="bytes=0-3", **{"If-Range": '"0x8DC00000000000B2"'})
+    assert response.status_code == 200
+    assert response.data == CONTENT
+    assert "Content-Range" not in response.headers
+    assert blob_client.downloads == [(0, 4), (None, None)]
+
+
+def test_if_range_date(client, blob_client):
+    response = _download(client, Range="bytes=0-3", **{"If-Range": "Wed, 08 Jan 2025 13:15:00 GMT"})
+    assert response.status_code == 206
+
+    response = _download(client, Range="bytes=0-3", **{"If-Range": "Tue, 07 Jan 2025 10:00:00 GMT"})
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+
+def test_if_none_match_not_modified(client, blob_client):
+    response = _download(client, **{"If-None-Match": ETAG})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert response.headers["ETag"] == ETAG
+    assert "no-cache" in response.headers["Cache-Control"]
+    assert blob_client.downloads == []
+
+
+def test_if_none_match_changed(client, blob_client):
+    response = _download(client, **{"If-None-Match": '"0x8DC00000000000B2"'})
+    assert response.status_code == 200
+    assert response.data == CONTENT
+
+
+def test_if_modified_since(client, blob_client):
+    response = _download(client, **{"If-Modified-Since": "Wed, 08 Jan 2025 13:15:00 GMT"})
+    assert response.status_code == 304
+    assert blob_client.downloads == []
+
+    response = _download(client, **{"If-Modified-Since": "Tue, 07 Jan 2025 10:00:00 GMT"})
+    assert response.status_code == 200
+
+
+def test_if_none_match_takes_precedence(client, blob_client):
+    """Com If-None-Match, If-Modified-Since é ignorado"""
+    response = _download(client, **{
+        "If-None-Match": '"0x8DC00000000000B2"',
+        "If-Modified-Since": "Wed, 08 Jan 2025 13:15:00 GMT"
+    })
+    assert response.status_code == 200
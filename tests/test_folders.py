@@ -0,0 +1,84 @@
+"""Testes da normalização das pastas e do filtro pela coluna Pasta"""
+
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.storage.blob")
+
+from azure_storage_manager import AzureStorageManager, MAX_FOLDER_LENGTH  # noqa: E402
+
+
+@pytest.mark.parametrize("folder, expected", [
+    (None, ""),
+    ("", ""),
+    ("/", ""),
+    ("  ", ""),
+    ("contratos", "contratos"),
+    ("/contratos/2025/", "contratos/2025"),
+    ("contratos//2025", "contratos/2025"),
+    ("contratos\\2025", "contratos/2025"),
+    (" contratos / 2025 ", "contratos/2025"),
+    ("Contratos/Recursos Humanos", "Contratos/Recursos Humanos"),
+])
+def test_normalize_folder(folder, expected):
+    assert AzureStorageManager._normalize_folder(folder) == expected
+
+
+def test_normalize_folder_length():
+    folder = "a" * MAX_FOLDER_LENGTH
+    assert AzureStorageManager._normalize_folder(f"/{folder}/") == folder
+    with pytest.raises(ValueError, match="excede"):
+        AzureStorageManager._normalize_folder(folder + "b")
+
+
+@pytest.mark.parametrize("blob_path, folder", [
+    ("arquivo.pdf", ""),
+    ("contratos/arquivo.pdf", "contratos"),
+    ("contratos/2025/arquivo.pdf", "contratos/2025"),
+])
+def test_folder_of(blob_path, folder):
+    assert AzureStorageManager._folder_of(blob_path) == folder
+
+
+@pytest.mark.parametrize("blob_path, folder", [
+    ("contratos/2025/arquivo.pdf", "contratos/2025"),
+    # Blobs de versões anteriores, com a pasta como foi recebida
+    ("/contratos//2025 /arquivo.pdf", "contratos/2025"),
+    ("contratos\\2025/arquivo.pdf", "contratos/2025"),
+    ("a" * (MAX_FOLDER_LENGTH + 1) + "/arquivo.pdf", None),
+])
+def test_record_folder_of(blob_path, folder):
+    assert AzureStorageManager._record_folder_of(blob_path) == folder
+
+
+@pytest.fixture
+def manager():
+    return AzureStorageManager(
+        storage_account="conta",
+        storage_key="Y2hhdmU=",
+        container_name="arquivos",
+        sql_connection_string=None
+    )
+
+
+def test_folder_condition(manager):
+    assert manager._folder_condition("contratos", False) == ("Pasta = ?", ["contratos"])
+
+    condition, params = manager._folder_condition("contratos", True)
+    assert condition == "(Pasta = ? OR Pasta LIKE ? ESCAPE '\\')"
+    assert params == ["contratos", "contratos/%"]
+
+
+def test_folder_condition_escapes_wildcards(manager):
+    _, params = manager._folder_condition("rh_2025%[a]", True)
+    assert params == ["rh_2025%[a]", "rh\\_2025\\%\\[a]/%"]
+
+
+def test_list_query_filters_by_folder(manager):
+    query, params = manager._build_list_query("contratos", True, [])
+    assert query.endswith("AND (Pasta = ? OR Pasta LIKE ? ESCAPE '\\')")
+    assert params == ["contratos", "contratos/%"]
+
+    query, params = manager._build_list_query("", True, [])
+    assert "Pasta" not in query
+    assert params == []
@@ -0,0 +1,245 @@
+"""Testes da leitura incremental de uploads JSON com arquivo em base64"""
+
+import io
+import json
+import base64
+
+import pytest
+
+from json_upload_stream import Base64DecodingReader, Base64StreamDecoder, JsonUploadParser
+
+
+CONTENT = bytes(range(256)) * 40
+
+
+def _decode_in_parts(text: str, size: int) -> bytes:
+    decoder = Base64StreamDecoder()
+    parts = [decoder.decode(text[i:i + size]) for i in range(0, len(text), size)]
+    return b"".join(parts) + decoder.finish()
+
+
+def _parse(body: str, read_size: int = 7, **kwargs):
+    parser = JsonUploadParser(io.BytesIO(body.encode("utf-8")), read_size=read_size, **kwargs)
+    sink = io.BytesIO()
+    fields = parser.parse(sink)
+    return parser, fields, sink.getvalue()
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 64, 100000])
+def test_decoder_any_split(size):
+    """O resultado não depende de onde o texto é dividido"""
+    encoded = base64.b64encode(CONTENT).decode("ascii")
+    assert _decode_in_parts(encoded, size) == CONTENT
+
+
+@pytest.mark.parametrize("content", [b"", b"a", b"ab", b"abc", b"abcd"])
+@pytest.mark.parametrize("size", [1, 3])
+def test_decoder_padding(content, size):
+    encoded = base64.b64encode(content).decode("ascii")
+    assert _decode_in_parts(encoded, size) == content
+
+
+@pytest.mark.parametrize("size", [1, 4, 9, 1000])
+def test_decoder_data_uri_prefix(size):
+    """O prefixo data:<mime>;base64, do Power Apps é descartado, mesmo dividido"""
+    encoded = "data:image/png;base64," + base64.b64encode(CONTENT).decode("ascii")
+    assert _decode_in_parts(encoded, size) == CONTENT
+
+
+def test_decoder_content_starting_like_data_uri():
+    """Base64 que começa com "dat" não é confundido com o prefixo"""
+    content = base64.b64decode("datx" + "AAAA")
+    assert _decode_in_parts("datxAAAA", 1) == content
+
+
+def test_decoder_ignores_whitespace():
+    encoded = base64.encodebytes(CONTENT).decode("ascii").replace("\n", "\r\n ")
+    assert _decode_in_parts(encoded, 10) == CONTENT
+
+
+def test_decoder_invalid_character():
+    with pytest.raises(ValueError):
+        _decode_in_parts("QUJD*EFG", 8)
+
+
+def test_decoder_incomplete():
+    with pytest.raises(ValueError, match="incompleto"):
+        _decode_in_parts("QUJDRA", 100)
+
+
+def test_decoder_data_uri_prefix_too_long():
+    with pytest.raises(ValueError, match="data URI"):
+        _decode_in_parts("data:" + "x" * 1000, 10)
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 1000])
+@pytest.mark.parametrize("source_type", [bytes, str])
+def test_decoding_reader(read_size, source_type):
+    encoded = base64.b64encode(CONTENT).decode("ascii")
+    source = io.BytesIO(encoded.encode("ascii")) if source_type is bytes else io.StringIO(encoded)
+    reader = Base64DecodingReader(source, read_size=read_size)
+    parts = []
+    while True:
+        data = reader.read(333)
+        if not data:
+            break
+        assert len(data) <= 333
+        parts.append(data)
+    assert b"".join(parts) == CONTENT
+
+
+def test_decoding_reader_read_all():
+    reader = Base64DecodingReader(io.StringIO(base64.b64encode(CONTENT).decode("ascii")))
+    assert reader.read() == CONTENT
+    assert reader.read() == b""
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 5, 64 * 1024])
+def test_parser_fields_and_file(read_size):
+    body = json.dumps({
+        "nome_arquivo": "relatório \"final\".pdf",
+        "arquivo": base64.b64encode(CONTENT).decode("ascii"),
+        "tags": ["a", "b,c"],
+        "meta": {"x": [1, {"y": "}"}]},
+        "tamanho": 12.5,
+        "publico": True,
+        "pasta": None
+    }, ensure_ascii=False)
+    parser, fields, data = _parse(body, read_size)
+    assert data == CONTENT
+    assert parser.file_found and parser.file_size == len(CONTENT)
+    assert fields == {
+        "nome_arquivo": "relatório \"final\".pdf",
+        "tags": ["a", "b,c"],
+        "meta": {"x": [1, {"y": "}"}]},
+        "tamanho": 12.5,
+        "publico": True,
+        "pasta": None
+    }
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3])
+def test_parser_escaped_slash(read_size):
+    """Serializadores que escapam "/" (\\/) ou usam \\uXXXX, com a leitura dividida no meio do escape"""
+    encoded = base64.b64encode(CONTENT).decode("ascii")
+    assert "/" in encoded
+    escaped = encoded.replace("/", "\\/").replace("+", "\\u002b")
+    body = '{"arquivo": "data:image\\/png;base64,' + escaped + '", "usuario": "a@b"}'
+    _, fields, data = _parse(body, read_size)
+    assert data == CONTENT
+    assert fields == {"usuario": "a@b"}
+
+
+def test_parser_escaped_newlines():
+    """Base64 com quebras de linha serializadas (\\r\\n)"""
+    escaped = base64.encodebytes(CONTENT).decode("ascii").replace("\n", "\\r\\n")
+    _, _, data = _parse('{"arquivo":"' + escaped + '"}', 4)
+    assert data == CONTENT
+
+
+def test_parser_file_last_and_whitespace():
+    body = ' \n{ "usuario" : "x" ,\n "arquivo" : "' + base64.b64encode(b"abc").decode("ascii") + '" }\n '
+    parser, fields, data = _parse(body, 1)
+    assert data == b"abc"
+    assert fields == {"usuario": "x"}
+
+
+def test_parser_without_file():
+    parser, fields, data = _parse('{"usuario": "x", "arquivo": null}')
+    assert not parser.file_found
+    assert fields == {"usuario": "x", "arquivo": None}
+    assert data == b""
+
+
+def test_parser_empty_object():
+    parser, fields, _ = _parse("{}")
+    assert fields == {} and not parser.file_found
+
+
+def test_parser_custom_file_field():
+    _, fields, data = _parse('{"arquivo": "x", "conteudo": "YWJj"}', file_field="conteudo")
+    assert data == b"abc"
+    assert fields == {"arquivo": "x"}
+
+
+@pytest.mark.parametrize("body, message", [
+    ('{"arquivo": "YWJj", "arquivo": "YWJj"}', "duplicado"),
+    ('{"arquivo": "YWJj"} {}', "após o objeto"),
+    ('{"arquivo": "YWJj"', "incompleto"),
+    ('{"arquivo": "YWJ', "incompleto"),
+    ('{"arquivo": "YWJ"}', "incompleto"),
+    ('{"arquivo": "YW*j"}', None),
+    ('{"arquivo": "YW\\qj"}', "escape"),
+    ('{"a": 1 "b": 2}', "esperado"),
+    ('["arquivo"]', "esperado"),
+    ('', "incompleto"),
+])
+def test_parser_invalid(body, message):
+    with pytest.raises(ValueError, match=message):
+        _parse(body, 3)
+
+
+def test_parser_field_size_limit():
+    body = json.dumps({"usuario": "x" * 100, "arquivo": "YWJj"})
+    with pytest.raises(ValueError, match="tamanho máximo"):
+        _parse(body, 8, max_field_size=50)
+    # O campo do arquivo não está sujeito ao limite
+    _, _, data = _parse(json.dumps({"arquivo": base64.b64encode(CONTENT).decode("ascii")}), 8, max_field_size=50)
+    assert data == CONTENT
+
+
+def test_parser_utf8_split_across_reads():
+    """Caracteres multibyte divididos entre duas leituras"""
+    _, fields, _ = _parse(json.dumps({"nome_arquivo": "ação çé 日本"}, ensure_ascii=False), 1)
+    assert fields["nome_arquivo"] == "ação çé 日本"
+
+
+def _parse_list(body: str, read_size: int = 7, **kwargs):
+    parser = JsonUploadParser(io.BytesIO(body.encode("utf-8")), read_size=read_size)
+    fields, items = parser.parse_list("arquivos", io.BytesIO, **kwargs)
+    return fields, [(item, sink.getvalue() if sink else None) for item, sink in items]
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 64 * 1024])
+def test_parse_list(read_size):
+    body = json.dumps({
+        "usuario": "a@b",
+        "arquivos": [
+            {"nome_arquivo": "1.bin", "arquivo": base64.b64encode(CONTENT).decode("ascii")},
+            {"arquivo": "data:text/plain;base64,YWJj", "nome_arquivo": "2.txt", "tags": {"x": 1}},
+            {"nome_arquivo": "sem_arquivo"}
+        ],
+        "pasta": "fotos"
+    })
+    fields, items = _parse_list(body, read_size)
+    assert fields == {"usuario": "a@b", "pasta": "fotos"}
+    assert items == [
+        ({"nome_arquivo": "1.bin"}, CONTENT),
+        ({"nome_arquivo": "2.txt", "tags": {"x": 1}}, b"abc"),
+        ({"nome_arquivo": "sem_arquivo"}, None)
+    ]
+
+
+def test_parse_list_empty():
+    assert _parse_list('{"arquivos": []}') == ({}, [])
+    assert _parse_list('{"usuario": "x"}') == ({"usuario": "x"}, [])
+
+
+@pytest.mark.parametrize("body, message", [
+    ('{"arquivos": ["YWJj"]}', "esperado '{'"),
+    ('{"arquivos": [1]}', "esperado '{'"),
+    ('{"arquivos": [{"arquivo": "YWJj", "arquivo": "YWJj"}]}', "duplicado"),
+    ('{"arquivos": [], "arquivos": []}', "duplicado"),
+    ('{"arquivos": [{"arquivo": "YWJj"} {"arquivo": "YWJj"}]}', "esperado ',' ou ']'"),
+    ('{"arquivos": [{"arquivo": "YWJj"}', "incompleto"),
+])
+def test_parse_list_invalid(body, message):
+    with pytest.raises(ValueError, match=message):
+        _parse_list(body)
+
+
+def test_parse_list_max_items():
+    item = {"nome_arquivo": "a", "arquivo": "YWJj"}
+    assert len(_parse_list(json.dumps({"arquivos": [item] * 2}), max_items=2)[1]) == 2
+    with pytest.raises(ValueError, match="Máximo de 2 itens"):
+        _parse_list(json.dumps({"arquivos": [item] * 3}), max_items=2)
@@ -0,0 +1,29 @@
+"""Testes do cursor opaco da paginação de /listar e /buscar"""
+
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.storage.blob")
+
+from azure_storage_manager import AzureStorageManager  # noqa: E402
+
+
+FILE_ID = "123e4567-e89b-12d3-a456-426614174000"
+
+
+def test_round_trip():
+    cursor = AzureStorageManager._encode_list_cursor("2025-01-08T13:15:00.123456", FILE_ID.upper())
+    assert "=" not in cursor
+    assert AzureStorageManager._decode_list_cursor(cursor) == ("2025-01-08T13:15:00.123456", FILE_ID)
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "!!!",
+    "bm90IGpzb24",  # "not json"
+    AzureStorageManager._encode_list_cursor("ontem", FILE_ID),
+    AzureStorageManager._encode_list_cursor("2025-01-08T13:15:00", "nao-e-uuid"),
+])
+def test_invalid(cursor):
+    with pytest.raises(ValueError, match="Cursor de paginação inválido"):
+        AzureStorageManager._decode_list_cursor(cursor)
@@ -0,0 +1,105 @@
+"""Testes do cache dos metadados de arquivos"""
+
+import pytest
+
+import metadata_cache
+from metadata_cache import LocalMetadataStore, MetadataCache
+
+
+FILE_ID = "123E4567-E89B-12D3-A456-426614174000"
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Relógio controlado pelo teste (time.monotonic do módulo)"""
+    now = [1000.0]
+    monkeypatch.setattr(metadata_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_local_store_expiration(clock):
+    store = LocalMetadataStore()
+    store.set("a", {"x": 1}, ttl=10)
+    assert store.get("a") == (True, {"x": 1})
+    clock[0] += 11
+    assert store.get("a") == (False, None)
+    assert store.size() == 0
+
+
+def test_local_store_lru_limit():
+    store = LocalMetadataStore(max_entries=2)
+    store.set("a", 1, ttl=60)
+    store.set("b", 2, ttl=60)
+    store.get("a")
+    store.set("c", 3, ttl=60)
+    assert store.get("b") == (False, None)
+    assert store.get("a") == (True, 1)
+    assert store.get("c") == (True, 3)
+
+
+def test_local_store_delete():
+    store = LocalMetadataStore()
+    for key in "abc":
+        store.set(key, key, ttl=60)
+    store.delete("a")
+    store.delete_many(["b", "inexistente"])
+    assert store.get("a")[0] is False and store.get("b")[0] is False
+    assert store.get("c") == (True, "c")
+
+
+def test_local_store_invalid_size():
+    with pytest.raises(ValueError):
+        LocalMetadataStore(max_entries=0)
+
+
+def test_cache_keys_ignore_case():
+    cache = MetadataCache()
+    cache.set(FILE_ID, {"id": FILE_ID})
+    assert cache.get(FILE_ID.lower()) == (True, {"id": FILE_ID})
+    cache.invalidate(FILE_ID.lower())
+    assert cache.get(FILE_ID) == (False, None)
+
+
+def test_cache_returns_copies():
+    cache = MetadataCache()
+    info = {"id": FILE_ID}
+    cache.set(FILE_ID, info)
+    info["alterado"] = True
+    _, cached = cache.get(FILE_ID)
+    cached["alterado"] = True
+    assert cache.get(FILE_ID) == (True, {"id": FILE_ID})
+
+
+def test_cache_negative_entries(clock):
+    cache = MetadataCache(ttl=60, negative_ttl=5)
+    cache.set(FILE_ID, None)
+    assert cache.get(FILE_ID) == (True, None)
+    clock[0] += 6
+    assert cache.get(FILE_ID) == (False, None)
+
+    cache = MetadataCache(negative_ttl=0)
+    cache.set(FILE_ID, None)
+    assert cache.get(FILE_ID) == (False, None)
+
+
+def test_cache_invalidate_many():
+    cache = MetadataCache()
+    cache.set("a", {"id": "a"})
+    cache.set("b", {"id": "b"})
+    cache.invalidate_many(["A", "b"])
+    assert cache.get("a")[0] is False and cache.get("b")[0] is False
+
+
+def test_cache_stats():
+    cache = MetadataCache()
+    assert cache.stats()["taxa_acerto"] is None
+    cache.set("a", {"id": "a"})
+    cache.set("b", None)
+    cache.get("a")
+    cache.get("b")
+    cache.get("c")
+    cache.get("a")
+    stats = cache.stats()
+    assert (stats["acertos"], stats["acertos_negativos"], stats["falhas"]) == (2, 1, 1)
+    assert stats["taxa_acerto"] == 0.75
+    assert stats["entradas"] == 2
@@ -0,0 +1,61 @@
+"""Testes do merge join entre a listagem de blobs e os registros"""
+
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.storage.blob")
+
+from reconcile_blobs import merge_blobs_and_records  # noqa: E402
+
+
+def _blobs(*names):
+    return [SimpleNamespace(name=name) for name in names]
+
+
+def _records(*paths):
+    return [SimpleNamespace(CaminhoBlob=path, Id=index) for index, path in enumerate(paths)]
+
+
+def _summary(blobs, records):
+    return [
+        (path, blob.name if blob else None, [row.Id for row in rows])
+        for path, blob, rows in merge_blobs_and_records(blobs, records)
+    ]
+
+
+def test_matches_orphans_and_dangling():
+    result = _summary(_blobs("a", "b", "d"), _records("b", "c", "d"))
+    assert result == [
+        ("a", "a", []),
+        ("b", "b", [0]),
+        ("c", None, [1]),
+        ("d", "d", [2]),
+    ]
+
+
+def test_several_records_per_blob():
+    """Uploads deduplicados: vários registros apontam para o mesmo blob"""
+    assert _summary(_blobs("a"), _records("a", "a", "a")) == [("a", "a", [0, 1, 2])]
+
+
+def test_empty_sides():
+    assert _summary([], []) == []
+    assert _summary(_blobs("a", "b"), []) == [("a", "a", []), ("b", "b", [])]
+    assert _summary([], _records("a")) == [("a", None, [0])]
+
+
+def test_binary_order():
+    """Maiúsculas antes de minúsculas, como na listagem do Azure"""
+    result = _summary(_blobs("B", "a"), _records("B", "a"))
+    assert [path for path, _, _ in result] == ["B", "a"]
+
+
+@pytest.mark.parametrize("blobs, records, source", [
+    (_blobs("b", "a"), [], "blobs"),
+    ([], _records("b", "a"), "registros"),
+])
+def test_unsorted_input(blobs, records, source):
+    with pytest.raises(RuntimeError, match=source):
+        list(merge_blobs_and_records(blobs, records))
@@ -0,0 +1,310 @@
+"""Testes do pool de conexões com o SQL Server (com conexões falsas)"""
+
+import threading
+import time
+
+import pytest
+
+pyodbc = pytest.importorskip("pyodbc")
+
+import sql_connection_pool  # noqa: E402
+from sql_connection_pool import PoolTimeoutError, SqlConnectionPool  # noqa: E402
+
+
+class _FakeCursor:
+    def __init__(self, connection):
+        self._connection = connection
+
+    def execute(self, query):
+        if not self._connection.alive:
+            raise pyodbc.OperationalError("Conexão perdida")
+
+    def fetchone(self):
+        return (1,)
+
+    def close(self):
+        pass
+
+
+class _FakeConnection:
+    def __init__(self):
+        self.commits = 0
+        self.rollbacks = 0
+        self.closed = False
+        self.alive = True
+        self.fail_commit = False
+
+    def cursor(self):
+        return _FakeCursor(self)
+
+    def commit(self):
+        if self.fail_commit:
+            raise pyodbc.Error("Falha no commit")
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def opened():
+    """Conexões abertas pelo pool, na ordem"""
+    return []
+
+
+@pytest.fixture
+def make_pool(opened):
+    def make(**kwargs):
+        def connect(connection_string):
+            connection = _FakeConnection()
+            opened.append(connection)
+            return connection
+        return SqlConnectionPool("Driver=falso", connect=connect, **kwargs)
+    return make
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Relógio controlado pelo teste (time.monotonic do módulo)"""
+    now = [1000.0]
+    monkeypatch.setattr(sql_connection_pool.time, "monotonic", lambda: now[0])
+    return now
+
+
+def _hold(pool):
+    """Mantém uma conexão em uso em outra thread; retorna (conexão, liberar)"""
+    acquired = threading.Event()
+    release = threading.Event()
+    held = []
+
+    def run():
+        with pool.connection() as conn:
+            held.append(conn)
+            acquired.set()
+            release.wait(5)
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    assert acquired.wait(5)
+
+    def done():
+        release.set()
+        thread.join(5)
+
+    return held[0], done
+
+
+def test_nested_blocks_share_connection_and_commit_once(make_pool, opened):
+    pool = make_pool()
+    with pool.connection() as outer:
+        with pool.connection() as inner:
+            assert inner is outer
+        assert outer.commits == 0
+        assert pool.stats()["em_uso"] == 1
+    assert outer.commits == 1
+
+    with pool.connection() as again:
+        assert again is outer
+    stats = pool.stats()
+    assert (stats["abertas"], stats["ociosas"], stats["criadas"]) == (1, 1, 1)
+
+
+def test_error_rolls_back_and_keeps_connection(make_pool, opened):
+    pool = make_pool()
+    with pytest.raises(ValueError):
+        with pool.connection():
+            raise ValueError("erro da operação")
+    conn = opened[0]
+    assert (conn.commits, conn.rollbacks, conn.closed) == (0, 1, False)
+    assert pool.stats()["ociosas"] == 1
+
+
+def test_nested_error_rolls_back_transaction(make_pool, opened):
+    pool = make_pool()
+    with pool.connection() as conn:
+        with pytest.raises(ValueError):
+            with pool.connection():
+                raise ValueError("erro no bloco aninhado")
+        assert conn.rollbacks == 1
+    assert conn.commits == 1
+    assert pool.stats()["ociosas"] == 1
+
+
+@pytest.mark.parametrize("error", [pyodbc.OperationalError, pyodbc.InterfaceError])
+def test_broken_connection_discarded(make_pool, opened, error):
+    pool = make_pool()
+    with pytest.raises(error):
+        with pool.connection():
+            raise error("Conexão perdida")
+    assert opened[0].closed
+    assert pool.stats()["descartadas"] == 1
+
+    with pool.connection() as conn:
+        assert conn is opened[1]
+
+
+def test_broken_in_nested_block(make_pool, opened):
+    """O bloco externo não devolve de novo a conexão já descartada"""
+    pool = make_pool()
+    with pool.connection():
+        with pytest.raises(pyodbc.OperationalError):
+            with pool.connection():
+                raise pyodbc.OperationalError("Conexão perdida")
+    stats = pool.stats()
+    assert (stats["abertas"], stats["descartadas"]) == (0, 1)
+
+
+def test_commit_failure_discards(make_pool, opened):
+    pool = make_pool()
+    with pool.connection() as conn:
+        conn.fail_commit = True
+    assert conn.closed
+    assert pool.stats()["abertas"] == 0
+
+
+def test_request_reuses_connection_without_holding_it(make_pool, opened):
+    pool = make_pool()
+    pool.begin_request()
+    with pool.connection() as first:
+        # Outra thread abre uma segunda conexão, devolvida por último
+        other, done = _hold(pool)
+    assert first.commits == 1
+    assert pool.stats()["em_uso"] == 1
+    done()
+    assert other is not first
+    assert pool.stats()["em_uso"] == 0
+
+    # A conexão da requisição tem preferência sobre a devolvida por último
+    with pool.connection() as second:
+        assert second is first
+    pool.end_request()
+    assert pool.stats()["ociosas"] == 2
+
+
+def test_request_connection_taken_by_other_thread(make_pool, opened):
+    pool = make_pool(max_size=1)
+    pool.begin_request()
+    with pool.connection() as first:
+        pass
+    other, done = _hold(pool)
+    assert other is first
+    done()
+    with pool.connection() as again:
+        assert again is first
+    pool.end_request()
+
+
+def test_end_request_without_connection(make_pool):
+    pool = make_pool()
+    pool.begin_request()
+    pool.end_request()
+    assert pool.stats()["abertas"] == 0
+
+
+def test_timeout(make_pool):
+    pool = make_pool(max_size=1, timeout=0)
+    _, done = _hold(pool)
+    try:
+        with pytest.raises(PoolTimeoutError):
+            with pool.connection():
+                pass
+    finally:
+        done()
+    assert pool.stats()["tempo_esgotado"] == 1
+
+
+def test_waits_for_release(make_pool):
+    pool = make_pool(max_size=1, timeout=5)
+    held, done = _hold(pool)
+    result = []
+
+    def wait():
+        with pool.connection() as conn:
+            result.append(conn)
+
+    waiter = threading.Thread(target=wait)
+    waiter.start()
+    for _ in range(500):
+        if pool.stats()["esperas"]:
+            break
+        time.sleep(0.01)
+    done()
+    waiter.join(5)
+    assert result == [held]
+    assert pool.stats()["esperas"] >= 1
+
+
+def test_max_age_recycles(make_pool, opened, clock):
+    pool = make_pool(max_age=60)
+    with pool.connection():
+        pass
+    clock[0] += 61
+    with pool.connection() as conn:
+        assert conn is opened[1]
+    assert opened[0].closed
+    assert pool.stats()["descartadas"] == 1
+
+
+def test_max_age_on_release(make_pool, opened, clock):
+    pool = make_pool(max_age=60)
+    with pool.connection():
+        clock[0] += 61
+    assert opened[0].closed
+    assert pool.stats()["abertas"] == 0
+
+
+def test_max_idle_closes_extra_connections(make_pool, opened, clock):
+    pool = make_pool(min_size=1, max_idle=10)
+    first, done = _hold(pool)
+    with pool.connection() as second:
+        done()
+        clock[0] += 11
+    assert first.closed and not second.closed
+    stats = pool.stats()
+    assert (stats["abertas"], stats["ociosas"]) == (1, 1)
+
+
+def test_stale_connection_pinged(make_pool, opened, clock):
+    pool = make_pool(ping_interval=30)
+    with pool.connection() as conn:
+        pass
+    conn.alive = False
+    clock[0] += 10
+    with pool.connection() as again:
+        assert again is conn
+    clock[0] += 31
+    with pool.connection() as replaced:
+        assert replaced is opened[1]
+    assert conn.closed
+
+
+def test_connect_failure_frees_slot(opened):
+    attempts = []
+
+    def connect(connection_string):
+        attempts.append(connection_string)
+        if len(attempts) == 1:
+            raise pyodbc.OperationalError("Servidor indisponível")
+        return _FakeConnection()
+
+    pool = SqlConnectionPool("Driver=falso", max_size=1, timeout=0, connect=connect)
+    with pytest.raises(pyodbc.OperationalError):
+        with pool.connection():
+            pass
+    assert pool.stats()["abertas"] == 0
+    with pool.connection():
+        pass
+    assert pool.stats()["criadas"] == 1
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"max_size": 0},
+    {"min_size": -1},
+    {"min_size": 3, "max_size": 2},
+])
+def test_invalid_sizes(kwargs):
+    with pytest.raises(ValueError):
+        SqlConnectionPool("Driver=falso", connect=lambda _: None, **kwargs)
@@ -0,0 +1,119 @@
+"""Testes da validação das tags e dos filtros de tag de /listar e /buscar"""
+
+import json
+
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.storage.blob")
+
+from azure_storage_manager import (  # noqa: E402
+    AzureStorageManager,
+    MAX_TAG_KEY_LENGTH,
+    MAX_TAG_VALUE_LENGTH
+)
+
+
+FILE_ID = "123e4567-e89b-12d3-a456-426614174000"
+
+
+class _FakeCursor:
+    def __init__(self):
+        self.batches = []
+        self.fast_executemany = False
+
+    def executemany(self, query, params):
+        self.batches.append((" ".join(query.split()), list(params)))
+
+
+@pytest.mark.parametrize("tags, expected", [
+    (None, None),
+    ("", None),
+    ({}, None),
+    ("{}", None),
+    ({"setor": "rh"}, {"setor": "rh"}),
+    ('{"setor": "rh", "ano": 2025}', {"setor": "rh", "ano": 2025}),
+])
+def test_parse_tags(tags, expected):
+    assert AzureStorageManager._parse_tags(tags) == expected
+
+
+@pytest.mark.parametrize("tags", [
+    "não é json",
+    "[1, 2]",
+    '"texto"',
+    ["setor"],
+])
+def test_parse_tags_not_an_object(tags):
+    with pytest.raises(ValueError, match="objeto JSON"):
+        AzureStorageManager._parse_tags(tags)
+
+
+def test_parse_tags_limits():
+    AzureStorageManager._parse_tags({"k" * MAX_TAG_KEY_LENGTH: "v" * MAX_TAG_VALUE_LENGTH})
+    with pytest.raises(ValueError, match="Chave de tag inválida"):
+        AzureStorageManager._parse_tags({"k" * (MAX_TAG_KEY_LENGTH + 1): "v"})
+    with pytest.raises(ValueError, match="Chave de tag inválida"):
+        AzureStorageManager._parse_tags({"": "v"})
+    with pytest.raises(ValueError, match="excede"):
+        AzureStorageManager._parse_tags({"k": "v" * (MAX_TAG_VALUE_LENGTH + 1)})
+
+
+def test_tag_value_text():
+    assert AzureStorageManager._tag_value_text("Recursos Humanos") == "Recursos Humanos"
+    assert AzureStorageManager._tag_value_text(2025) == "2025"
+    assert AzureStorageManager._tag_value_text(True) == "true"
+    assert AzureStorageManager._tag_value_text(["a", "ç"]) == '["a", "ç"]'
+
+
+def test_serialize_tags():
+    assert AzureStorageManager._serialize_tags(None) is None
+    assert json.loads(AzureStorageManager._serialize_tags('{"setor": "manutenção"}')) == {"setor": "manutenção"}
+    assert "manutenção" in AzureStorageManager._serialize_tags({"setor": "manutenção"})
+
+
+def test_parse_tag_filters():
+    assert AzureStorageManager._parse_tag_filters(None) == []
+    assert AzureStorageManager._parse_tag_filters(["setor:rh", "data:2025:01", "vazio:"]) == [
+        ("setor", "rh"),
+        ("data", "2025:01"),
+        ("vazio", ""),
+    ]
+
+
+@pytest.mark.parametrize("tag_filter", ["setor", ":rh", ""])
+def test_parse_tag_filters_invalid(tag_filter):
+    with pytest.raises(ValueError, match="Filtro de tag inválido"):
+        AzureStorageManager._parse_tag_filters([tag_filter])
+
+
+@pytest.fixture
+def manager():
+    return AzureStorageManager(
+        storage_account="conta",
+        storage_key="Y2hhdmU=",
+        container_name="arquivos",
+        sql_connection_string=None
+    )
+
+
+def test_list_query_joins_each_tag_filter(manager):
+    query, params = manager._build_list_query("", False, [("setor", "rh"), ("ano", "2025")])
+    assert query.count("INNER JOIN ArquivosTags") == 2
+    assert params == ["setor", "rh", "ano", "2025"]
+
+
+def test_insert_writes_one_tag_row_per_key(manager):
+    cursor = _FakeCursor()
+    manager._insert_file_records(cursor, [{
+        "file_id": FILE_ID,
+        "original_filename": "laudo.pdf",
+        "unique_filename": f"{FILE_ID}.pdf",
+        "blob_path": f"rh/{FILE_ID}.pdf",
+        "blob_url": f"https://conta.blob.core.windows.net/arquivos/rh/{FILE_ID}.pdf",
+        "file_size": 10,
+        "content_type": "application/pdf",
+        "tags": '{"setor": "rh", "ano": 2025}'
+    }])
+    tag_rows = [params for query, params in cursor.batches if "INTO ArquivosTags" in query]
+    assert tag_rows == [[(FILE_ID, "setor", "rh"), (FILE_ID, "ano", "2025")]]
@@ -0,0 +1,126 @@
+"""Testes da montagem em streaming do ZIP de exportação, com os blobs em memória"""
+
+import gzip
+import io
+import zipfile
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("pyodbc")
+pytest.importorskip("azure.storage.blob")
+
+from azure.core.exceptions import ResourceNotFoundError, ServiceResponseError  # noqa: E402
+
+from azure_storage_manager import AzureStorageManager, ZIP_ERRORS_ENTRY  # noqa: E402
+
+
+class _FakeBlobClient:
+    def __init__(self, blobs, path):
+        self._blobs = blobs
+        self._path = path
+
+    def download_blob(self):
+        data = self._blobs.get(self._path)
+        if data is None:
+            raise ResourceNotFoundError("Blob não encontrado")
+        if isinstance(data, Exception):
+            raise data
+        return SimpleNamespace(size=len(data), chunks=lambda: iter([data[:3], data[3:]]))
+
+
+@pytest.fixture
+def blobs():
+    """Conteúdo de cada blob, pelo caminho (uma exceção simula a falha ao abrir)"""
+    return {}
+
+
+@pytest.fixture
+def manager(blobs):
+    manager = AzureStorageManager(
+        storage_account="conta",
+        storage_key="Y2hhdmU=",
+        container_name="arquivos",
+        sql_connection_string=None,
+        zip_prefetch=2
+    )
+    manager.container_client = SimpleNamespace(get_blob_client=lambda path: _FakeBlobClient(blobs, path))
+    return manager
+
+
+def _entry(blobs, name, data, encoding=None):
+    path = f"pasta/{len(blobs)}.bin"
+    blobs[path] = data
+    return {
+        "id": f"id-{len(blobs)}",
+        "nome": name,
+        "caminho_blob": path,
+        "tamanho_bytes": len(data),
+        "tamanho_armazenado_bytes": len(data),
+        "codificacao": encoding,
+        "etag_blob": None,
+        "data_upload": "2025-01-08T13:15:00"
+    }
+
+
+def _export(manager, entries, failures=None):
+    parts = list(manager._zip_stream(entries, failures if failures is not None else []))
+    return parts, zipfile.ZipFile(io.BytesIO(b"".join(parts)))
+
+
+def test_entries_in_order(manager, blobs):
+    entries = [_entry(blobs, "a.txt", b"primeiro"), _entry(blobs, "b.txt", b"segundo")]
+    parts, archive = _export(manager, entries)
+    assert archive.namelist() == ["a.txt", "b.txt"]
+    assert archive.read("a.txt") == b"primeiro"
+    assert archive.read("b.txt") == b"segundo"
+    assert archive.getinfo("a.txt").compress_type == zipfile.ZIP_STORED
+    assert archive.getinfo("a.txt").date_time == (2025, 1, 8, 13, 15, 0)
+    # Enviado conforme é montado, não de uma vez no final
+    assert len(parts) > 1
+
+
+def test_repeated_names_get_suffix(manager, blobs):
+    entries = [
+        _entry(blobs, "laudo.pdf", b"1"),
+        _entry(blobs, "LAUDO.pdf", b"2"),
+        _entry(blobs, "laudo.pdf", b"3"),
+    ]
+    _, archive = _export(manager, entries)
+    assert archive.namelist() == ["laudo.pdf", "LAUDO (2).pdf", "laudo (3).pdf"]
+
+
+def test_compressed_blob_is_decompressed(manager, blobs):
+    entries = [_entry(blobs, "dados.csv", gzip.compress(b"a;b\n1;2\n"), encoding="gzip")]
+    entries[0]["tamanho_bytes"] = len(b"a;b\n1;2\n")
+    _, archive = _export(manager, entries)
+    assert archive.read("dados.csv") == b"a;b\n1;2\n"
+
+
+def test_failures_listed_in_errors_entry(manager, blobs):
+    entries = [
+        _entry(blobs, "a.txt", b"ok"),
+        _entry(blobs, "ausente.txt", b"removido"),
+        _entry(blobs, "lento.txt", b"inacessivel"),
+    ]
+    del blobs[entries[1]["caminho_blob"]]
+    blobs[entries[2]["caminho_blob"]] = ServiceResponseError("Tempo esgotado")
+    _, archive = _export(manager, entries, ["id-x: arquivo não encontrado"])
+
+    assert archive.namelist() == ["a.txt", ZIP_ERRORS_ENTRY]
+    errors = archive.read(ZIP_ERRORS_ENTRY).decode().splitlines()
+    assert errors[0] == "id-x: arquivo não encontrado"
+    assert errors[1] == "ausente.txt (id-2): arquivo não encontrado no storage"
+    assert errors[2].startswith("lento.txt (id-3): erro ao ler do storage")
+
+
+def test_no_errors_entry_without_failures(manager, blobs):
+    _, archive = _export(manager, [_entry(blobs, "a.txt", b"ok")])
+    assert ZIP_ERRORS_ENTRY not in archive.namelist()
+
+
+def test_errors_entry_does_not_clash_with_exported_file(manager, blobs):
+    entries = [_entry(blobs, "erros.txt", b"arquivo do usuario")]
+    _, archive = _export(manager, entries, ["id-x: arquivo não encontrado"])
+    assert archive.namelist() == ["erros.txt", "ERROS (2).txt"]
+    assert archive.read("erros.txt") == b"arquivo do usuario"